@@ -0,0 +1,118 @@
+"""Custo da verificação do token nas rotas protegidas (cache ligado × desligado).
+
+Mede, no cliente de teste do Flask com SQLite temporário, a latência da
+revisão de questões — PATCH /correcoes/<id>/questoes/<n>, a chamada repetida
+dezenas de vezes por folha — e de um GET leve, com o cache de tokens de
+routes/auth.py desligado (TTL 0: HMAC + consulta do usuário a cada chamada)
+e ligado, em rodadas alternadas. A diferença das medianas é o que o cache economiza por chamada.
+
+Uso (a partir da raiz da API):
+    python -m benchmarks.autenticacao [--chamadas 1200] [--json]
+"""
+
+import argparse
+import base64
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tests.synthetic import CartaoSintetico  # noqa: E402
+
+ALTS = ['A', 'B', 'C', 'D', 'E']
+
+
+def _preparar(diretorio: str):
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(diretorio, 'auth.db')}"
+    os.environ['MOTOR_LEITURA'] = 'local'
+    import src.routes.correcao as rc
+    from src.main import app
+
+    rc.STORAGE_DIR = os.path.join(diretorio, 'storage')
+    client = app.test_client()
+    token = client.post('/api/v2/auth/registrar', json={
+        'nome': 'Bench', 'email': 'bench@escola.com', 'senha': 'bench-123'}).get_json()['token']
+    img = CartaoSintetico(num_questoes=20).gerar(
+        {i: ALTS[(i - 1) % 5] for i in range(1, 21)}, marcas_duplas={3: 'E'})
+    ok, buf = cv2.imencode('.jpg', img)
+    corpo = client.post('/api/v2/correcoes', headers={'Authorization': f'Bearer {token}'}, json={
+        'turma': 'BENCH', 'aluno': 'Aluno',
+        'imagem': 'data:image/jpeg;base64,' + base64.b64encode(buf).decode(),
+        'gabarito_oficial': {str(i): ALTS[(i - 1) % 5] for i in range(1, 21)},
+        'layout': {'num_questoes': 20, 'num_alternativas': 5, 'num_colunas': 2},
+    }).get_json()
+    return client, token, corpo['id']
+
+
+def _medir(fn, chamadas: int) -> List[float]:
+    for _ in range(20):   # aquecimento
+        fn()
+    tempos = []
+    for _ in range(chamadas):
+        inicio = time.perf_counter()
+        fn()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return tempos
+
+
+def medir(chamadas: int, rodadas: int = 6) -> Dict[str, Any]:
+    from src.routes import auth
+
+    with tempfile.TemporaryDirectory() as tmp:
+        client, token, cid = _preparar(tmp)
+        headers = {'Authorization': f'Bearer {token}'}
+        rotas = {
+            'patch_revisao': lambda: client.patch(
+                f'/api/v2/correcoes/{cid}/questoes/3', json={'alternativa': 'C'},
+                headers=headers),
+            'get_correcao': lambda: client.get(f'/api/v2/correcoes/{cid}', headers=headers),
+        }
+        relatorio: Dict[str, Any] = {}
+        ttl_original = auth.TOKEN_CACHE_TTL_SEGUNDOS
+        try:
+            for nome, fn in rotas.items():
+                # Rodadas alternadas: deriva do SQLite/CPU afeta os dois lados igual
+                amostras: Dict[str, List[float]] = {'sem_cache': [], 'com_cache': []}
+                for _ in range(rodadas):
+                    for rotulo, ttl in (('sem_cache', 0), ('com_cache', 60)):
+                        auth.TOKEN_CACHE_TTL_SEGUNDOS = ttl
+                        auth.limpar_cache_tokens()
+                        amostras[rotulo] += _medir(fn, chamadas // rodadas)
+                medianas = {r: statistics.median(v) for r, v in amostras.items()}
+                relatorio[nome] = {
+                    'sem_cache_ms': round(medianas['sem_cache'], 3),
+                    'com_cache_ms': round(medianas['com_cache'], 3),
+                    'economia_ms': round(medianas['sem_cache'] - medianas['com_cache'], 3),
+                }
+        finally:
+            auth.TOKEN_CACHE_TTL_SEGUNDOS = ttl_original
+    return relatorio
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--chamadas', type=int, default=1200)
+    parser.add_argument('--json', action='store_true', help='saída em JSON')
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.INFO)
+    relatorio = medir(args.chamadas)
+    if args.json:
+        print(json.dumps(relatorio, indent=2))
+        return 0
+    for rota, r in relatorio.items():
+        print(f"{rota:<14} sem cache {r['sem_cache_ms']:>7.3f} ms  "
+              f"com cache {r['com_cache_ms']:>7.3f} ms  economia {r['economia_ms']:>6.3f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
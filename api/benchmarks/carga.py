@@ -0,0 +1,288 @@
+"""Teste de carga da API v2 com um servidor de IA falso local.
+
+Reproduz o dia de prova sem rede: autentica por /api/v2/auth/login e dispara
+POST /api/v2/correcoes concorrentes com cartões sintéticos. A leitura por IA
+vai para um substituto local de OPENAI_RESPONSES_URL com latência e taxa de
+erro configuráveis, que responde lendo o próprio gabarito do prompt.
+
+Relata vazão, percentis de latência, códigos HTTP/erro e contenção do banco
+(erros "database is locked" contados no engine do SQLAlchemy).
+
+Uso (a partir da raiz da API):
+    # API em processo (servidor threaded do Werkzeug, SQLite temporário)
+    python -m benchmarks.carga --requisicoes 200 --concorrencia 16 \\
+        --latencia-ia 1500 --erro-ia 0.02
+
+    # Contra uma API já em execução (ex.: gunicorn); configure nela
+    # OPENAI_RESPONSES_URL=http://127.0.0.1:8765/v1/responses e OPENAI_API_KEY
+    python -m benchmarks.carga --url http://127.0.0.1:5000 --porta-ia 8765
+
+    # Só o servidor de IA falso, para apontar uma API configurada à mão
+    python -m benchmarks.carga --so-ia-falsa --porta-ia 8765
+"""
+
+import argparse
+import base64
+import json
+import logging
+import os
+import random
+import re
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tests.synthetic import CartaoSintetico  # noqa: E402
+
+ALTS = ['A', 'B', 'C', 'D', 'E']
+EMAIL_CARGA = 'carga@escola.com'
+SENHA_CARGA = 'carga-123456'
+
+
+# ── Servidor de IA falso ─────────────────────────────────────────────────
+
+def _gabarito_do_prompt(texto: str) -> Dict[str, str]:
+    """Gabarito que ai_omr._prompt coloca no final do prompt."""
+    match = re.search(r'referencia de quantidade:\s*(\{.*\})', texto, re.DOTALL)
+    return json.loads(match.group(1)) if match else {}
+
+
+class _ManipuladorIA(BaseHTTPRequestHandler):
+    latencia_ms = 800.0
+    erro = 0.0
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):  # silencioso: o relatório é o que importa
+        pass
+
+    def _responder(self, http: int, corpo: Dict[str, Any]):
+        dados = json.dumps(corpo).encode('utf-8')
+        self.send_response(http)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+        # Latência com cauda (lognormal em torno da média), como uma API real
+        if self.latencia_ms > 0:
+            time.sleep(random.lognormvariate(np.log(self.latencia_ms / 1000), 0.35))
+        if random.random() < self.erro:
+            http = random.choice([429, 500, 503])
+            return self._responder(http, {'error': {'message': f'falha simulada ({http})'}})
+
+        texto = payload['input'][0]['content'][0]['text']
+        questoes = [{'number': int(n), 'answer': alt, 'status': 'ok', 'confidence': 0.97,
+                     'notes': 'resposta simulada'}
+                    for n, alt in sorted(_gabarito_do_prompt(texto).items(),
+                                         key=lambda kv: int(kv[0]))]
+        self._responder(200, {'output_text': json.dumps({'questions': questoes})})
+
+
+def iniciar_ia_falsa(porta: int = 0, latencia_ms: float = 800.0,
+                     erro: float = 0.0) -> ThreadingHTTPServer:
+    manipulador = type('ManipuladorIA', (_ManipuladorIA,),
+                       {'latencia_ms': latencia_ms, 'erro': erro})
+    servidor = ThreadingHTTPServer(('127.0.0.1', porta), manipulador)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+
+# ── API em processo ──────────────────────────────────────────────────────
+
+class ContadorBloqueios:
+    """Conta erros de lock do SQLite vistos pelo engine (handle_error)."""
+
+    def __init__(self):
+        self.total = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, contexto):
+        if 'locked' in str(contexto.original_exception).lower():
+            with self._lock:
+                self.total += 1
+
+
+def iniciar_api_local(url_ia: str, motor: str, porta: int = 0):
+    """Sobe a API num servidor threaded; devolve (url_base, contador de bloqueios)."""
+    diretorio = tempfile.mkdtemp(prefix='corretor_carga_')
+    os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(diretorio, 'carga.db')}")
+    os.environ['OPENAI_RESPONSES_URL'] = url_ia
+    os.environ.setdefault('OPENAI_API_KEY', 'chave-falsa-carga')
+    os.environ['MOTOR_LEITURA'] = motor
+    os.environ.setdefault('CACHE_LEITURAS_MAX', '0')   # cada envio é uma leitura nova
+
+    from sqlalchemy import event
+    from werkzeug.serving import make_server
+
+    import src.routes.correcao as rc
+    from src.main import app
+    from src.models.user import db
+
+    rc.STORAGE_DIR = os.path.join(diretorio, 'storage')
+    contador = ContadorBloqueios()
+    with app.app_context():
+        event.listen(db.engine, 'handle_error', contador)
+
+    servidor = make_server('127.0.0.1', porta, app, threaded=True)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{servidor.server_port}', contador
+
+
+# ── Cliente ──────────────────────────────────────────────────────────────
+
+def _post(url: str, corpo: Dict[str, Any], token: Optional[str] = None,
+          timeout: float = 180) -> Tuple[int, Dict[str, Any]]:
+    headers = {'Content-Type': 'application/json'}
+    if token:
+        headers['Authorization'] = f'Bearer {token}'
+    req = urllib.request.Request(url, data=json.dumps(corpo).encode('utf-8'),
+                                 headers=headers, method='POST')
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return resp.status, json.loads(resp.read() or b'{}')
+    except urllib.error.HTTPError as exc:
+        try:
+            return exc.code, json.loads(exc.read() or b'{}')
+        except ValueError:
+            return exc.code, {}
+
+
+def autenticar(base: str) -> str:
+    _post(f'{base}/api/v2/auth/registrar',
+          {'nome': 'Teste de Carga', 'email': EMAIL_CARGA, 'senha': SENHA_CARGA})
+    http, corpo = _post(f'{base}/api/v2/auth/login',
+                        {'email': EMAIL_CARGA, 'senha': SENHA_CARGA})
+    if http != 200:
+        raise SystemExit(f'Login falhou ({http}): {corpo}')
+    return corpo['token']
+
+
+def gerar_payloads(quantidade: int, num_questoes: int) -> List[Dict[str, Any]]:
+    """Cartões sintéticos distintos (respostas variadas) prontos para envio."""
+    rng = random.Random(7)
+    gabarito = {str(i): ALTS[(i - 1) % 5] for i in range(1, num_questoes + 1)}
+    payloads = []
+    for k in range(quantidade):
+        respostas = {i: (gabarito[str(i)] if rng.random() < 0.8 else rng.choice(ALTS))
+                     for i in range(1, num_questoes + 1)}
+        img = CartaoSintetico(num_questoes=num_questoes).gerar(respostas)
+        ok, buf = cv2.imencode('.jpg', img, [int(cv2.IMWRITE_JPEG_QUALITY), 90])
+        payloads.append({
+            'turma': 'CARGA', 'aluno': f'Aluno {k + 1:03d}',
+            'imagem': 'data:image/jpeg;base64,' + base64.b64encode(buf).decode(),
+            'gabarito_oficial': gabarito,
+            'layout': {'num_questoes': num_questoes, 'num_alternativas': 5,
+                       'num_colunas': 2},
+        })
+    return payloads
+
+
+def disparar(base: str, token: str, payloads: List[Dict[str, Any]], requisicoes: int,
+             concorrencia: int) -> Dict[str, Any]:
+    latencias: List[float] = []
+    codigos: Counter = Counter()
+    lock = threading.Lock()
+
+    def enviar(i: int):
+        inicio = time.perf_counter()
+        try:
+            http, corpo = _post(f'{base}/api/v2/correcoes', payloads[i % len(payloads)], token)
+            chave = str(http) if http < 400 else f"{http} {corpo.get('codigo', '-')}"
+        except Exception as exc:  # timeout, conexão recusada...
+            chave = f'falha {type(exc).__name__}'
+        ms = (time.perf_counter() - inicio) * 1000
+        with lock:
+            latencias.append(ms)
+            codigos[chave] += 1
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concorrencia) as pool:
+        list(pool.map(enviar, range(requisicoes)))
+    duracao = time.perf_counter() - inicio
+
+    def p(q):
+        return round(float(np.percentile(latencias, q)), 1)
+
+    return {
+        'requisicoes': requisicoes,
+        'concorrencia': concorrencia,
+        'duracao_s': round(duracao, 2),
+        'vazao_rps': round(requisicoes / duracao, 2),
+        'latencia_ms': {'p50': p(50), 'p90': p(90), 'p95': p(95), 'p99': p(99),
+                        'max': round(max(latencias), 1),
+                        'media': round(statistics.fmean(latencias), 1)},
+        'respostas': dict(sorted(codigos.items())),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--url', help='API já em execução (padrão: sobe uma em processo)')
+    parser.add_argument('--motor', choices=['ia', 'local'], default='ia',
+                        help='motor de leitura da API em processo')
+    parser.add_argument('--requisicoes', type=int, default=100)
+    parser.add_argument('--concorrencia', type=int, default=8)
+    parser.add_argument('--questoes', type=int, default=44)
+    parser.add_argument('--cartoes', type=int, default=8, help='cartões distintos gerados')
+    parser.add_argument('--latencia-ia', type=float, default=800.0, help='média em ms')
+    parser.add_argument('--erro-ia', type=float, default=0.0, help='fração de falhas (0-1)')
+    parser.add_argument('--porta-ia', type=int, default=0)
+    parser.add_argument('--so-ia-falsa', action='store_true',
+                        help='só sobe o servidor de IA falso e aguarda')
+    parser.add_argument('--saida', default='-', help="relatório JSON ('-' = stdout)")
+    parser.add_argument('--verboso', action='store_true', help='mantém os logs da API')
+    args = parser.parse_args(argv)
+
+    ia = iniciar_ia_falsa(args.porta_ia, args.latencia_ia, args.erro_ia)
+    url_ia = f'http://127.0.0.1:{ia.server_port}/v1/responses'
+    print(f'IA falsa em {url_ia} (latência ~{args.latencia_ia:g} ms, '
+          f'erro {args.erro_ia:.0%})', file=sys.stderr)
+    if args.so_ia_falsa:
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            return 0
+
+    contador = None
+    base = args.url
+    if base is None:
+        base, contador = iniciar_api_local(url_ia, args.motor)
+        if not args.verboso:
+            logging.disable(logging.CRITICAL)   # falhas simuladas geram tracebacks
+    base = base.rstrip('/')
+
+    token = autenticar(base)
+    payloads = gerar_payloads(args.cartoes, args.questoes)
+    relatorio = disparar(base, token, payloads, args.requisicoes, args.concorrencia)
+    relatorio['alvo'] = base
+    relatorio['ia'] = {'latencia_ms': args.latencia_ia, 'erro': args.erro_ia}
+    relatorio['bloqueios_db'] = contador.total if contador else None
+
+    texto = json.dumps(relatorio, indent=2, ensure_ascii=False)
+    if args.saida == '-':
+        print(texto)
+    else:
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            f.write(texto)
+    ia.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,110 @@
+"""Relatório de tempo de import e memória na inicialização da API.
+
+Cada perfil roda num processo Python novo com `-X importtime`:
+- app:            `import src.main` sem migração (como um worker em produção)
+- app+migracao:   idem, migrando o esquema ao importar (padrão antigo)
+- app+aquecido:   app seguido de `aquecimento.aquecer()` (o que o mestre do
+                  gunicorn faz antes do fork)
+
+Relata a mediana do tempo total, o pico de RSS e os pacotes que mais pesam
+no import (tempo próprio somado por pacote de topo).
+
+Uso (a partir da raiz da API):
+    python -m benchmarks.inicializacao [--repeticoes 5] [--top 12] [--json]
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PERFIS = {
+    'app': ('0', 'import src.main'),
+    'app+migracao': ('1', 'import src.main'),
+    'app+aquecido': ('0', 'import src.main\nfrom src.aquecimento import aquecer\naquecer()'),
+}
+
+_MEDIDOR = '''
+import resource, sys, time, json
+inicio = time.perf_counter()
+{codigo}
+ms = (time.perf_counter() - inicio) * 1000
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+print(json.dumps({{"ms": ms, "rss_mb": rss, "cv2": "cv2" in sys.modules}}))
+'''
+
+_LINHA_IMPORTTIME = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)')
+
+
+def _rodar(perfil: str, banco: str) -> Dict[str, Any]:
+    migrar, codigo = PERFIS[perfil]
+    env = {**os.environ, 'MIGRAR_NA_INICIALIZACAO': migrar,
+           'DATABASE_URL': f'sqlite:///{banco}'}
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c',
+                           _MEDIDOR.format(codigo=codigo)],
+                          cwd=RAIZ, env=env, capture_output=True, text=True, check=True)
+    medida = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    por_pacote: Dict[str, float] = defaultdict(float)
+    for linha in proc.stderr.splitlines():
+        m = _LINHA_IMPORTTIME.match(linha)
+        if m:
+            proprio_us, modulo = int(m.group(1)), m.group(4)
+            topo = modulo.split('.')[0] if not modulo.startswith('src.') else \
+                '.'.join(modulo.split('.')[:2])
+            por_pacote[topo] += proprio_us / 1000
+    medida['pacotes_ms'] = dict(por_pacote)
+    return medida
+
+
+def medir(repeticoes: int, top: int) -> Dict[str, Any]:
+    relatorio = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        banco = os.path.join(tmp, 'inicializacao.db')
+        _rodar('app+migracao', banco)      # cria o esquema: perfis sem migração precisam dele
+        for perfil in PERFIS:
+            rodadas = [_rodar(perfil, banco) for _ in range(repeticoes)]
+            pacotes: Dict[str, List[float]] = defaultdict(list)
+            for r in rodadas:
+                for nome, ms in r['pacotes_ms'].items():
+                    pacotes[nome].append(ms)
+            mais_pesados = sorted(((n, statistics.median(v)) for n, v in pacotes.items()),
+                                  key=lambda x: -x[1])[:top]
+            relatorio[perfil] = {
+                'total_ms': round(statistics.median(r['ms'] for r in rodadas), 1),
+                'rss_mb': round(statistics.median(r['rss_mb'] for r in rodadas), 1),
+                'cv2_carregado': rodadas[0]['cv2'],
+                'pacotes_ms': {n: round(ms, 1) for n, ms in mais_pesados},
+            }
+    return relatorio
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--repeticoes', type=int, default=5)
+    parser.add_argument('--top', type=int, default=12)
+    parser.add_argument('--json', action='store_true', help='saída em JSON')
+    args = parser.parse_args(argv)
+
+    relatorio = medir(args.repeticoes, args.top)
+    if args.json:
+        print(json.dumps(relatorio, indent=2, ensure_ascii=False))
+        return 0
+    for perfil, r in relatorio.items():
+        print(f"{perfil:<14} {r['total_ms']:>8.1f} ms  {r['rss_mb']:>6.1f} MB  "
+              f"cv2={'sim' if r['cv2_carregado'] else 'não'}")
+        for nome, ms in r['pacotes_ms'].items():
+            print(f'    {nome:<28} {ms:>8.1f} ms')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
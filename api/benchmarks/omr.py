@@ -0,0 +1,287 @@
+"""Benchmark do pipeline OMR com cartões sintéticos (tests/synthetic).
+
+Mede, por cenário (nº de questões × resolução × degradação), a duração de
+cada etapa de `CorrecaoPipeline.corrigir` (p50/p95), o pico de memória (RSS)
+e a vazão em 1 e N processos. O resultado é um JSON legível por máquina; o
+modo `comparar` falha (código de saída 1) se o p95 total de algum cenário
+piorar além do limite, para uso antes de aceitar mudanças no pipeline.
+
+Uso (a partir da raiz da API):
+    python -m benchmarks.omr executar --saida base.json
+    python -m benchmarks.omr executar --rapido --saida atual.json
+    python -m benchmarks.omr comparar base.json atual.json --limite 10
+
+Cada cenário roda num processo novo, para que o pico de RSS medido seja só
+dele (ru_maxrss é o máximo da vida do processo).
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.omr import CorrecaoPipeline, LayoutProva  # noqa: E402
+from tests.synthetic import CartaoSintetico  # noqa: E402
+
+ALTS = ['A', 'B', 'C', 'D', 'E']
+ETAPAS = ['qualidade', 'preprocessamento', 'deteccao', 'classificacao', 'recortes',
+          'pontuacao']
+
+# Folha base por nº de questões: colunas e tamanho (px) que mantêm as bolhas
+# do CartaoSintetico (raio fixo de 14 px) sem se sobrepor.
+FOLHAS = {
+    20: (2, 1240, 1754),
+    44: (2, 1240, 1754),
+    100: (4, 2480, 3508),
+    200: (4, 2480, 3508),
+}
+
+
+@dataclass
+class Cenario:
+    num_questoes: int = 44
+    megapixels: Optional[float] = None     # None = resolução nativa da folha base
+    ruido: float = 0.0
+    sombra: bool = False
+    rotacao_graus: float = 0.0
+    com_borda_folha: bool = True
+    marcas_duplas: int = 0                 # questões com dupla marcação (viram revisão)
+
+    @property
+    def nome(self) -> str:
+        partes = [f'q{self.num_questoes}',
+                  f'{self.megapixels:g}mp' if self.megapixels else 'nativa']
+        if self.ruido:
+            partes.append(f'ruido{self.ruido:g}')
+        if self.sombra:
+            partes.append('sombra')
+        if self.rotacao_graus:
+            partes.append(f'rot{self.rotacao_graus:g}')
+        if not self.com_borda_folha:
+            partes.append('sem_borda')
+        if self.marcas_duplas:
+            partes.append(f'duplas{self.marcas_duplas}')
+        return '-'.join(partes)
+
+
+@dataclass
+class Config:
+    repeticoes: int = 5
+    processos: int = field(default_factory=lambda: os.cpu_count() or 1)
+    imagens_vazao: int = 8
+
+
+def cenarios_padrao(rapido: bool = False) -> List[Cenario]:
+    if rapido:
+        return [Cenario(20), Cenario(44, 3), Cenario(44, 12, sombra=True),
+                Cenario(100, 12)]
+    lista = [Cenario(n) for n in FOLHAS]
+    lista += [Cenario(44, mp) for mp in (1, 3, 12, 24, 48)]
+    lista += [Cenario(200, mp) for mp in (12, 48)]
+    lista += [
+        Cenario(44, 12, ruido=0.03),
+        Cenario(44, 12, sombra=True),
+        Cenario(44, 12, rotacao_graus=2.0),
+        Cenario(44, 12, com_borda_folha=False),
+        Cenario(44, 12, marcas_duplas=4),
+    ]
+    return lista
+
+
+def gerar_cartao(c: Cenario):
+    """(imagem BGR, gabarito, layout) do cenário."""
+    colunas, largura, altura = FOLHAS[c.num_questoes]
+    respostas = {i: ALTS[(i * 7) % 5] for i in range(1, c.num_questoes + 1)}
+    duplas = {i: ALTS[((i * 7) + 1) % 5]
+              for i in range(1, c.num_questoes + 1)[::max(1, c.num_questoes // max(1, c.marcas_duplas))]
+              } if c.marcas_duplas else None
+    cartao = CartaoSintetico(num_questoes=c.num_questoes, num_colunas=colunas,
+                             largura=largura, altura=altura)
+    img = cartao.gerar(respostas, marcas_duplas=duplas, rotacao_graus=c.rotacao_graus,
+                       sombra=c.sombra, ruido=c.ruido, com_borda_folha=c.com_borda_folha)
+    if c.megapixels:
+        escala = (c.megapixels * 1e6 / (img.shape[0] * img.shape[1])) ** 0.5
+        interp = cv2.INTER_CUBIC if escala > 1 else cv2.INTER_AREA
+        img = cv2.resize(img, None, fx=escala, fy=escala, interpolation=interp)
+    gabarito = {str(k): v for k, v in respostas.items()}
+    layout = LayoutProva(num_questoes=c.num_questoes, num_colunas=colunas)
+    return img, gabarito, layout
+
+
+def _percentil(valores: List[float], p: float) -> float:
+    return float(np.percentile(valores, p)) if valores else 0.0
+
+
+def _rss_mb() -> float:
+    # Linux reporta ru_maxrss em KiB; macOS em bytes
+    fator = 1 / 1024 if platform.system() != 'Darwin' else 1 / (1024 * 1024)
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * fator, 1)
+
+
+def _medir_cenario(cenario: Cenario, repeticoes: int) -> Dict[str, Any]:
+    """Roda no processo filho: latência por etapa, acurácia e pico de RSS."""
+    img, gabarito, layout = gerar_cartao(cenario)
+    pipeline = CorrecaoPipeline()
+    pipeline.corrigir(img, gabarito, layout)        # aquecimento (imports, caches do OpenCV)
+    rss_antes = _rss_mb()
+
+    por_etapa: Dict[str, List[float]] = {e: [] for e in ETAPAS}
+    totais: List[float] = []
+    resultado: Dict[str, Any] = {}
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = pipeline.corrigir(img, gabarito, layout)
+        totais.append((time.perf_counter() - inicio) * 1000)
+        for etapa, ms in pipeline.tempos.items():
+            por_etapa.setdefault(etapa, []).append(ms)
+
+    resumo = resultado.get('resumo') or {}
+    return {
+        'cenario': cenario.nome,
+        'parametros': asdict(cenario),
+        'resolucao': [int(img.shape[1]), int(img.shape[0])],
+        'status': resultado.get('status'),
+        'acertos': resumo.get('acertos'),
+        'pendentes_revisao': resumo.get('pendentes_revisao'),
+        'latencia_ms': {
+            'p50': round(statistics.median(totais), 2),
+            'p95': round(_percentil(totais, 95), 2),
+            'min': round(min(totais), 2),
+        },
+        'etapas_ms': {e: {'p50': round(statistics.median(v), 2),
+                          'p95': round(_percentil(v, 95), 2)}
+                      for e, v in por_etapa.items() if v},
+        'rss_antes_mb': rss_antes,
+        'rss_pico_mb': _rss_mb(),
+    }
+
+
+def _corrigir_uma(args):
+    img, gabarito, layout = args
+    CorrecaoPipeline().corrigir(img, gabarito, layout)
+
+
+def medir_vazao(cenario: Cenario, processos: int, imagens: int) -> float:
+    """Cartões por segundo corrigindo `imagens` cópias em `processos` processos."""
+    img, gabarito, layout = gerar_cartao(cenario)
+    tarefas = [(img, gabarito, layout)] * imagens
+    ctx = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=processos, mp_context=ctx) as pool:
+        list(pool.map(_corrigir_uma, tarefas[:processos]))   # aquecimento dos workers
+        inicio = time.perf_counter()
+        list(pool.map(_corrigir_uma, tarefas))
+        duracao = time.perf_counter() - inicio
+    return round(imagens / duracao, 2)
+
+
+def executar(cenarios: List[Cenario], config: Config) -> Dict[str, Any]:
+    ctx = multiprocessing.get_context('spawn')
+    resultados = []
+    for cenario in cenarios:
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+            r = pool.submit(_medir_cenario, cenario, config.repeticoes).result()
+        print(f"{r['cenario']:<32} p50={r['latencia_ms']['p50']:>9.1f} ms "
+              f"p95={r['latencia_ms']['p95']:>9.1f} ms  rss={r['rss_pico_mb']:>7.1f} MB  "
+              f"{r['status']}", file=sys.stderr)
+        resultados.append(r)
+
+    referencia = Cenario(44, 12)
+    vazao = {'cenario': referencia.nome, 'imagens': config.imagens_vazao,
+             'cartoes_por_segundo': {}}
+    for n in sorted({1, config.processos}):
+        vazao['cartoes_por_segundo'][str(n)] = medir_vazao(referencia, n,
+                                                           config.imagens_vazao)
+        print(f"vazão {n} processo(s): {vazao['cartoes_por_segundo'][str(n)]} cartões/s",
+              file=sys.stderr)
+
+    return {
+        'gerado_em': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'ambiente': {'python': platform.python_version(), 'opencv': cv2.__version__,
+                     'numpy': np.__version__, 'cpus': os.cpu_count(),
+                     'plataforma': platform.platform()},
+        'config': asdict(config),
+        'cenarios': resultados,
+        'vazao': vazao,
+    }
+
+
+def comparar(base: Dict[str, Any], atual: Dict[str, Any], limite_pct: float,
+             tolerancia_ms: float = 2.0) -> List[str]:
+    """Regressões de p95 total acima de `limite_pct`% (e de `tolerancia_ms`,
+    para não acusar ruído em cenários de poucos milissegundos)."""
+    anteriores = {r['cenario']: r for r in base['cenarios']}
+    regressoes = []
+    for r in atual['cenarios']:
+        b = anteriores.get(r['cenario'])
+        if b is None:
+            continue
+        p95_base, p95_atual = b['latencia_ms']['p95'], r['latencia_ms']['p95']
+        if (p95_atual > p95_base * (1 + limite_pct / 100)
+                and p95_atual - p95_base > tolerancia_ms):
+            piores = sorted(
+                ((e, v['p95'] - b['etapas_ms'].get(e, {}).get('p95', 0.0))
+                 for e, v in r['etapas_ms'].items()), key=lambda x: -x[1])
+            regressoes.append(
+                f"{r['cenario']}: p95 {p95_base:.1f} → {p95_atual:.1f} ms "
+                f"(+{(p95_atual / p95_base - 1) * 100:.0f}%; etapa que mais piorou: "
+                f"{piores[0][0]} +{piores[0][1]:.1f} ms)")
+    return regressoes
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    sub = parser.add_subparsers(dest='comando', required=True)
+
+    p_exec = sub.add_parser('executar', help='roda os cenários e grava o JSON')
+    p_exec.add_argument('--saida', default='-', help="arquivo JSON ('-' = stdout)")
+    p_exec.add_argument('--rapido', action='store_true', help='poucos cenários')
+    p_exec.add_argument('--repeticoes', type=int, default=Config.repeticoes)
+    p_exec.add_argument('--processos', type=int, default=os.cpu_count() or 1)
+    p_exec.add_argument('--imagens-vazao', type=int, default=Config.imagens_vazao)
+
+    p_cmp = sub.add_parser('comparar', help='falha se o p95 piorar além do limite')
+    p_cmp.add_argument('base')
+    p_cmp.add_argument('atual')
+    p_cmp.add_argument('--limite', type=float, default=10.0, help='piora máxima (%%)')
+    p_cmp.add_argument('--tolerancia-ms', type=float, default=2.0)
+
+    args = parser.parse_args(argv)
+    if args.comando == 'executar':
+        config = Config(repeticoes=args.repeticoes, processos=args.processos,
+                        imagens_vazao=args.imagens_vazao)
+        relatorio = executar(cenarios_padrao(args.rapido), config)
+        texto = json.dumps(relatorio, indent=2, ensure_ascii=False)
+        if args.saida == '-':
+            print(texto)
+        else:
+            with open(args.saida, 'w', encoding='utf-8') as f:
+                f.write(texto)
+        return 0
+
+    with open(args.base, encoding='utf-8') as f:
+        base = json.load(f)
+    with open(args.atual, encoding='utf-8') as f:
+        atual = json.load(f)
+    regressoes = comparar(base, atual, args.limite, args.tolerancia_ms)
+    for linha in regressoes:
+        print('REGRESSÃO ' + linha)
+    if not regressoes:
+        print(f'Sem regressões de p95 acima de {args.limite:g}%.')
+    return 1 if regressoes else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
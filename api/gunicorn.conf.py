@@ -0,0 +1,37 @@
+"""Configuração do gunicorn com pool de workers pré-aquecido.
+
+    gunicorn -c gunicorn.conf.py
+
+O mestre carrega o app uma vez (preload), pré-importa OpenCV/NumPy/pipeline
+(src/aquecimento.py) e só então faz o fork dos workers, que herdam tudo
+compartilhado por copy-on-write. O esquema do banco é migrado fora daqui
+(`python -m src.migrar` no deploy).
+
+Variáveis: PORT, WEB_CONCURRENCY (workers), GUNICORN_THREADS,
+GUNICORN_TIMEOUT, AQUECER_V1=1 (pré-carrega também o processador legado).
+"""
+
+import os
+
+os.environ.setdefault('MIGRAR_NA_INICIALIZACAO', '0')
+
+wsgi_app = 'src.main:app'
+bind = f"0.0.0.0:{os.environ.get('PORT', '5001')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+preload_app = True
+
+
+def when_ready(server):
+    # Roda no mestre, depois do preload do app e antes do fork dos workers
+    from src.aquecimento import aquecer
+    aquecer(incluir_v1=os.environ.get('AQUECER_V1') == '1')
+
+
+def post_fork(server, worker):
+    # Conexões abertas pelo mestre (ex.: migração) não podem ser compartilhadas
+    from src.main import app
+    from src.models.user import db
+    with app.app_context():
+        db.engine.dispose(close=False)
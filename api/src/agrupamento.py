@@ -0,0 +1,86 @@
+"""Agrupamento de questões pendentes parecidas (revisão em bloco).
+
+Numa turma, muitas questões duvidosas se repetem: o mesmo lápis fraco, a
+mesma borracha mal passada, a mesma dupla marcação. Cada questão vira um
+vetor — preenchimento de cada alternativa e, quando houver recorte, uma
+miniatura em cinza — e um k-means simples em NumPy junta as próximas, para
+o professor decidir "todas estas são A" de uma vez.
+
+O número de grupos não é fixo: cresce até todo ponto ficar a no máximo
+`raio` do centro do seu grupo (ou até `max_grupos`). Com a mesma entrada o
+resultado é sempre o mesmo (semente fixa).
+"""
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.omr.classifier import LIMIAR_BRANCO
+
+RAIO_PADRAO = 0.15          # distância máxima ao centro, no espaço dos preenchimentos
+MAX_GRUPOS = 30
+MINIATURA_TAMANHO = (24, 6)  # largura x altura da miniatura do recorte
+PESO_MINIATURA = 0.5        # peso da miniatura inteira frente aos preenchimentos
+
+
+def vetor_preenchimentos(preenchimentos: Dict[str, float],
+                         alternativas: Sequence[str]) -> np.ndarray:
+    return np.array([preenchimentos.get(a, 0.0) for a in alternativas], np.float32)
+
+
+def miniatura(recorte: np.ndarray) -> np.ndarray:
+    """Miniatura em cinza do recorte, centrada na média (o que importa é o
+    padrão das marcas, não o brilho da foto), com norma ≤ PESO_MINIATURA."""
+    import cv2
+    if recorte.ndim == 3:
+        recorte = cv2.cvtColor(recorte, cv2.COLOR_BGR2GRAY)
+    mini = cv2.resize(recorte, MINIATURA_TAMANHO, interpolation=cv2.INTER_AREA)
+    mini = mini.astype(np.float32).ravel() / 255.0
+    mini -= mini.mean()
+    return mini * (PESO_MINIATURA / np.sqrt(mini.size))
+
+
+def kmeans(pontos: np.ndarray, k: int, iteracoes: int = 50,
+           semente: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """k-means (início k-means++). Devolve (rótulo de cada ponto, centros)."""
+    n = len(pontos)
+    rng = np.random.default_rng(semente)
+    centros = [pontos[rng.integers(n)]]
+    d2 = ((pontos - centros[0]) ** 2).sum(1)
+    while len(centros) < k and d2.sum() > 0:
+        centros.append(pontos[rng.choice(n, p=d2 / d2.sum())])
+        d2 = np.minimum(d2, ((pontos - centros[-1]) ** 2).sum(1))
+    centros = np.array(centros)
+
+    rotulos = np.zeros(n, np.int64)
+    for _ in range(iteracoes):
+        distancias = ((pontos[:, None, :] - centros[None, :, :]) ** 2).sum(2)
+        rotulos = distancias.argmin(1)
+        contagem = np.bincount(rotulos, minlength=len(centros))
+        somas = np.zeros_like(centros)
+        np.add.at(somas, rotulos, pontos)
+        novos = np.where(contagem[:, None] > 0,
+                         somas / np.maximum(contagem, 1)[:, None], centros)
+        if np.allclose(novos, centros):
+            break
+        centros = novos
+    return rotulos, centros
+
+
+def agrupar(pontos: np.ndarray, raio: float = RAIO_PADRAO,
+            max_grupos: int = MAX_GRUPOS) -> List[np.ndarray]:
+    """Índices de cada grupo, do maior para o menor."""
+    if len(pontos) == 0:
+        return []
+    for k in range(1, min(max_grupos, len(pontos)) + 1):
+        rotulos, centros = kmeans(pontos, k)
+        if np.sqrt(((pontos - centros[rotulos]) ** 2).sum(1)).max() <= raio:
+            break
+    grupos = [np.flatnonzero(rotulos == j) for j in range(len(centros))]
+    return sorted((g for g in grupos if len(g)), key=lambda g: (-len(g), g[0]))
+
+
+def sugestao(centro: Dict[str, float]) -> Optional[str]:
+    """Alternativa mais preenchida em média; None se o grupo parece em branco."""
+    alternativa, maior = max(centro.items(), key=lambda kv: kv[1])
+    return alternativa if maior >= LIMIAR_BRANCO else None
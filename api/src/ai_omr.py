@@ -24,6 +24,7 @@ from src.omr.classifier import (
     STATUS_OK,
 )
 from src.omr.pipeline import STATUS_APROVADA, STATUS_REVISAO, LayoutProva
+from src.omr.pontuacao import aplicar_gabarito
 
 logger = logging.getLogger('api.ai_omr')
 
@@ -200,8 +201,12 @@ def _questao_ia(numero: int, item: Optional[Dict[str, Any]],
     }
 
 
-def resultado_por_ia(image: np.ndarray, gabarito: Dict[str, str],
-                     layout: LayoutProva) -> Dict[str, Any]:
+def leitura_por_ia(image: np.ndarray, gabarito: Dict[str, str],
+                   layout: LayoutProva) -> Dict[str, Any]:
+    """Leitura por questão sugerida pela IA, ainda sem pontuação.
+
+    O gabarito vai no prompt só como referência de quantidade de questões.
+    """
     bruto = _chamar_openai(image, gabarito, layout)
     items = bruto.get('questions') or []
     por_numero = {}
@@ -216,48 +221,22 @@ def resultado_por_ia(image: np.ndarray, gabarito: Dict[str, str],
         _questao_ia(numero, por_numero.get(numero), layout.alternativas)
         for numero in range(1, layout.num_questoes + 1)
     ]
-
-    acertos = erros = em_branco = pendentes = 0
-    for q in questoes:
-        correta = gabarito.get(str(q['numero']))
-        q['resposta_correta'] = correta
-        if q['precisa_revisao']:
-            pendentes += 1
-            q['acertou'] = None
-        elif q['status'] == STATUS_EM_BRANCO:
-            em_branco += 1
-            erros += 1
-            q['acertou'] = False
-        else:
-            acertou = q['alternativa_detectada'] == correta
-            acertos += int(acertou)
-            erros += int(not acertou)
-            q['acertou'] = acertou
-
-    total = layout.num_questoes
-    nota = round(acertos / total * 10, 2) if total else 0.0
-    nota_maxima = round((acertos + pendentes) / total * 10, 2) if total else 0.0
-    status = STATUS_APROVADA if pendentes == 0 else STATUS_REVISAO
+    pendentes = sum(1 for q in questoes if q['precisa_revisao'])
     return {
-        'status': status,
+        'status': STATUS_APROVADA if pendentes == 0 else STATUS_REVISAO,
         'qualidade': {'aprovada': True, 'problemas': []},
         'folha': {'detectada': None, 'metodo': 'ia_visual'},
         'deteccao': {
             'metodo': 'ia_visual',
             'bolhas_localizadas': sum(1 for q in questoes if q['status'] != STATUS_NAO_LIDA),
         },
-        'gabarito_usado': gabarito,
         'questoes': questoes,
-        'resumo': {
-            'total_questoes': total,
-            'acertos': acertos,
-            'erros': erros,
-            'em_branco': em_branco,
-            'pendentes_revisao': pendentes,
-            'nota_provisoria': nota,
-            'nota_maxima_possivel': nota_maxima,
-            'nota_confirmada': nota if pendentes == 0 else None,
-        },
         'diagnostico': ['Leitura feita por IA visual e validada por regras do backend.'],
         'ia': {'provider': 'openai', 'model': os.environ.get('AI_OMR_MODEL', 'gpt-4o-mini')},
     }
+
+
+def resultado_por_ia(image: np.ndarray, gabarito: Dict[str, str],
+                     layout: LayoutProva) -> Dict[str, Any]:
+    return aplicar_gabarito(leitura_por_ia(image, gabarito, layout),
+                            gabarito, layout.num_questoes)
@@ -0,0 +1,245 @@
+"""Ajuste offline dos limiares do classificador com as revisões dos professores.
+
+Cada revisão em `revisoes_json` é a resposta certa de uma questão que o
+classificador achou duvidosa; junto com os `preenchimentos` gravados na
+leitura ela vira um exemplo rotulado. As demais questões de correções
+confirmadas entram com a leitura automática como rótulo (implícito): não
+ensinam nada sobre os casos difíceis, mas mostram o quanto de aprovação
+automática um conjunto de limiares mantém.
+
+O ajuste testa uma grade de limiares (marcada × branco × separação ×
+confiança, dentro de GRADE) com o classificador vetorizado em NumPy e fica
+com o que aprova mais questões sem NENHUM falso positivo observado; no
+empate, o mais próximo dos limiares atuais. Sem revisões suficientes
+(MIN_REVISOES) nada é proposto.
+
+O resultado vai para um arquivo de parâmetros versionado
+(`limiares-v<N>.json`, por padrão em STORAGE_DIR/limiares), que o pipeline
+carrega com LIMIARES_ARQUIVO=<arquivo>. A mudança vale para as leituras
+novas; para aplicá-la às pendentes, rode o reprocessamento.
+
+Uso (a partir da raiz da API):
+    python -m src.ajuste_limiares [--turma 3A] [--saida DIR] [--simular]
+"""
+
+import argparse
+import glob
+import json
+import logging
+import os
+import re
+import sys
+import tempfile
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from src.models.correcao import Correcao
+from src.models.user import db
+from src.omr.calibracao import calibravel
+from src.omr.classifier import STATUS_EM_BRANCO, Limiares, limiares_configurados
+
+logger = logging.getLogger('api.ajuste_limiares')
+
+STATUS_CONFIRMADA = 'CONFIRMADA'
+MIN_REVISOES = 30
+
+# Faixas exploradas; os extremos são também o envelope de segurança do ajuste
+GRADE = {
+    'marcada': np.round(np.arange(0.35, 0.601, 0.025), 3),
+    'branco': np.round(np.arange(0.15, 0.401, 0.01), 3),
+    'separacao': np.round(np.arange(0.15, 0.401, 0.025), 3),
+    'confianca': np.round(np.arange(0.60, 0.901, 0.05), 3),
+}
+
+
+# ── Dados ────────────────────────────────────────────────────────────────
+
+def montar_dataset(turma: Optional[str] = None) -> Dict[str, Any]:
+    """Exemplos rotulados das correções gravadas; exige contexto Flask.
+
+    Devolve {'alternativas', 'preenchimentos' (N×K), 'rotulos' (índice da
+    alternativa, -1 = em branco), 'revisados' (bool: rótulo de revisão)}.
+    Ficam de fora as leituras da IA visual (os `preenchimentos` dela são a
+    confiança na resposta, não frações pintadas), as do modo grade, cujas
+    posições não foram validadas, e as questões sem bolhas lidas.
+    """
+    consulta = Correcao.query.filter(db.or_(Correcao.revisoes_json.isnot(None),
+                                            Correcao.status == STATUS_CONFIRMADA))
+    if turma:
+        consulta = consulta.filter(Correcao.turma == turma)
+
+    exemplos = []
+    for correcao in consulta.order_by(Correcao.id):
+        resultado = correcao.resultado
+        if not calibravel(resultado):
+            continue
+        revisoes = correcao.revisoes
+        confirmada = correcao.status == STATUS_CONFIRMADA
+        for q in resultado.get('questoes', []):
+            preenchimentos = q.get('preenchimentos')
+            if not preenchimentos:
+                continue
+            revisao = revisoes.get(str(q['numero']))
+            if revisao is not None:
+                exemplos.append((preenchimentos, revisao['alternativa'], True))
+            elif confirmada and not q.get('precisa_revisao'):
+                rotulo = None if q['status'] == STATUS_EM_BRANCO else q['alternativa_detectada']
+                exemplos.append((preenchimentos, rotulo, False))
+
+    alternativas = sorted({a for p, _, _ in exemplos for a in p}) or ['A', 'B', 'C', 'D', 'E']
+    indice = {a: i for i, a in enumerate(alternativas)}
+    return {
+        'alternativas': alternativas,
+        'preenchimentos': np.array([[p.get(a, 0.0) for a in alternativas]
+                                    for p, _, _ in exemplos],
+                                   np.float64).reshape(-1, len(alternativas)),
+        'rotulos': np.array([indice.get(r, -1) if r is not None else -1
+                             for _, r, _ in exemplos], np.int64),
+        'revisados': np.array([rev for _, _, rev in exemplos], bool),
+    }
+
+
+# ── Avaliação vetorizada ─────────────────────────────────────────────────
+
+class Avaliador:
+    """classifier.classificar_questao sobre todos os exemplos de uma vez."""
+
+    def __init__(self, preenchimentos: np.ndarray, rotulos: np.ndarray):
+        self.preenchimentos = preenchimentos
+        self.rotulos = rotulos
+        ordenados = np.sort(preenchimentos, axis=1)[:, ::-1]
+        self.p1 = ordenados[:, 0]
+        self.p2 = ordenados[:, 1] if preenchimentos.shape[1] > 1 else np.zeros(len(rotulos))
+        self.escolhida = preenchimentos.argmax(1)
+        # Mesma fórmula (e arredondamento) de classifier._confianca_marcada
+        forca = np.minimum(1.0, self.p1 / 0.7)
+        separacao = np.minimum(1.0, (self.p1 - self.p2) / 0.5)
+        self.confianca = np.round(0.45 * forca + 0.55 * separacao, 3)
+        self.errada = self.escolhida != rotulos
+        self.rotulo_branco = rotulos == -1
+        self._acima: Dict[float, np.ndarray] = {}
+
+    def _multipla(self, marcada: float) -> np.ndarray:
+        if marcada not in self._acima:
+            self._acima[marcada] = (self.preenchimentos >= marcada).sum(1) >= 2
+        return self._acima[marcada]
+
+    def avaliar(self, limiares: Limiares) -> Dict[str, int]:
+        """Aprovações automáticas e falsos positivos com estes limiares."""
+        branco = self.p1 < limiares.branco
+        ok = (~branco & ~self._multipla(limiares.marcada) & (self.p1 >= limiares.marcada)
+              & ((self.p1 - self.p2) >= limiares.separacao)
+              & (self.confianca >= limiares.confianca))
+        falsos = (branco & ~self.rotulo_branco) | (ok & self.errada)
+        return {'aprovadas': int(branco.sum() + ok.sum()), 'falsos_positivos': int(falsos.sum())}
+
+
+def _distancia(a: Limiares, b: Limiares) -> float:
+    return (abs(a.marcada - b.marcada) + abs(a.branco - b.branco)
+            + abs(a.separacao - b.separacao) + abs(a.confianca - b.confianca))
+
+
+def ajustar(dataset: Dict[str, Any], atuais: Optional[Limiares] = None,
+            minimo_revisoes: int = MIN_REVISOES) -> Dict[str, Any]:
+    """Busca na GRADE os limiares com mais aprovações e zero falsos positivos.
+
+    Devolve o relatório; 'limiares' fica None quando não há revisões
+    suficientes ou nenhum candidato supera os limiares atuais.
+    """
+    atuais = atuais or limiares_configurados()
+    avaliador = Avaliador(dataset['preenchimentos'], dataset['rotulos'])
+    revisoes = int(dataset['revisados'].sum())
+    relatorio = {
+        'exemplos': int(len(dataset['rotulos'])),
+        'revisoes': revisoes,
+        'atuais': {**atuais.to_dict(), **avaliador.avaliar(atuais)},
+        'limiares': None,
+        'metricas': None,
+    }
+    if revisoes < minimo_revisoes:
+        relatorio['motivo'] = (f'Só {revisoes} revisões; o ajuste precisa de pelo menos '
+                               f'{minimo_revisoes}.')
+        return relatorio
+
+    melhor, melhor_metricas = None, None
+    for marcada in GRADE['marcada']:
+        for branco in GRADE['branco'][GRADE['branco'] < marcada]:
+            for separacao in GRADE['separacao']:
+                for confianca in GRADE['confianca']:
+                    candidato = Limiares(marcada=float(marcada), branco=float(branco),
+                                         separacao=float(separacao),
+                                         confianca=float(confianca), origem='ajuste')
+                    metricas = avaliador.avaliar(candidato)
+                    if metricas['falsos_positivos']:
+                        continue
+                    if (melhor is None or metricas['aprovadas'] > melhor_metricas['aprovadas']
+                            or (metricas['aprovadas'] == melhor_metricas['aprovadas']
+                                and _distancia(candidato, atuais) < _distancia(melhor, atuais))):
+                        melhor, melhor_metricas = candidato, metricas
+
+    if melhor is None or melhor_metricas['aprovadas'] <= relatorio['atuais']['aprovadas']:
+        relatorio['motivo'] = 'Nenhum candidato aprova mais que os limiares atuais sem erro.'
+        return relatorio
+    relatorio['limiares'] = melhor.to_dict()
+    relatorio['metricas'] = melhor_metricas
+    return relatorio
+
+
+# ── Arquivo de parâmetros ────────────────────────────────────────────────
+
+def diretorio_padrao() -> str:
+    import src.routes.correcao as rotas
+    return os.path.join(rotas.STORAGE_DIR, 'limiares')
+
+
+def gravar_parametros(relatorio: Dict[str, Any], diretorio: Optional[str] = None) -> str:
+    """Grava `limiares-v<N+1>.json` (N = maior versão existente) e devolve o caminho."""
+    diretorio = diretorio or diretorio_padrao()
+    os.makedirs(diretorio, exist_ok=True)
+    versoes = [int(m.group(1)) for m in
+               (re.search(r'limiares-v(\d+)\.json$', c)
+                for c in glob.glob(os.path.join(diretorio, 'limiares-v*.json'))) if m]
+    versao = max(versoes, default=0) + 1
+    caminho = os.path.join(diretorio, f'limiares-v{versao}.json')
+    parametros = {
+        'versao': versao,
+        'gerado_em': datetime.now(timezone.utc).isoformat(),
+        'limiares': {k: v for k, v in relatorio['limiares'].items() if k != 'origem'},
+        'metricas': relatorio['metricas'],
+        'anteriores': relatorio['atuais'],
+        'exemplos': relatorio['exemplos'],
+        'revisoes': relatorio['revisoes'],
+    }
+    fd, temporario = tempfile.mkstemp(dir=diretorio, suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(parametros, f, indent=2, ensure_ascii=False)
+    os.replace(temporario, caminho)
+    return caminho
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--turma', help='só as correções desta turma')
+    parser.add_argument('--saida', help='diretório dos arquivos de parâmetros '
+                                        '(padrão: STORAGE_DIR/limiares)')
+    parser.add_argument('--minimo-revisoes', type=int, default=MIN_REVISOES)
+    parser.add_argument('--simular', action='store_true',
+                        help='só mostra a proposta, sem gravar o arquivo')
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from src.main import app
+    with app.app_context():
+        relatorio = ajustar(montar_dataset(args.turma), minimo_revisoes=args.minimo_revisoes)
+    print(json.dumps(relatorio, indent=2, ensure_ascii=False))
+    if relatorio['limiares'] is None or args.simular:
+        return 0
+    caminho = gravar_parametros(relatorio, args.saida)
+    print(f'Parâmetros gravados em {caminho}; use LIMIARES_ARQUIVO={caminho}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,49 @@
+"""Perfil de inicialização dos workers.
+
+O app importa só o essencial (Flask, SQLAlchemy, blueprints); OpenCV, NumPy,
+o pipeline OMR e o processador legado da v1 são importados na primeira
+requisição que os usa. Isso deixa o boot de um worker isolado rápido.
+
+Com o gunicorn em modo preload (gunicorn.conf.py), o processo mestre chama
+`aquecer()` antes do fork: os módulos pesados ficam carregados uma vez e são
+compartilhados pelos workers por copy-on-write, sem custo de import na
+primeira correção de cada worker.
+"""
+
+import gc
+import logging
+import time
+
+logger = logging.getLogger('api.aquecimento')
+
+# Módulos carregados sob demanda pelas rotas
+MODULOS_PESADOS = (
+    'cv2',
+    'numpy',
+    'src.omr.pipeline',
+    'src.ai_omr',
+)
+
+
+def aquecer(incluir_v1: bool = False) -> float:
+    """Importa os módulos pesados e exercita o OpenCV uma vez; devolve ms."""
+    import importlib
+
+    inicio = time.perf_counter()
+    for nome in MODULOS_PESADOS + (('src.vision_processor',) if incluir_v1 else ()):
+        importlib.import_module(nome)
+
+    import cv2
+    import numpy as np
+    # Inicializa tabelas internas e o codec JPEG antes do fork
+    img = np.full((64, 64, 3), 255, np.uint8)
+    ok, buf = cv2.imencode('.jpg', img)
+    cv2.imdecode(buf, cv2.IMREAD_COLOR)
+
+    # Objetos criados até aqui não mudam mais: tirá-los do coletor evita que
+    # cada worker suje (e copie) as páginas deles ao rodar o gc
+    gc.collect()
+    gc.freeze()
+    ms = (time.perf_counter() - inicio) * 1000
+    logger.info('Módulos pesados pré-carregados em %.0f ms', ms)
+    return ms
@@ -0,0 +1,126 @@
+"""Cache opcional em disco das folhas pré-processadas (memória mapeada).
+
+Guarda, por foto, o que o pré-processamento produz — folha retificada em
+cinza e binária, na largura de trabalho — como `.npy` abertos depois com
+`np.load(mmap_mode='r')`. Um reprocessamento em lote (mudança de
+classificador, de limiares, de layout) então pula decodificação, avaliação
+de qualidade, busca da folha, warp e binarização, e as páginas só entram em
+memória quando a detecção as toca; workers que leem a mesma folha dividem o
+page cache do sistema.
+
+A chave é o hash dos bytes da foto (que identifica a correção: cada uma
+guarda o seu original) com a versão do pré-processamento e o método de
+iluminação — o que muda o resultado desta etapa. Mudanças só do layout ou do
+classificador reaproveitam a folha.
+
+Desligado por padrão (CACHE_FOLHAS=1 liga): cada folha ocupa ~2,5 MB.
+Cada entrada é um diretório com cinza.npy, binaria.npy e meta.json; a
+expulsão é LRU pelo mtime, como em cache_leituras.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+from typing import Optional
+
+import numpy as np
+
+from src.omr.preprocess import VERSAO_PREPROCESSAMENTO, FolhaPreprocessada
+
+logger = logging.getLogger('api.cache_folhas')
+
+MAX_ENTRADAS_PADRAO = 500
+
+
+def cache_folhas_ativo() -> bool:
+    return os.environ.get('CACHE_FOLHAS', '0') == '1'
+
+
+def chave_folha(hash_img: str, iluminacao: str, marcadores: bool = False) -> str:
+    bruto = json.dumps({'imagem': hash_img, 'preprocessamento': VERSAO_PREPROCESSAMENTO,
+                        'iluminacao': iluminacao, 'marcadores': marcadores}, sort_keys=True)
+    return hashlib.sha256(bruto.encode('utf-8')).hexdigest()
+
+
+class CacheFolhas:
+    """Folhas guardadas como `<chave>/{cinza,binaria}.npy` em `diretorio`."""
+
+    def __init__(self, diretorio: str, max_entradas: Optional[int] = None):
+        self.diretorio = diretorio
+        if max_entradas is None:
+            max_entradas = int(os.environ.get('CACHE_FOLHAS_MAX', MAX_ENTRADAS_PADRAO))
+        self.max_entradas = max_entradas
+
+    @property
+    def ativo(self) -> bool:
+        return self.max_entradas > 0
+
+    def _caminho(self, chave: str) -> str:
+        return os.path.join(self.diretorio, chave)
+
+    def obter(self, chave: str) -> Optional[FolhaPreprocessada]:
+        """Folha com as imagens mapeadas (somente leitura), ou None."""
+        if not self.ativo:
+            return None
+        caminho = self._caminho(chave)
+        try:
+            with open(os.path.join(caminho, 'meta.json'), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            cinza = np.load(os.path.join(caminho, 'cinza.npy'), mmap_mode='r')
+            binaria = np.load(os.path.join(caminho, 'binaria.npy'), mmap_mode='r')
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            logger.warning('Folha em cache ilegível descartada: %s', caminho)
+            self._remover(caminho)
+            return None
+        try:
+            os.utime(caminho)  # marca como usada recentemente (LRU)
+        except OSError:
+            pass
+        return FolhaPreprocessada(cinza=cinza, binaria=binaria, **meta)
+
+    def guardar(self, chave: str, folha: FolhaPreprocessada):
+        if not self.ativo:
+            return
+        os.makedirs(self.diretorio, exist_ok=True)
+        # Escrita atômica: a entrada é montada num diretório temporário e
+        # renomeada inteira, então ninguém mapeia um .npy pela metade
+        temporario = tempfile.mkdtemp(dir=self.diretorio, suffix='.tmp')
+        try:
+            np.save(os.path.join(temporario, 'cinza.npy'), np.ascontiguousarray(folha.cinza))
+            np.save(os.path.join(temporario, 'binaria.npy'),
+                    np.ascontiguousarray(folha.binaria))
+            with open(os.path.join(temporario, 'meta.json'), 'w', encoding='utf-8') as f:
+                json.dump({'folha_detectada': folha.folha_detectada, 'metodo': folha.metodo,
+                           'quadrilatero': folha.quadrilatero,
+                           'qualidade': folha.qualidade}, f)
+            destino = self._caminho(chave)
+            self._remover(destino)
+            os.replace(temporario, destino)
+        except OSError:
+            logger.warning('Não foi possível guardar a folha em cache', exc_info=True)
+            self._remover(temporario)
+            return
+        self._expulsar()
+
+    def _expulsar(self):
+        entradas = []
+        with os.scandir(self.diretorio) as it:
+            for e in it:
+                if e.is_dir() and not e.name.endswith('.tmp'):
+                    try:
+                        entradas.append((e.stat().st_mtime, e.path))
+                    except OSError:
+                        continue
+        excesso = len(entradas) - self.max_entradas
+        if excesso > 0:
+            for _, caminho in sorted(entradas)[:excesso]:
+                self._remover(caminho)
+
+    @staticmethod
+    def _remover(caminho: str):
+        shutil.rmtree(caminho, ignore_errors=True)
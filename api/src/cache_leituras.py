@@ -0,0 +1,118 @@
+"""Cache local em disco das leituras de cartões (LRU por data de acesso).
+
+A chave combina o hash dos bytes da imagem, o layout, o motor de leitura e a
+versão do algoritmo. Na leitura local o gabarito fica de fora de propósito: a
+leitura não depende dele, então trocar o gabarito reaproveita a leitura
+guardada e só refaz a pontuação (`omr.pontuacao.aplicar_gabarito`). A IA
+visual recebe o gabarito no prompt, então a leitura dela leva o hash do
+gabarito na chave.
+
+Serve a dois casos: reenvio da mesma foto e `reprocessar` sem mudança de
+versão do algoritmo. Cada entrada é um JSON; o acesso atualiza o mtime e,
+acima do limite de entradas, as menos usadas recentemente são apagadas. A
+varredura do diretório para isso roda a cada EXPULSAR_A_CADA gravações do
+processo, não em toda gravação: o limite pode ser excedido nesse intervalo.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger('api.cache_leituras')
+
+MAX_ENTRADAS_PADRAO = 2000
+EXPULSAR_A_CADA = 50
+
+_gravacoes: Dict[str, int] = {}    # por diretório, neste processo
+_lock_gravacoes = threading.Lock()
+
+
+def hash_imagem(dados: bytes) -> str:
+    return hashlib.sha256(dados).hexdigest()
+
+
+def chave_leitura(hash_img: str, layout: Dict[str, Any], motor: str, versao: str,
+                  gabarito: Optional[Dict[str, Any]] = None) -> str:
+    """`gabarito`: só para motores cuja leitura depende dele (a IA visual)."""
+    dados = {'imagem': hash_img, 'layout': layout, 'motor': motor, 'versao': versao}
+    if gabarito is not None:
+        dados['gabarito'] = hashlib.sha256(
+            json.dumps(gabarito, sort_keys=True).encode('utf-8')).hexdigest()
+    bruto = json.dumps(dados, sort_keys=True)
+    return hashlib.sha256(bruto.encode('utf-8')).hexdigest()
+
+
+class CacheLeituras:
+    """Leituras guardadas como `<chave>.json` em `diretorio`."""
+
+    def __init__(self, diretorio: str, max_entradas: Optional[int] = None):
+        self.diretorio = diretorio
+        if max_entradas is None:
+            max_entradas = int(os.environ.get('CACHE_LEITURAS_MAX', MAX_ENTRADAS_PADRAO))
+        self.max_entradas = max_entradas
+
+    @property
+    def ativo(self) -> bool:
+        return self.max_entradas > 0
+
+    def _caminho(self, chave: str) -> str:
+        return os.path.join(self.diretorio, f'{chave}.json')
+
+    def obter(self, chave: str) -> Optional[Dict[str, Any]]:
+        if not self.ativo:
+            return None
+        caminho = self._caminho(chave)
+        try:
+            with open(caminho, 'r', encoding='utf-8') as f:
+                leitura = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            logger.warning('Entrada de cache ilegível descartada: %s', caminho)
+            self._remover(caminho)
+            return None
+        try:
+            os.utime(caminho)  # marca como usada recentemente (LRU)
+        except OSError:
+            pass
+        return leitura
+
+    def guardar(self, chave: str, leitura: Dict[str, Any]):
+        if not self.ativo:
+            return
+        os.makedirs(self.diretorio, exist_ok=True)
+        # Escrita atômica: outro worker nunca lê um JSON pela metade
+        fd, temporario = tempfile.mkstemp(dir=self.diretorio, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(leitura, f)
+        os.replace(temporario, self._caminho(chave))
+        with _lock_gravacoes:
+            gravacoes = _gravacoes.get(self.diretorio, 0)
+            _gravacoes[self.diretorio] = gravacoes + 1
+        if gravacoes % EXPULSAR_A_CADA == 0:
+            self._expulsar()
+
+    def _expulsar(self):
+        entradas = []
+        with os.scandir(self.diretorio) as it:
+            for e in it:
+                if e.name.endswith('.json'):
+                    try:
+                        entradas.append((e.stat().st_mtime, e.path))
+                    except OSError:
+                        continue
+        excesso = len(entradas) - self.max_entradas
+        if excesso > 0:
+            for _, caminho in sorted(entradas)[:excesso]:
+                self._remover(caminho)
+
+    @staticmethod
+    def _remover(caminho: str):
+        try:
+            os.remove(caminho)
+        except OSError:
+            pass
@@ -0,0 +1,67 @@
+"""Compressão e ETag das respostas JSON da API.
+
+Registrado em main.py como `after_request`:
+- GET com resposta JSON 200 ganha ETag fraco (hash do corpo) e vira 304 sem
+  corpo quando o cliente manda If-None-Match com o mesmo valor;
+- JSON acima de COMPRESSAO_MINIMA_BYTES é comprimido com br (se o pacote
+  `brotli` estiver instalado) ou gzip, conforme o Accept-Encoding.
+
+O ETag é fraco (W/) porque vale para o conteúdo, seja qual for a codificação
+de transferência. Respostas em fluxo (SSE) e não-JSON passam intactas.
+"""
+
+import gzip
+import os
+
+from flask import request
+
+try:  # opcional: só negocia br quando o pacote estiver disponível
+    import brotli
+except ImportError:  # pragma: no cover - depende do ambiente
+    brotli = None
+
+COMPRESSAO_MINIMA_BYTES = int(os.environ.get('COMPRESSAO_MINIMA_BYTES', 1024))
+NIVEL_GZIP = 6
+QUALIDADE_BROTLI = 5
+
+
+def _codificacao_aceita() -> str:
+    aceitas = request.accept_encodings
+    if brotli is not None and aceitas['br']:
+        return 'br'
+    if aceitas['gzip']:
+        return 'gzip'
+    return ''
+
+
+def _pos_requisicao(resposta):
+    if (resposta.direct_passthrough or resposta.is_streamed
+            or resposta.mimetype != 'application/json' or resposta.status_code != 200):
+        return resposta
+
+    if request.method == 'GET':
+        resposta.add_etag(weak=True)
+        resposta.make_conditional(request)
+        if resposta.status_code == 304:
+            return resposta
+
+    resposta.vary.add('Accept-Encoding')
+    if 'Content-Encoding' in resposta.headers:
+        return resposta
+    corpo = resposta.get_data()
+    if len(corpo) < COMPRESSAO_MINIMA_BYTES:
+        return resposta
+    codificacao = _codificacao_aceita()
+    if codificacao == 'br':
+        corpo = brotli.compress(corpo, quality=QUALIDADE_BROTLI)
+    elif codificacao == 'gzip':
+        corpo = gzip.compress(corpo, compresslevel=NIVEL_GZIP)
+    else:
+        return resposta
+    resposta.set_data(corpo)
+    resposta.headers['Content-Encoding'] = codificacao
+    return resposta
+
+
+def registrar(app):
+    app.after_request(_pos_requisicao)
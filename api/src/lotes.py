@@ -0,0 +1,277 @@
+"""Processamento de lotes de cartões e eventos de progresso.
+
+Os cartões de um lote são lidos por um pool de threads do processo (a
+leitura local passa a maior parte do tempo no OpenCV, que libera o GIL; a
+leitura por IA espera a rede). Cada cartão que termina é gravado na hora —
+correção com `ordem_lote`, ou falha em `Lote.falhas_json` — e avisa quem
+acompanha o lote pelo barramento em memória.
+
+Os eventos são sempre derivados do banco (ordem > último id visto), então o
+fluxo SSE funciona em qualquer worker e retoma sem perdas com Last-Event-ID;
+o barramento só acorda os fluxos deste processo assim que algo muda, em vez
+de esperarem a próxima consulta periódica.
+
+Quando o último cartão termina, os limiares do classificador são calibrados
+com as bolhas do lote inteiro (omr.calibracao) e as correções ainda
+pendentes são reclassificadas com eles antes do evento 'fim'. Leituras da IA
+visual não entram nem são reclassificadas. Desligue com CALIBRACAO_LOTES=0.
+
+A gravação de um cartão é repetida (TENTATIVAS_GRAVACAO) quando o banco
+recusa a escrita — o SQLite devolve "database is locked" sob concorrência.
+Se ainda assim não gravar, o cartão entra como falha ERRO_GRAVACAO numa
+transação nova, para o lote continuar contando até o fim. Um lote que mesmo
+assim pare (worker morto) é encerrado por `encerrar_se_parado`.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from src.models.correcao import Correcao
+from src.models.lote import (
+    STATUS_LOTE_CONCLUIDO, STATUS_LOTE_INTERROMPIDO, STATUS_LOTE_PROCESSANDO, Lote,
+)
+from src.models.user import db
+
+logger = logging.getLogger('api.lotes')
+
+TRABALHADORES_PADRAO = 2
+TENTATIVAS_GRAVACAO = 3
+ESPERA_GRAVACAO_SEGUNDOS = 0.5     # multiplicada pelo número da tentativa
+LOTE_PARADO_SEGUNDOS = float(os.environ.get('LOTE_PARADO_SEGUNDOS', 600))
+
+_pool: Optional[ThreadPoolExecutor] = None
+_lock_pool = threading.Lock()
+_lock_gravacao = threading.Lock()   # serializa a numeração dos cartões que terminam
+
+
+class BarramentoLotes:
+    """Avisa, dentro do processo, que um lote ganhou eventos novos."""
+
+    def __init__(self):
+        self._condicao = threading.Condition()
+        self._versoes: Dict[int, int] = {}
+
+    def versao(self, lote_id: int) -> int:
+        with self._condicao:
+            return self._versoes.get(lote_id, 0)
+
+    def notificar(self, lote_id: int):
+        with self._condicao:
+            self._versoes[lote_id] = self._versoes.get(lote_id, 0) + 1
+            self._condicao.notify_all()
+
+    def aguardar(self, lote_id: int, versao_vista: int, timeout: float) -> int:
+        """Bloqueia até o lote mudar desde `versao_vista` (ou até o timeout)."""
+        with self._condicao:
+            self._condicao.wait_for(lambda: self._versoes.get(lote_id, 0) != versao_vista,
+                                    timeout)
+            return self._versoes.get(lote_id, 0)
+
+
+barramento = BarramentoLotes()
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _pool
+    with _lock_pool:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=int(os.environ.get('LOTE_TRABALHADORES', TRABALHADORES_PADRAO)),
+                thread_name_prefix='lote')
+        return _pool
+
+
+def _calibrar(lote: Lote, contexto: Dict[str, Any]):
+    """Calibra os limiares com todas as bolhas do lote e reclassifica as
+    correções pendentes em que o professor ainda não mexeu (sem commit)."""
+    from src.omr import calibracao
+    from src.omr.pontuacao import STATUS_REVISAO, aplicar_gabarito
+    from src.routes.correcao import STATUS_CONFIRMADA, _confirmar_se_aprovada
+
+    correcoes = Correcao.query.filter_by(lote_id=lote.id).all()
+    resultados = [c.resultado for c in correcoes]
+    valores = calibracao.valores_das_leituras(resultados)
+    limiares, mistura = calibracao.calibrar(valores)
+
+    # Tudo calculado antes de alterar qualquer correção: uma falha no meio
+    # não deixa o lote meio reclassificado
+    novos = []
+    if limiares.origem == 'calibrada':
+        for correcao, resultado in zip(correcoes, resultados):
+            if (correcao.status != STATUS_REVISAO or correcao.revisoes
+                    or calibracao.da_ia(resultado)):
+                continue
+            leitura = calibracao.reclassificar(resultado, limiares)
+            novos.append((correcao, aplicar_gabarito(leitura, contexto['gabarito'],
+                                                     contexto['layout'].num_questoes)))
+    aprovadas = 0
+    for correcao, resultado in novos:
+        correcao.resultado_json = json.dumps(resultado)
+        correcao.status = resultado['status']
+        correcao.nota_provisoria = (resultado['resumo'] or {}).get('nota_provisoria')
+        _confirmar_se_aprovada(correcao, resultado)
+        aprovadas += int(correcao.status == STATUS_CONFIRMADA)
+    reclassificadas = len(novos)
+
+    lote.calibracao_json = json.dumps({
+        'limiares': limiares.to_dict(),
+        'mistura': mistura.to_dict() if mistura is not None else None,
+        'bolhas': int(len(valores)),
+        'reclassificadas': reclassificadas,
+        'aprovadas': aprovadas,
+    })
+    logger.info('Lote %d calibrado: %s (%d bolhas), %d reclassificadas, %d aprovadas',
+                lote.id, limiares.to_dict(), len(valores), reclassificadas, aprovadas)
+
+
+def _registrar(lote_id: int, posicao: int, aluno: str, correcao: Optional[Correcao],
+               falha: Optional[Dict[str, str]], contexto: Dict[str, Any]):
+    """Grava um cartão terminado com o próximo número de ordem do lote."""
+    with _lock_gravacao:
+        lote = db.session.get(Lote, lote_id)
+        lote.processados += 1
+        lote.atualizado_em = datetime.now(timezone.utc)
+        if correcao is not None:
+            correcao.lote_id = lote_id
+            correcao.ordem_lote = lote.processados
+            db.session.add(correcao)
+        else:
+            lote.falhas_json = json.dumps(lote.falhas + [{
+                'ordem': lote.processados, 'posicao': posicao, 'aluno': aluno, **falha}])
+        if lote.processados >= lote.total:
+            if os.environ.get('CALIBRACAO_LOTES', '1') != '0':
+                try:
+                    _calibrar(lote, contexto)
+                except Exception:  # sem calibração o lote continua válido
+                    logger.exception('Falha ao calibrar o lote %d', lote_id)
+            lote.status = STATUS_LOTE_CONCLUIDO
+            lote.concluido_em = datetime.now(timezone.utc)
+        db.session.commit()
+    barramento.notificar(lote_id)
+
+
+def _processar_cartao(app, lote_id: int, posicao: int, cartao: Dict[str, Any],
+                      contexto: Dict[str, Any]):
+    from src.omr.classifier import LimiaresInvalidos
+    from src.routes.correcao import (
+        MOTOR_LOCAL, ImagemInvalida, _bytes_imagem, _ler_cartao, _motor_leitura,
+        _nova_correcao,
+    )
+
+    aluno = str(cartao.get('aluno') or 'sem_nome')
+    with app.app_context():
+        correcao, falha = None, None
+        try:
+            dados = _bytes_imagem(cartao.get('imagem') or '')
+            leitura = _ler_cartao(dados, contexto['gabarito'], contexto['layout'])
+            correcao = _nova_correcao(dados, leitura, contexto['gabarito'],
+                                      contexto['gabarito_id'], contexto['layout'],
+                                      turma=contexto['turma'], aluno=aluno,
+                                      professor_id=contexto['professor_id'])
+        except ImagemInvalida as exc:
+            falha = {'codigo': 'IMAGEM_INVALIDA', 'erro': str(exc)}
+        except (ValueError, TypeError) as exc:
+            falha = {'codigo': 'IMAGEM_INVALIDA', 'erro': f'Imagem inválida: {exc}'}
+        except LimiaresInvalidos as exc:
+            falha = {'codigo': 'CONFIGURACAO_INVALIDA', 'erro': str(exc)}
+        except Exception as exc:  # um cartão ruim não derruba o lote
+            logger.exception('Falha no cartão %d do lote %d', posicao, lote_id)
+            codigo = ('ERRO_PROCESSAMENTO' if _motor_leitura() == MOTOR_LOCAL
+                      else 'IA_CORRECAO_FALHOU')
+            falha = {'codigo': codigo, 'erro': str(exc)}
+        try:
+            _gravar(lote_id, posicao, aluno, correcao, falha, contexto)
+        finally:
+            db.session.remove()
+
+
+def _tentar_registrar(lote_id: int, posicao: int, aluno: str, correcao: Optional[Correcao],
+                      falha: Optional[Dict[str, str]], contexto: Dict[str, Any]) -> Optional[str]:
+    """`_registrar` com novas tentativas; devolve o último erro, ou None se gravou."""
+    erro = None
+    for tentativa in range(1, TENTATIVAS_GRAVACAO + 1):
+        try:
+            _registrar(lote_id, posicao, aluno, correcao, falha, contexto)
+            return None
+        except Exception as exc:
+            db.session.rollback()
+            erro = str(exc)
+            logger.warning('Gravação do cartão %d do lote %d falhou (tentativa %d/%d): %s',
+                           posicao, lote_id, tentativa, TENTATIVAS_GRAVACAO, exc)
+            if tentativa < TENTATIVAS_GRAVACAO:
+                time.sleep(ESPERA_GRAVACAO_SEGUNDOS * tentativa)
+    return erro
+
+
+def _gravar(lote_id: int, posicao: int, aluno: str, correcao: Optional[Correcao],
+            falha: Optional[Dict[str, str]], contexto: Dict[str, Any]):
+    """Grava o cartão; se não der, grava ao menos a falha, para o lote andar."""
+    erro = _tentar_registrar(lote_id, posicao, aluno, correcao, falha, contexto)
+    if erro is None:
+        return
+    if correcao is not None:
+        erro = _tentar_registrar(lote_id, posicao, aluno, None, {
+            'codigo': 'ERRO_GRAVACAO',
+            'erro': f'Não foi possível gravar a correção: {erro}'}, contexto)
+    if erro is not None:
+        logger.error('Não foi possível gravar o cartão %d do lote %d: %s',
+                     posicao, lote_id, erro)
+
+
+def iniciar_lote(app, lote: Lote, cartoes: List[Dict[str, Any]], contexto: Dict[str, Any]):
+    """Enfileira os cartões do lote (já gravado) no pool de leitura."""
+    pool = _executor()
+    for posicao, cartao in enumerate(cartoes):
+        pool.submit(_processar_cartao, app, lote.id, posicao, cartao, contexto)
+
+
+def _evento_correcao(c: Correcao, total: int) -> Dict[str, Any]:
+    resumo = c.resultado.get('resumo') or {}
+    return {
+        'id': c.ordem_lote, 'tipo': 'correcao',
+        'dados': {'ordem': c.ordem_lote, 'total': total, 'correcao_id': c.id,
+                  'aluno': c.aluno, 'status': c.status,
+                  'nota_provisoria': c.nota_provisoria,
+                  'pendentes': resumo.get('pendentes_revisao', 0)},
+    }
+
+
+def encerrar_se_parado(lote: Lote) -> bool:
+    """Marca como INTERROMPIDO o lote sem cartão novo há LOTE_PARADO_SEGUNDOS."""
+    if lote.status != STATUS_LOTE_PROCESSANDO:
+        return False
+    ultimo = lote.atualizado_em or lote.criado_em
+    if ultimo is None:
+        return False
+    if ultimo.tzinfo is None:   # o SQLite devolve a data sem fuso
+        ultimo = ultimo.replace(tzinfo=timezone.utc)
+    agora = datetime.now(timezone.utc)
+    if (agora - ultimo).total_seconds() < LOTE_PARADO_SEGUNDOS:
+        return False
+    lote.status = STATUS_LOTE_INTERROMPIDO
+    lote.concluido_em = agora
+    db.session.commit()
+    logger.warning('Lote %d interrompido: %d de %d cartões gravados',
+                   lote.id, lote.processados, lote.total)
+    barramento.notificar(lote.id)
+    return True
+
+
+def eventos_desde(lote: Lote, ultimo: int) -> List[Dict[str, Any]]:
+    """Eventos do lote com ordem > `ultimo`, em ordem, e 'fim' se encerrado."""
+    eventos = [_evento_correcao(c, lote.total) for c in
+               Correcao.query.filter(Correcao.lote_id == lote.id, Correcao.ordem_lote > ultimo)]
+    for f in lote.falhas:
+        if f['ordem'] > ultimo:
+            eventos.append({'id': f['ordem'], 'tipo': 'falha',
+                            'dados': {**f, 'total': lote.total}})
+    eventos.sort(key=lambda e: e['id'])
+    if lote.status in (STATUS_LOTE_CONCLUIDO, STATUS_LOTE_INTERROMPIDO):
+        eventos.append({'id': lote.processados, 'tipo': 'fim', 'dados': lote.to_dict()})
+    return eventos
@@ -6,29 +6,53 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
 from flask import Flask, send_from_directory
 from flask_cors import CORS
+from src import compressao
 from src.models.user import db
 from src.models.correcao import Correcao  # noqa: F401 (registra a tabela)
+from src.models.gabarito import Gabarito  # noqa: F401 (registra a tabela)
+from src.models.lote import Lote  # noqa: F401 (registra a tabela)
+from src.migrar import migrar, migrar_na_inicializacao
+from src.omr.classifier import limiares_configurados
+from src.omr.layout import validar_iluminacao_padrao
 from src.routes.user import user_bp
 from src.routes.gabarito import gabarito_bp
 from src.routes.auth import auth_bp
-from src.routes.correcao import correcao_bp
+from src.routes.correcao import correcao_bp, validar_motor_leitura
+from src.routes.gabaritos import gabaritos_bp
+from src.routes.admin import admin_bp
+from src.routes.qualidade import qualidade_bp
+from src.routes.lotes import lotes_bp
+from src.routes.revisao import revisao_bp
 
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s %(levelname)s [%(name)s] %(message)s',
 )
 
+# Configuração de leitura inválida (MOTOR_LEITURA, OMR_ILUMINACAO,
+# LIMIARES_ARQUIVO) impede o boot, em vez de falhar cada leitura
+validar_motor_leitura()
+validar_iluminacao_padrao()
+limiares_configurados()
+
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 # Em produção defina a variável de ambiente SECRET_KEY (Render → Environment)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-only-troque-em-producao')
 
 # Configurar CORS para permitir requisições de qualquer origem
 CORS(app)
+# Compressão gzip/br e ETag nas respostas JSON (ver src/compressao.py)
+compressao.registrar(app)
 
 app.register_blueprint(user_bp, url_prefix='/api')
 app.register_blueprint(gabarito_bp, url_prefix='/api/gabarito')   # v1 (legado)
 app.register_blueprint(auth_bp, url_prefix='/api/v2/auth')
 app.register_blueprint(correcao_bp, url_prefix='/api/v2')
+app.register_blueprint(gabaritos_bp, url_prefix='/api/v2')
+app.register_blueprint(admin_bp, url_prefix='/api/v2')
+app.register_blueprint(qualidade_bp, url_prefix='/api/v2')
+app.register_blueprint(lotes_bp, url_prefix='/api/v2')
+app.register_blueprint(revisao_bp, url_prefix='/api/v2')
 
 # DATABASE_URL permite apontar para outro banco (testes, produção)
 app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get(
@@ -37,15 +61,10 @@ app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get(
 )
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db.init_app(app)
-with app.app_context():
-    db.create_all()
-    # Migração leve: create_all não altera tabelas existentes, então bancos
-    # antigos não têm a coluna password_hash em user. Adiciona se faltar.
-    from sqlalchemy import inspect, text
-    colunas = [c['name'] for c in inspect(db.engine).get_columns('user')]
-    if 'password_hash' not in colunas:
-        with db.engine.begin() as conn:
-            conn.execute(text('ALTER TABLE user ADD COLUMN password_hash VARCHAR(255)'))
+# Esquema: por padrão migra ao importar; em produção use `python -m src.migrar`
+# no deploy e MIGRAR_NA_INICIALIZACAO=0 nos workers (ver src/migrar.py)
+if migrar_na_inicializacao():
+    migrar(app)
 
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
@@ -0,0 +1,60 @@
+"""Migração do esquema do banco, em um único passo.
+
+`db.create_all()` cria tabelas novas mas não altera as existentes; as colunas
+acrescentadas depois da criação ficam em COLUNAS_ADICIONADAS e são aplicadas
+com ALTER TABLE quando faltam.
+
+Em produção rode uma vez por deploy, antes de subir os workers:
+    python -m src.migrar
+e defina MIGRAR_NA_INICIALIZACAO=0 para que os workers não inspecionem o
+esquema a cada boot. Sem a variável, main.py continua migrando ao importar
+(compatível com o deploy atual e com o ambiente de desenvolvimento).
+"""
+
+import logging
+import os
+import sys
+
+from sqlalchemy import inspect, text
+
+from src.models.user import db
+
+logger = logging.getLogger('api.migrar')
+
+# (tabela, coluna, definição SQL)
+COLUNAS_ADICIONADAS = [
+    ('user', 'password_hash', 'VARCHAR(255)'),
+    ('correcoes', 'gabarito_id', 'INTEGER REFERENCES gabaritos(id)'),
+    ('correcoes', 'lote_id', 'INTEGER REFERENCES lotes(id)'),
+    ('correcoes', 'ordem_lote', 'INTEGER'),
+    ('lotes', 'calibracao_json', 'TEXT'),
+    ('lotes', 'atualizado_em', 'DATETIME'),
+]
+
+
+def migrar_na_inicializacao() -> bool:
+    return os.environ.get('MIGRAR_NA_INICIALIZACAO', '1') != '0'
+
+
+def migrar(app) -> list:
+    """Cria tabelas e colunas que faltam; devolve as colunas adicionadas."""
+    adicionadas = []
+    with app.app_context():
+        db.create_all()
+        inspetor = inspect(db.engine)
+        for tabela, coluna, definicao in COLUNAS_ADICIONADAS:
+            colunas = [c['name'] for c in inspetor.get_columns(tabela)]
+            if coluna not in colunas:
+                with db.engine.begin() as conn:
+                    conn.execute(text(f'ALTER TABLE {tabela} ADD COLUMN {coluna} {definicao}'))
+                adicionadas.append(f'{tabela}.{coluna}')
+                logger.info('Coluna adicionada: %s.%s', tabela, coluna)
+    return adicionadas
+
+
+if __name__ == '__main__':
+    os.environ['MIGRAR_NA_INICIALIZACAO'] = '0'   # a importação do app não migra de novo
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from src.main import app
+    feitas = migrar(app)
+    print('Esquema atualizado: ' + (', '.join(feitas) if feitas else 'nada a fazer'))
@@ -3,8 +3,13 @@
 import json
 from datetime import datetime, timezone
 
+from .gabarito import carregar_gabarito
 from .user import db
 
+# Versão do algoritmo de leitura gravada em cada correção. Mudá-la invalida o
+# cache de leituras e marca as correções antigas para reprocessamento.
+VERSAO_ALGORITMO = '4.1'
+
 
 class Correcao(db.Model):
     __tablename__ = 'correcoes'
@@ -17,7 +22,14 @@ class Correcao(db.Model):
     # Status: APROVADA_AUTOMATICA | PRECISA_REVISAO | CONFIRMADA | REJEITADA_QUALIDADE
     status = db.Column(db.String(40), nullable=False)
 
-    gabarito_json = db.Column(db.Text, nullable=False)        # gabarito oficial usado
+    # Versão do gabarito oficial usada. Quando presente, gabarito_json fica
+    # vazio: a correção não carrega cópia própria do gabarito.
+    gabarito_id = db.Column(db.Integer, db.ForeignKey('gabaritos.id'), nullable=True,
+                            index=True)
+    gabarito_json = db.Column(db.Text, nullable=False)        # gabarito oficial usado (legado)
+    # Lote de envio (opcional) e ordem de término do cartão dentro dele
+    lote_id = db.Column(db.Integer, db.ForeignKey('lotes.id'), nullable=True, index=True)
+    ordem_lote = db.Column(db.Integer, nullable=True)
     resultado_json = db.Column(db.Text, nullable=False)       # resultado completo do pipeline
     revisoes_json = db.Column(db.Text, nullable=True)         # alterações manuais do professor
 
@@ -30,12 +42,17 @@ class Correcao(db.Model):
     criada_em = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
     confirmada_em = db.Column(db.DateTime, nullable=True)
     confirmada_por = db.Column(db.String(120), nullable=True)
-    versao_algoritmo = db.Column(db.String(20), default='4.0')
+    versao_algoritmo = db.Column(db.String(20), default=VERSAO_ALGORITMO)
 
     # ---- helpers JSON ----
     @property
     def gabarito(self):
-        return json.loads(self.gabarito_json) if self.gabarito_json else {}
+        if self.gabarito_json:
+            return json.loads(self.gabarito_json)
+        if self.gabarito_id is not None:
+            carregado = carregar_gabarito(self.gabarito_id)
+            return dict(carregado.respostas) if carregado else {}
+        return {}
 
     @property
     def resultado(self):
@@ -58,6 +75,8 @@ class Correcao(db.Model):
             'confirmada_em': self.confirmada_em.isoformat() if self.confirmada_em else None,
             'confirmada_por': self.confirmada_por,
             'versao_algoritmo': self.versao_algoritmo,
+            'gabarito_id': self.gabarito_id,
+            'lote_id': self.lote_id,
             'revisoes': self.revisoes,
         }
         if incluir_resultado:
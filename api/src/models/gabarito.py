@@ -0,0 +1,93 @@
+"""Modelo do gabarito oficial como entidade versionada.
+
+Cada correção referencia a versão do gabarito usada (gabarito_id) em vez de
+guardar a própria cópia. Versões são imutáveis: corrigir um gabarito cria a
+versão seguinte. Por isso o gabarito já validado e decodificado pode ficar
+em cache no processo pelo id, sem invalidação.
+"""
+
+import json
+from collections import OrderedDict
+from datetime import datetime, timezone
+from threading import Lock
+from typing import Any, Dict, NamedTuple, Optional
+
+from .user import db
+
+MAX_GABARITOS_EM_CACHE = 512
+
+
+class Gabarito(db.Model):
+    __tablename__ = 'gabaritos'
+    __table_args__ = (db.UniqueConstraint('turma', 'prova', 'versao'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    professor_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    turma = db.Column(db.String(80), nullable=False, index=True)
+    prova = db.Column(db.String(120), nullable=False)
+    versao = db.Column(db.Integer, nullable=False, default=1)
+
+    respostas_json = db.Column(db.Text, nullable=False)     # {"1": "A", ...}
+    layout_json = db.Column(db.Text, nullable=True)         # LayoutProva.to_dict()
+
+    criado_em = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+    @property
+    def respostas(self) -> Dict[str, str]:
+        return json.loads(self.respostas_json)
+
+    @property
+    def layout(self) -> Dict[str, Any]:
+        return json.loads(self.layout_json) if self.layout_json else {}
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'professor_id': self.professor_id,
+            'turma': self.turma,
+            'prova': self.prova,
+            'versao': self.versao,
+            'gabarito_oficial': self.respostas,
+            'layout': self.layout,
+            'criado_em': self.criado_em.isoformat() if self.criado_em else None,
+        }
+
+
+class GabaritoCarregado(NamedTuple):
+    """Gabarito já decodificado, seguro para compartilhar entre requisições."""
+    id: int
+    turma: str
+    prova: str
+    versao: int
+    respostas: Dict[str, str]
+    layout: Dict[str, Any]
+
+
+_cache: 'OrderedDict[int, GabaritoCarregado]' = OrderedDict()
+_cache_lock = Lock()
+
+
+def carregar_gabarito(gabarito_id: int) -> Optional[GabaritoCarregado]:
+    """Gabarito pelo id, decodificado uma única vez por processo."""
+    with _cache_lock:
+        carregado = _cache.get(gabarito_id)
+        if carregado is not None:
+            _cache.move_to_end(gabarito_id)
+            return carregado
+
+    gabarito = db.session.get(Gabarito, gabarito_id)
+    if gabarito is None:
+        return None
+    carregado = GabaritoCarregado(gabarito.id, gabarito.turma, gabarito.prova,
+                                  gabarito.versao, gabarito.respostas, gabarito.layout)
+    with _cache_lock:
+        _cache[gabarito_id] = carregado
+        while len(_cache) > MAX_GABARITOS_EM_CACHE:
+            _cache.popitem(last=False)
+    return carregado
+
+
+def limpar_cache_gabaritos():
+    """Esvazia o cache (ids só se repetem quando o banco é recriado)."""
+    with _cache_lock:
+        _cache.clear()
@@ -0,0 +1,67 @@
+"""Modelo do lote de correções (cartões de uma turma enviados de uma vez).
+
+Cada cartão processado recebe um número de ordem no lote (1, 2, ...), na
+ordem em que terminou: as correções gravam `ordem_lote` e as falhas ficam
+em `falhas_json` com o próprio número. É essa sequência que o fluxo de
+eventos (GET /lotes/<id>/eventos) usa como id de evento.
+
+Ao terminar, os limiares do classificador são calibrados com as bolhas de
+todos os cartões do lote (omr.calibracao); o resultado fica em
+`calibracao_json`.
+
+Um lote sem cartão novo há mais de LOTE_PARADO_SEGUNDOS (o worker morreu, a
+gravação falhou de vez) é dado como INTERROMPIDO por quem o consulta, para
+que o fluxo de eventos termine; `atualizado_em` marca o último cartão gravado.
+"""
+
+import json
+from datetime import datetime, timezone
+
+from .user import db
+
+STATUS_LOTE_PROCESSANDO = 'PROCESSANDO'
+STATUS_LOTE_CONCLUIDO = 'CONCLUIDO'
+STATUS_LOTE_INTERROMPIDO = 'INTERROMPIDO'
+
+
+class Lote(db.Model):
+    __tablename__ = 'lotes'
+
+    id = db.Column(db.Integer, primary_key=True)
+    professor_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    turma = db.Column(db.String(80), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default=STATUS_LOTE_PROCESSANDO)
+
+    total = db.Column(db.Integer, nullable=False)
+    processados = db.Column(db.Integer, nullable=False, default=0)   # corrigidos + falhas
+    # [{"ordem": n, "posicao": i, "aluno": ..., "codigo": ..., "erro": ...}]
+    falhas_json = db.Column(db.Text, nullable=True)
+    # {"limiares": {...}, "mistura": {...}, "bolhas": n, "reclassificadas": n, "aprovadas": n}
+    calibracao_json = db.Column(db.Text, nullable=True)
+
+    criado_em = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    concluido_em = db.Column(db.DateTime, nullable=True)
+    atualizado_em = db.Column(db.DateTime, nullable=True)
+
+    @property
+    def falhas(self):
+        return json.loads(self.falhas_json) if self.falhas_json else []
+
+    @property
+    def calibracao(self):
+        return json.loads(self.calibracao_json) if self.calibracao_json else None
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'professor_id': self.professor_id,
+            'turma': self.turma,
+            'status': self.status,
+            'total': self.total,
+            'processados': self.processados,
+            'falhas': self.falhas,
+            'calibracao': self.calibracao,
+            'criado_em': self.criado_em.isoformat() if self.criado_em else None,
+            'concluido_em': self.concluido_em.isoformat() if self.concluido_em else None,
+            'atualizado_em': self.atualizado_em.isoformat() if self.atualizado_em else None,
+        }
@@ -3,11 +3,24 @@
 Módulos:
 - quality:    validação da imagem recebida (nitidez, iluminação, resolução)
 - preprocess: normalização de iluminação, detecção da folha, correção de perspectiva
+- marcadores: registro da folha pelos marcadores impressos nos cantos
 - detector:   localização das bolhas (por contornos, com fallback de grade matemática)
 - classifier: classificação de cada questão com nível de confiança
 - pipeline:   orquestra as etapas e monta o resultado estruturado
+- layout:     configuração do cartão por prova (sem dependência de OpenCV)
+- modelo:     cartão-resposta imprimível com os marcadores
+
+`CorrecaoPipeline` é importado sob demanda: importar o pacote só para usar
+`LayoutProva` ou `pontuacao` não carrega cv2.
 """
 
-from .pipeline import CorrecaoPipeline, LayoutProva
+from .layout import LayoutProva
 
 __all__ = ['CorrecaoPipeline', 'LayoutProva']
+
+
+def __getattr__(nome):
+    if nome == 'CorrecaoPipeline':
+        from .pipeline import CorrecaoPipeline
+        return CorrecaoPipeline
+    raise AttributeError(f"module {__name__!r} has no attribute {nome!r}")
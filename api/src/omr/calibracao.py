@@ -0,0 +1,171 @@
+"""Calibração dos limiares do classificador por lote de cartões.
+
+Os limiares globais (classifier.LIMIAR_*) valem para qualquer papel e
+caneta; num lote real o preenchimento das bolhas vazias e das pintadas forma
+dois grupos bem definidos, mas deslocados conforme a impressão (o anel
+impresso já conta como preenchimento) e o material usado. Quando as bolhas
+vazias do lote ficam todas acima de LIMIAR_BRANCO, toda questão em branco
+vai para revisão como "marcação fraca".
+
+`calibrar` ajusta uma mistura de duas gaussianas (EM em NumPy) sobre os
+preenchimentos de todas as bolhas de um lote — mesmo layout, mesmo papel — e
+deriva os limiares dela, sempre dentro de um envelope de segurança fixo em
+torno dos limiares de partida (os padrão ou os de LIMIARES_ARQUIVO):
+
+- o de branco só sobe: FOLGA_DESVIOS desvios acima da média das bolhas
+  vazias, até BRANCO_MAXIMO — marca fraca de verdade (0,39 a 0,50 nos
+  cartões de teste) nunca vira "em branco";
+- o de marcada só desce, até MARCADA_MINIMA;
+- separação e confiança mínimas não mudam.
+
+Sem dados suficientes ou sem dois grupos nítidos, ficam os limiares de
+partida. A garantia de zero falso positivo é a mesma dos limiares padrão
+(ver test_pipeline: calibração em condições adversas).
+
+Leituras da IA visual ficam de fora do ajuste e da reclassificação: os
+`preenchimentos` delas são a confiança da IA na resposta, não a fração
+pintada da bolha.
+"""
+
+import copy
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+from .classifier import Limiares, classificar_questao, limiares_configurados
+from .pipeline import reforcar_revisao_grade
+from .pontuacao import STATUS_APROVADA, STATUS_REJEITADA, STATUS_REVISAO
+
+MIN_BOLHAS = 200            # ~2 cartões de 20 questões
+BRANCO_MAXIMO = 0.32        # teto de segurança do limiar de branco
+MARCADA_MINIMA = 0.40       # piso de segurança do limiar de marcada
+FOLGA_DESVIOS = 3.0         # distância (em desvios) de cada limiar ao seu grupo
+PESO_MINIMO = 0.03          # cada grupo precisa de ao menos 3% das bolhas
+DISTANCIA_MINIMA = 0.30     # entre as médias dos dois grupos
+DESVIO_MINIMO = 0.005       # evita componente degenerado (bolhas 100% pintadas)
+
+
+@dataclass
+class Mistura:
+    """Mistura de duas gaussianas: índice 0 = bolhas vazias, 1 = pintadas."""
+    pesos: np.ndarray
+    medias: np.ndarray
+    desvios: np.ndarray
+
+    @property
+    def nitida(self) -> bool:
+        return bool(self.pesos.min() >= PESO_MINIMO
+                    and self.medias[1] - self.medias[0] >= DISTANCIA_MINIMA)
+
+    def to_dict(self):
+        return {
+            'pesos': [round(float(v), 3) for v in self.pesos],
+            'medias': [round(float(v), 3) for v in self.medias],
+            'desvios': [round(float(v), 4) for v in self.desvios],
+        }
+
+
+def ajustar_mistura(valores: np.ndarray, iteracoes: int = 100) -> Mistura:
+    """EM de duas gaussianas em 1D, iniciado nos quantis 10% e 90%."""
+    x = np.asarray(valores, np.float64)
+    medias = np.quantile(x, [0.1, 0.9])
+    desvios = np.full(2, max(x.std() / 2, DESVIO_MINIMO))
+    pesos = np.full(2, 0.5)
+    for _ in range(iteracoes):
+        densidade = (pesos / desvios) * np.exp(
+            -0.5 * ((x[:, None] - medias) / desvios) ** 2)
+        resp = densidade / np.maximum(densidade.sum(1, keepdims=True), 1e-300)
+        n = resp.sum(0) + 1e-12
+        novas = (resp * x[:, None]).sum(0) / n
+        desvios = np.maximum(np.sqrt((resp * (x[:, None] - novas) ** 2).sum(0) / n),
+                             DESVIO_MINIMO)
+        pesos = n / len(x)
+        convergiu = np.allclose(novas, medias, atol=1e-6)
+        medias = novas
+        if convergiu:
+            break
+    ordem = np.argsort(medias)
+    return Mistura(pesos[ordem], medias[ordem], desvios[ordem])
+
+
+def da_ia(leitura: Dict[str, Any]) -> bool:
+    """Leitura (ou questão) da IA visual: os `preenchimentos` são confiança."""
+    return ((leitura.get('deteccao') or {}).get('metodo') == 'ia_visual'
+            or any(q.get('origem') == 'ia' for q in leitura.get('questoes', [])))
+
+
+def calibravel(leitura: Dict[str, Any]) -> bool:
+    """Leitura com bolhas medidas pelo pipeline local: não rejeitada, nem do
+    modo grade (posições não validadas), nem da IA visual."""
+    return (leitura.get('status') != STATUS_REJEITADA
+            and (leitura.get('deteccao') or {}).get('metodo') != 'grade'
+            and not da_ia(leitura))
+
+
+def valores_das_leituras(leituras: Iterable[Dict[str, Any]]) -> np.ndarray:
+    """Preenchimentos de todas as bolhas das leituras calibráveis."""
+    valores = [f for leitura in leituras if calibravel(leitura)
+               for q in leitura.get('questoes', [])
+               for f in (q.get('preenchimentos') or {}).values()]
+    return np.asarray(valores, np.float64)
+
+
+def calibrar(valores: np.ndarray,
+             base: Optional[Limiares] = None) -> Tuple[Limiares, Optional[Mistura]]:
+    """Limiares para o lote (ou `base`) e a mistura ajustada, se houver.
+
+    `base` são os limiares de partida — os configurados (LIMIARES_ARQUIVO)
+    ou os padrão: o envelope só afrouxa branco/marcada a partir deles."""
+    base = base or limiares_configurados()
+    if len(valores) < MIN_BOLHAS:
+        return base, None
+    mistura = ajustar_mistura(valores)
+    if not mistura.nitida:
+        return base, mistura
+    (media_vazia, media_pintada), (desvio_vazia, desvio_pintada) = \
+        mistura.medias, mistura.desvios
+
+    branco = min(media_vazia + FOLGA_DESVIOS * desvio_vazia, BRANCO_MAXIMO,
+                 media_pintada - FOLGA_DESVIOS * desvio_pintada)
+    branco = max(branco, base.branco)
+    marcada = min(max(media_pintada - FOLGA_DESVIOS * desvio_pintada,
+                      min(MARCADA_MINIMA, base.marcada)), base.marcada)
+    if branco == base.branco and marcada == base.marcada:
+        return base, mistura
+    return Limiares(marcada=float(marcada), branco=float(branco), separacao=base.separacao,
+                    confianca=base.confianca, origem='calibrada'), mistura
+
+
+def reclassificar(leitura: Dict[str, Any], limiares: Limiares) -> Dict[str, Any]:
+    """Nova leitura classificada com `limiares` a partir dos preenchimentos
+    gravados (sem abrir a imagem). Pontue de novo com aplicar_gabarito.
+    Leituras rejeitadas e as da IA visual voltam sem alteração."""
+    if leitura.get('status') == STATUS_REJEITADA or da_ia(leitura):
+        return leitura
+    nova = copy.deepcopy(leitura)
+    anteriores = nova.get('questoes', [])
+    questoes = [classificar_questao(q['numero'], q.get('preenchimentos') or None, limiares)
+                for q in anteriores]
+    if (nova.get('deteccao') or {}).get('metodo') == 'grade':
+        reforcar_revisao_grade(questoes)
+
+    itens = []
+    for qc, anterior in zip(questoes, anteriores):
+        item = qc.to_dict()
+        if qc.precisa_revisao and anterior.get('recorte'):
+            item['recorte'] = anterior['recorte']
+        itens.append(item)
+    nova['questoes'] = itens
+
+    pendentes = sum(1 for qc in questoes if qc.precisa_revisao)
+    nova['status'] = STATUS_APROVADA if pendentes == 0 else STATUS_REVISAO
+    nova['limiares'] = limiares.to_dict()
+    diagnostico = [d for d in nova.get('diagnostico', []) if 'exigem revisão manual' not in d]
+    diagnostico.append(f'Limiares calibrados pelo lote: branco < {limiares.branco:.2f}, '
+                       f'marcada ≥ {limiares.marcada:.2f}.')
+    if pendentes:
+        diagnostico.append(f'{pendentes} questão(ões) exigem revisão manual do professor '
+                           'antes da confirmação da nota.')
+    nova['diagnostico'] = diagnostico
+    return nova
@@ -3,9 +3,16 @@
 Regra de ouro do sistema: NUNCA escolher uma alternativa com baixa confiança.
 Tudo que não for uma marcação única, forte e bem separada das demais vai para
 revisão manual do professor.
+
+Os limiares abaixo são o padrão. LIMIARES_ARQUIVO aponta para um arquivo
+gerado pelo ajuste com as revisões dos professores (python -m
+src.ajuste_limiares), que passa a valer no lugar deles.
 """
 
+import json
+import os
 from dataclasses import dataclass, field
+from functools import lru_cache
 from typing import Dict, List, Optional
 
 # Thresholds sobre o percentual de preenchimento (imagem binarizada adaptativa)
@@ -25,6 +32,67 @@ STATUS_NAO_LIDA = 'NAO_LIDA'        # bolhas não localizadas → revisão
 STATUS_QUE_EXIGEM_REVISAO = {STATUS_MULTIPLA, STATUS_FRACA, STATUS_AMBIGUA, STATUS_NAO_LIDA}
 
 
+@dataclass(frozen=True)
+class Limiares:
+    """Limiares de uma classificação: os globais acima ou os calibrados para
+    um lote (omr.calibracao), sempre dentro do envelope de segurança dele."""
+    marcada: float = LIMIAR_MARCADA
+    branco: float = LIMIAR_BRANCO
+    separacao: float = SEPARACAO_MINIMA
+    confianca: float = CONFIANCA_MINIMA
+    origem: str = 'padrao'             # 'padrao' | 'calibrada'
+
+    def to_dict(self):
+        return {
+            'marcada': round(self.marcada, 3),
+            'branco': round(self.branco, 3),
+            'separacao': round(self.separacao, 3),
+            'confianca': round(self.confianca, 3),
+            'origem': self.origem,
+        }
+
+
+LIMIARES_PADRAO = Limiares()
+
+
+def carregar_limiares(caminho: str) -> Limiares:
+    """Limiares de um arquivo de parâmetros versionado (ajuste_limiares)."""
+    with open(caminho, 'r', encoding='utf-8') as f:
+        dados = json.load(f)
+    valores = dados['limiares']
+    limiares = Limiares(marcada=float(valores['marcada']), branco=float(valores['branco']),
+                        separacao=float(valores['separacao']),
+                        confianca=float(valores['confianca']),
+                        origem=f"arquivo:v{dados['versao']}")
+    if not (0 < limiares.branco < limiares.marcada <= 1 and 0 < limiares.separacao <= 1
+            and 0 < limiares.confianca <= 1):
+        raise ValueError(f'Limiares fora da faixa válida em {caminho}: {valores}')
+    return limiares
+
+
+class LimiaresInvalidos(RuntimeError):
+    """LIMIARES_ARQUIVO aponta para um arquivo ilegível ou com valores inválidos."""
+
+
+@lru_cache(maxsize=4)
+def _limiares_do_arquivo(caminho: str) -> Limiares:
+    return carregar_limiares(caminho)
+
+
+def limiares_configurados() -> Limiares:
+    """Os do arquivo em LIMIARES_ARQUIVO, se houver; senão os padrão.
+
+    Levanta LimiaresInvalidos se o arquivo não puder ser usado: o app
+    verifica isso na inicialização (src/main.py)."""
+    caminho = os.environ.get('LIMIARES_ARQUIVO')
+    if not caminho:
+        return LIMIARES_PADRAO
+    try:
+        return _limiares_do_arquivo(caminho)
+    except (OSError, ValueError, KeyError, TypeError) as exc:
+        raise LimiaresInvalidos(f'LIMIARES_ARQUIVO={caminho} inválido: {exc}') from exc
+
+
 @dataclass
 class QuestaoClassificada:
     numero: int
@@ -57,8 +125,8 @@ def _confianca_marcada(maior: float, segunda: float) -> float:
     return round(0.45 * forca + 0.55 * separacao, 3)
 
 
-def classificar_questao(numero: int,
-                        preenchimentos: Optional[Dict[str, float]]) -> QuestaoClassificada:
+def classificar_questao(numero: int, preenchimentos: Optional[Dict[str, float]],
+                        limiares: Limiares = LIMIARES_PADRAO) -> QuestaoClassificada:
     """Classifica uma questão. `preenchimentos` é {alternativa: percentual}."""
     if not preenchimentos:
         return QuestaoClassificada(
@@ -70,15 +138,15 @@ def classificar_questao(numero: int,
     (alt1, p1), p2 = ordenadas[0], (ordenadas[1][1] if len(ordenadas) > 1 else 0.0)
 
     # Em branco: nenhuma bolha atinge sequer o limiar de marca fraca
-    if p1 < LIMIAR_BRANCO:
-        confianca = round(min(1.0, 1.0 - p1 / LIMIAR_BRANCO * 0.5), 3)
+    if p1 < limiares.branco:
+        confianca = round(min(1.0, 1.0 - p1 / limiares.branco * 0.5), 3)
         return QuestaoClassificada(
             numero=numero, status=STATUS_EM_BRANCO, alternativa=None,
             confianca=confianca, motivo=None, preenchimentos=dict(preenchimentos),
         )
 
     # Múltipla marcação: duas ou mais bolhas acima do limiar de marcada
-    acima = [a for a, p in preenchimentos.items() if p >= LIMIAR_MARCADA]
+    acima = [a for a, p in preenchimentos.items() if p >= limiares.marcada]
     if len(acima) >= 2:
         return QuestaoClassificada(
             numero=numero, status=STATUS_MULTIPLA, alternativa=None, confianca=0.0,
@@ -87,7 +155,7 @@ def classificar_questao(numero: int,
         )
 
     # Marcação fraca: existe sinal, mas abaixo do limiar de marcação plena
-    if p1 < LIMIAR_MARCADA:
+    if p1 < limiares.marcada:
         return QuestaoClassificada(
             numero=numero, status=STATUS_FRACA, alternativa=None, confianca=0.0,
             motivo=(f'Marcação fraca/parcial na alternativa {alt1} '
@@ -96,7 +164,7 @@ def classificar_questao(numero: int,
         )
 
     # Ambiguidade: segunda bolha perto demais da primeira (rasura, marca dupla parcial)
-    if (p1 - p2) < SEPARACAO_MINIMA:
+    if (p1 - p2) < limiares.separacao:
         alt2 = ordenadas[1][0]
         return QuestaoClassificada(
             numero=numero, status=STATUS_AMBIGUA, alternativa=None, confianca=0.0,
@@ -106,7 +174,7 @@ def classificar_questao(numero: int,
         )
 
     confianca = _confianca_marcada(p1, p2)
-    if confianca < CONFIANCA_MINIMA:
+    if confianca < limiares.confianca:
         return QuestaoClassificada(
             numero=numero, status=STATUS_AMBIGUA, alternativa=None, confianca=confianca,
             motivo=f'Confiança insuficiente ({confianca:.0%}) na alternativa {alt1}.',
@@ -119,7 +187,10 @@ def classificar_questao(numero: int,
     )
 
 
-def classificar_prova(num_questoes: int,
-                      preenchimentos: Dict[int, Dict[str, float]]) -> List[QuestaoClassificada]:
-    """Classifica todas as questões de 1..num_questoes."""
-    return [classificar_questao(n, preenchimentos.get(n)) for n in range(1, num_questoes + 1)]
+def classificar_prova(num_questoes: int, preenchimentos: Dict[int, Dict[str, float]],
+                      limiares: Optional[Limiares] = None) -> List[QuestaoClassificada]:
+    """Classifica todas as questões de 1..num_questoes (com os limiares
+    configurados, se nenhum for passado)."""
+    limiares = limiares or limiares_configurados()
+    return [classificar_questao(n, preenchimentos.get(n), limiares)
+            for n in range(1, num_questoes + 1)]
@@ -0,0 +1,59 @@
+"""Contexto de imagens intermediárias compartilhado entre as etapas do pipeline.
+
+Cada etapa guarda o que produz (cinza, cinza reduzida, folha corrigida,
+cinza normalizada, binária) e as seguintes leem dali, sem reconverter nem
+copiar. Um item é descartado assim que o último consumidor previsto o
+consome, para que imagens em resolução nativa não fiquem vivas durante o
+resto da correção.
+"""
+
+from typing import Dict, Optional
+
+import numpy as np
+
+
+class ContextoPipeline:
+    """Imagens intermediárias de UMA correção, com liberação antecipada."""
+
+    def __init__(self, imagem: np.ndarray):
+        self.imagem = imagem
+        self._itens: Dict[str, np.ndarray] = {}
+        self._consumidores: Dict[str, int] = {}
+        self.bytes_mantidos = 0
+        self.pico_bytes = 0     # maior volume simultâneo de intermediários
+
+    def __contains__(self, nome: str) -> bool:
+        return nome in self._itens
+
+    def guardar(self, nome: str, valor: np.ndarray, consumidores: int = 1) -> np.ndarray:
+        """Guarda `valor`, que será descartado após `consumidores` consumos."""
+        self.descartar(nome)
+        self._itens[nome] = valor
+        self._consumidores[nome] = consumidores
+        self.bytes_mantidos += valor.nbytes
+        self.pico_bytes = max(self.pico_bytes, self.bytes_mantidos)
+        return valor
+
+    def ler(self, nome: str) -> Optional[np.ndarray]:
+        """Acesso sem consumo (o item continua guardado)."""
+        return self._itens.get(nome)
+
+    def consumir(self, nome: str) -> Optional[np.ndarray]:
+        """Devolve o item e o descarta se este era o último consumidor."""
+        valor = self._itens.get(nome)
+        if valor is None:
+            return None
+        self._consumidores[nome] -= 1
+        if self._consumidores[nome] <= 0:
+            self.descartar(nome)
+        return valor
+
+    def descartar(self, nome: str):
+        valor = self._itens.pop(nome, None)
+        self._consumidores.pop(nome, None)
+        if valor is not None:
+            self.bytes_mantidos -= valor.nbytes
+
+    def descartar_tudo(self):
+        for nome in list(self._itens):
+            self.descartar(nome)
@@ -7,16 +7,21 @@ Estratégia em duas camadas:
 2. Fallback de grade matemática configurável, usado quando a detecção por
    contornos não encontra uma grade consistente. O pipeline registra qual
    método foi usado — o fallback reduz a confiança e força revisão mais cedo.
+
+As bolhas ficam em estrutura de arrays (`BolhasCompactas`): um array NumPy por
+atributo, ordenado por questão, com índice por questão. Recorte e medição de
+preenchimento viram fatiamento direto em vez de varrer listas de objetos.
 """
 
 import cv2
 import numpy as np
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
 
 
-@dataclass
+@dataclass(slots=True)
 class Bolha:
+    """Visão de uma bolha isolada (compatibilidade com o formato antigo)."""
     questao: int
     alternativa: str
     cx: int
@@ -24,12 +29,74 @@ class Bolha:
     raio: int
 
 
+class BolhasCompactas:
+    """Bolhas detectadas em estrutura de arrays, ordenadas por (questão, alternativa).
+
+    `fatia(n)` devolve em O(1) o intervalo das bolhas da questão `n`, usado
+    pelo recorte para revisão e pela medição de preenchimento.
+    """
+
+    __slots__ = ('alternativas', 'questao', 'alt', 'cx', 'cy', 'raio', '_inicio')
+
+    def __init__(self, alternativas: Sequence[str],
+                 registros: Iterable[Tuple[int, int, int, int, int]] = ()):
+        """`registros`: tuplas (questao, indice_alternativa, cx, cy, raio)."""
+        self.alternativas = list(alternativas)
+        dados = np.array(list(registros), dtype=np.int32).reshape(-1, 5)
+        dados = dados[np.lexsort((dados[:, 1], dados[:, 0]))]
+        self.questao = dados[:, 0].astype(np.int16)
+        self.alt = dados[:, 1].astype(np.int8)
+        self.cx = np.ascontiguousarray(dados[:, 2])
+        self.cy = np.ascontiguousarray(dados[:, 3])
+        self.raio = np.ascontiguousarray(dados[:, 4])
+        maior = int(self.questao[-1]) if len(self.questao) else 0
+        self._inicio = np.searchsorted(self.questao, np.arange(maior + 2))
+
+    @classmethod
+    def de_bolhas(cls, bolhas: Iterable[Bolha],
+                  alternativas: Optional[Sequence[str]] = None) -> 'BolhasCompactas':
+        bolhas = list(bolhas)
+        if alternativas is None:
+            alternativas = sorted({b.alternativa for b in bolhas})
+        indice = {a: i for i, a in enumerate(alternativas)}
+        return cls(alternativas, ((b.questao, indice[b.alternativa], b.cx, b.cy, b.raio)
+                                  for b in bolhas))
+
+    def __len__(self) -> int:
+        return len(self.questao)
+
+    def __iter__(self) -> Iterator[Bolha]:
+        for q, a, x, y, r in zip(self.questao.tolist(), self.alt.tolist(),
+                                 self.cx.tolist(), self.cy.tolist(), self.raio.tolist()):
+            yield Bolha(q, self.alternativas[a], x, y, r)
+
+    def fatia(self, numero: int) -> slice:
+        """Intervalo (possivelmente vazio) das bolhas da questão `numero`."""
+        if not 0 <= numero < len(self._inicio) - 1:
+            return slice(0, 0)
+        return slice(int(self._inicio[numero]), int(self._inicio[numero + 1]))
+
+    def questoes(self) -> np.ndarray:
+        """Números das questões que têm ao menos uma bolha."""
+        return np.nonzero(np.diff(self._inicio))[0]
+
+    def registros(self) -> List[List[int]]:
+        """[questao, indice_alternativa, cx, cy, raio] por bolha, serializável em
+        JSON; `BolhasCompactas(alternativas, registros)` reconstrói a estrutura."""
+        return np.column_stack((self.questao, self.alt, self.cx, self.cy,
+                                self.raio)).astype(int).tolist()
+
+
 @dataclass
 class ResultadoDeteccao:
-    bolhas: List[Bolha] = field(default_factory=list)
+    compactas: BolhasCompactas = field(default_factory=lambda: BolhasCompactas([]))
     metodo: str = 'nenhum'          # 'contornos' | 'grade' | 'nenhum'
     completa: bool = False           # encontrou todas as questões x alternativas
 
+    @property
+    def bolhas(self) -> List[Bolha]:
+        return list(self.compactas)
+
 
 def _candidatas_circulares(binaria: np.ndarray) -> List[Tuple[int, int, int]]:
     """Encontra centros (cx, cy, raio) de formas aproximadamente circulares."""
@@ -116,7 +183,7 @@ def detectar_por_contornos(binaria: np.ndarray, num_questoes: int,
     linhas_validas.sort(key=lambda l: np.mean([candidatas[i][1] for i in l]))
     linhas_validas = linhas_validas[:questoes_por_coluna]
 
-    resultado = ResultadoDeteccao(metodo='contornos')
+    registros = []
     largura = binaria.shape[1]
     for idx_linha, linha in enumerate(linhas_validas):
         pontos = sorted((candidatas[i] for i in linha), key=lambda c: c[0])
@@ -135,12 +202,13 @@ def detectar_por_contornos(binaria: np.ndarray, num_questoes: int,
             if numero > num_questoes:
                 continue
             for j, (cx, cy, r) in enumerate(pontos_col):
-                resultado.bolhas.append(Bolha(numero, alternativas[j], cx, cy, r))
+                registros.append((numero, j, cx, cy, r))
 
-    encontradas = {b.questao for b in resultado.bolhas}
-    resultado.completa = len(encontradas) == num_questoes
+    resultado = ResultadoDeteccao(BolhasCompactas(alternativas, registros), 'contornos')
+    encontradas = len(resultado.compactas.questoes())
+    resultado.completa = encontradas == num_questoes
     # Exige pelo menos 90% das questões mapeadas para confiar na grade
-    if len(encontradas) < int(num_questoes * 0.9):
+    if encontradas < int(num_questoes * 0.9):
         return None
     return resultado
 
@@ -152,7 +220,7 @@ def detectar_por_grade(binaria: np.ndarray, num_questoes: int,
     """Fallback: grade matemática configurável (margens relativas por coluna)."""
     h, w = binaria.shape
     questoes_por_coluna = -(-num_questoes // num_colunas)
-    resultado = ResultadoDeteccao(metodo='grade')
+    registros = []
 
     for col in range(num_colunas):
         x0 = int(col * w / num_colunas)
@@ -172,35 +240,57 @@ def detectar_por_grade(binaria: np.ndarray, num_questoes: int,
             if numero > num_questoes:
                 break
             cy = int(ay0 + (i + 0.5) * altura_q)
-            for j, alt in enumerate(alternativas):
+            for j in range(len(alternativas)):
                 cx = int(ax0 + (j + 0.5) * largura_o)
-                resultado.bolhas.append(Bolha(numero, alt, cx, cy, raio))
+                registros.append((numero, j, cx, cy, raio))
 
-    resultado.completa = True
-    return resultado
+    return ResultadoDeteccao(BolhasCompactas(alternativas, registros), 'grade', completa=True)
 
 
-def medir_preenchimentos(binaria: np.ndarray,
-                         bolhas: List[Bolha]) -> Dict[int, Dict[str, float]]:
-    """Mede o percentual de pixels marcados dentro de cada bolha.
+def medir_fracoes(binaria: np.ndarray, bolhas: BolhasCompactas) -> np.ndarray:
+    """Fração de pixels marcados em cada bolha, alinhada a `bolhas`.
 
-    Usa máscara circular para não contar o quadrado ao redor da bolha.
+    Usa máscara circular para não contar o quadrado ao redor da bolha. As
+    bolhas de mesmo raio são medidas juntas: os recortes são extraídos por
+    indexação avançada e somados numa única redução.
     """
-    preenchimentos: Dict[int, Dict[str, float]] = {}
+    fracoes = np.zeros(len(bolhas), np.float64)
+    if not len(bolhas):
+        return fracoes
     h, w = binaria.shape
-    for b in bolhas:
-        r = max(3, int(b.raio * 0.85))  # encolhe levemente para ignorar o anel impresso
+    # encolhe levemente para ignorar o anel impresso
+    raios = np.maximum(3, (bolhas.raio * 0.85).astype(np.int32))
+    for r in np.unique(raios).tolist():
+        idx = np.nonzero(raios == r)[0]
         mascara = np.zeros((2 * r + 1, 2 * r + 1), np.uint8)
         cv2.circle(mascara, (r, r), r, 255, -1)
+        mascara = mascara > 0
+
+        desloc = np.arange(-r, r + 1)
+        ys = bolhas.cy[idx, None] + desloc            # (k, d)
+        xs = bolhas.cx[idx, None] + desloc
+        # pixels fora da imagem não contam nem no total nem nos marcados
+        dentro = (((ys >= 0) & (ys < h))[:, :, None] &
+                  ((xs >= 0) & (xs < w))[:, None, :] & mascara)
+        recortes = binaria[np.clip(ys, 0, h - 1)[:, :, None],
+                           np.clip(xs, 0, w - 1)[:, None, :]]
+        total = dentro.sum(axis=(1, 2))
+        marcados = ((recortes > 0) & dentro).sum(axis=(1, 2))
+        fracoes[idx] = np.divide(marcados, total, out=np.zeros(len(idx)), where=total > 0)
+    return fracoes
 
-        y0, y1 = max(0, b.cy - r), min(h, b.cy + r + 1)
-        x0, x1 = max(0, b.cx - r), min(w, b.cx + r + 1)
-        roi = binaria[y0:y1, x0:x1]
-        m = mascara[(y0 - (b.cy - r)):(y0 - (b.cy - r)) + roi.shape[0],
-                    (x0 - (b.cx - r)):(x0 - (b.cx - r)) + roi.shape[1]]
-        total = cv2.countNonZero(m)
-        marcados = cv2.countNonZero(cv2.bitwise_and(roi, roi, mask=m)) if total else 0
-        preenchimentos.setdefault(b.questao, {})[b.alternativa] = (
-            marcados / total if total else 0.0
-        )
+
+def medir_preenchimentos(binaria: np.ndarray,
+                         bolhas: Union[BolhasCompactas, Sequence[Bolha]]
+                         ) -> Dict[int, Dict[str, float]]:
+    """Mede o percentual de pixels marcados dentro de cada bolha.
+
+    Retorna {questao: {alternativa: percentual}}.
+    """
+    if not isinstance(bolhas, BolhasCompactas):
+        bolhas = BolhasCompactas.de_bolhas(bolhas)
+    fracoes = medir_fracoes(binaria, bolhas)
+    preenchimentos: Dict[int, Dict[str, float]] = {}
+    for q, a, f in zip(bolhas.questao.tolist(), bolhas.alt.tolist(), fracoes.tolist()):
+        preenchimentos.setdefault(q, {})[bolhas.alternativas[a]] = f
     return preenchimentos
@@ -0,0 +1,70 @@
+"""Layout do cartão-resposta (configuração por prova).
+
+Fica fora de `pipeline` e não importa OpenCV: as rotas validam e gravam o
+layout sem carregar cv2, que só é importado na primeira leitura de imagem.
+"""
+
+import os
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional
+
+# Estimativa do fundo (papel) na normalização de iluminação:
+# 'morfologica' → fechamento 51x51 na resolução de trabalho (referência)
+# 'reduzida'    → fechamento equivalente numa cópia reduzida, depois ampliada
+ILUMINACAO_MORFOLOGICA = 'morfologica'
+ILUMINACAO_REDUZIDA = 'reduzida'
+METODOS_ILUMINACAO = (ILUMINACAO_MORFOLOGICA, ILUMINACAO_REDUZIDA)
+ILUMINACAO_PADRAO = os.environ.get('OMR_ILUMINACAO', ILUMINACAO_MORFOLOGICA)
+
+
+def validar_iluminacao_padrao():
+    """OMR_ILUMINACAO inválido falharia em toda leitura: o app verifica no boot."""
+    if ILUMINACAO_PADRAO not in METODOS_ILUMINACAO:
+        raise ValueError(f"OMR_ILUMINACAO='{ILUMINACAO_PADRAO}' desconhecido. "
+                         f"Use: {', '.join(METODOS_ILUMINACAO)}.")
+
+
+@dataclass
+class LayoutProva:
+    """Configuração do layout do cartão-resposta (flexível por prova)."""
+    num_questoes: int = 44
+    num_alternativas: int = 5
+    num_colunas: int = 2
+    alternativas: List[str] = field(default_factory=lambda: ['A', 'B', 'C', 'D', 'E'])
+    # margens relativas usadas apenas no fallback de grade matemática
+    margens: Dict[str, float] = field(default_factory=lambda: {
+        'superior': 0.20, 'inferior': 0.02, 'esquerda': 0.30, 'direita': 0.02,
+    })
+    # normalização de iluminação (METODOS_ILUMINACAO);
+    # None usa o padrão configurado em OMR_ILUMINACAO
+    iluminacao: Optional[str] = None
+    # cartão impresso com os marcadores de canto (omr.modelo): a folha é
+    # registrada por eles antes de procurar a borda do papel
+    marcadores: bool = False
+
+    def __post_init__(self):
+        if len(self.alternativas) != self.num_alternativas:
+            self.alternativas = [chr(ord('A') + i) for i in range(self.num_alternativas)]
+        if self.iluminacao is not None and self.iluminacao not in METODOS_ILUMINACAO:
+            raise ValueError(f"Método de iluminação desconhecido: '{self.iluminacao}'.")
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> 'LayoutProva':
+        if not data:
+            return cls()
+        marcadores = data.get('marcadores', False)
+        if not isinstance(marcadores, bool):   # bool("false") seria True
+            raise ValueError(f"'marcadores' deve ser true ou false, não {marcadores!r}.")
+        return cls(
+            num_questoes=int(data.get('num_questoes', 44)),
+            num_alternativas=int(data.get('num_alternativas', 5)),
+            num_colunas=int(data.get('num_colunas', 2)),
+            alternativas=data.get('alternativas') or
+                [chr(ord('A') + i) for i in range(int(data.get('num_alternativas', 5)))],
+            margens={**cls().margens, **(data.get('margens') or {})},
+            iluminacao=data.get('iluminacao'),
+            marcadores=marcadores,
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
@@ -0,0 +1,147 @@
+"""Registro da folha por marcadores fiduciais impressos.
+
+O cartão gerado por `omr.modelo` traz quatro quadrados pretos sólidos, um em
+cada canto, em posições fixas em relação à borda do papel. Achar os quatro
+num cinza reduzido (LADO_BUSCA_MARCADORES) é barato e não depende do
+contraste entre a folha e a mesa — a busca da borda (Canny + maior contorno
+convexo) falha em mesa branca e o pipeline cai em `imagem_completa` e, às
+vezes, na grade aproximada, que manda tudo para revisão.
+
+Com os centros dos marcadores, a homografia do modelo para a foto dá os
+cantos do papel na imagem; a folha é retificada por esses cantos com o mesmo
+`preprocess._warp` da borda detectada, então a geometria gravada (e a
+sobreposição de depuração) funciona igual nos dois métodos.
+"""
+
+from typing import List, Optional
+
+import cv2
+import numpy as np
+
+# Geometria no modelo, em frações da LARGURA do papel (A4 em retrato)
+PROPORCAO_FOLHA = 297 / 210            # altura / largura
+MARCADOR_LADO = 0.04
+MARCADOR_MARGEM = 0.05                 # do centro do marcador até a borda do papel
+
+LADO_BUSCA_MARCADORES = 800
+# Tolerâncias da validação dos candidatos
+SOLIDEZ_MINIMA = 0.85                  # área do contorno / área do retângulo mínimo
+PREENCHIMENTO_MINIMO = 0.80            # fração escura dentro do contorno
+RAZAO_AREAS_MAXIMA = 3.0               # entre o maior e o menor dos quatro
+TOLERANCIA_PROPORCAO = 0.30            # proporção do retângulo dos centros
+
+
+def centros_modelo(largura: float = 1.0) -> np.ndarray:
+    """Centros dos marcadores (tl, tr, br, bl) no papel de `largura` px."""
+    m = MARCADOR_MARGEM
+    altura = PROPORCAO_FOLHA
+    return np.array([[m, m], [1 - m, m], [1 - m, altura - m], [m, altura - m]],
+                    np.float32) * largura
+
+
+def cantos_modelo(largura: float = 1.0) -> np.ndarray:
+    return np.array([[0, 0], [1, 0], [1, PROPORCAO_FOLHA], [0, PROPORCAO_FOLHA]],
+                    np.float32) * largura
+
+
+def _candidatos(binaria: np.ndarray) -> np.ndarray:
+    """(cx, cy, área) dos quadrados escuros e sólidos da imagem binária."""
+    lado_max = max(binaria.shape)
+    area_min = (0.008 * lado_max) ** 2
+    area_max = (0.08 * lado_max) ** 2
+    # RETR_LIST: sobre mesa escura o marcador fica dentro do contorno da mesa
+    contornos, _ = cv2.findContours(binaria, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+    candidatos = []
+    for c in contornos:
+        area = cv2.contourArea(c)
+        if not area_min <= area <= area_max:
+            continue
+        (cx, cy), (w, h), _ = cv2.minAreaRect(c)
+        if min(w, h) <= 0 or not 0.7 <= w / h <= 1.4 or area / (w * h) < SOLIDEZ_MINIMA:
+            continue
+        approx = cv2.approxPolyDP(c, 0.05 * cv2.arcLength(c, True), True)
+        if len(approx) != 4 or not cv2.isContourConvex(approx):
+            continue
+        x, y, bw, bh = cv2.boundingRect(c)
+        mascara = np.zeros((bh, bw), np.uint8)
+        cv2.drawContours(mascara, [c - [x, y]], -1, 255, -1)
+        dentro = binaria[y:y + bh, x:x + bw][mascara > 0]
+        if dentro.size == 0 or (dentro > 0).mean() < PREENCHIMENTO_MINIMO:
+            continue
+        candidatos.append((cx, cy, area))
+    return np.array(candidatos, np.float32).reshape(-1, 3)
+
+
+def _escolher_cantos(candidatos: np.ndarray, forma) -> Optional[List[int]]:
+    """Índices (tl, tr, br, bl) dos candidatos mais próximos de cada canto da
+    imagem, validados como os cantos de um retângulo com a proporção do modelo."""
+    if len(candidatos) < 4:
+        return None
+    altura, largura = forma
+    pts = candidatos[:, :2]
+    cantos_imagem = np.array([[0, 0], [largura, 0], [largura, altura], [0, altura]],
+                             np.float32)
+    escolhidos = [int(np.argmin(np.linalg.norm(pts - canto, axis=1)))
+                  for canto in cantos_imagem]
+    if len(set(escolhidos)) != 4:
+        return None
+    areas = candidatos[escolhidos, 2]
+    if areas.max() / areas.min() > RAZAO_AREAS_MAXIMA:
+        return None
+    centros = pts[escolhidos]
+    if not cv2.isContourConvex(centros.reshape(-1, 1, 2)):
+        return None
+    if cv2.contourArea(centros) < 0.15 * largura * altura:
+        return None
+    tl, tr, br, bl = centros
+    horizontal = (np.linalg.norm(tr - tl) + np.linalg.norm(br - bl)) / 2
+    vertical = (np.linalg.norm(bl - tl) + np.linalg.norm(br - tr)) / 2
+    esperada = (PROPORCAO_FOLHA - 2 * MARCADOR_MARGEM) / (1 - 2 * MARCADOR_MARGEM)
+    if abs(vertical / horizontal / esperada - 1) > TOLERANCIA_PROPORCAO:
+        return None
+    return escolhidos
+
+
+def _refinar(gray: np.ndarray, centro: np.ndarray, raio: int) -> np.ndarray:
+    """Centroide do marcador numa janela da imagem em resolução cheia."""
+    x0, y0 = max(0, int(centro[0]) - raio), max(0, int(centro[1]) - raio)
+    janela = gray[y0:int(centro[1]) + raio + 1, x0:int(centro[0]) + raio + 1]
+    if janela.size == 0:
+        return centro
+    _, binaria = cv2.threshold(janela, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    n, rotulos, stats, centroides = cv2.connectedComponentsWithStats(binaria)
+    if n < 2:
+        return centro
+    # O maior componente escuro da janela é o marcador
+    maior = 1 + int(np.argmax(stats[1:, cv2.CC_STAT_AREA]))
+    return (centroides[maior] + [x0, y0]).astype(np.float32)
+
+
+def localizar_marcadores(gray: np.ndarray) -> Optional[np.ndarray]:
+    """Centros (tl, tr, br, bl) dos quatro marcadores em `gray`, ou None.
+
+    A busca roda numa cópia reduzida; os centros são refinados na resolução
+    original numa janela pequena em torno de cada um.
+    """
+    fator = min(1.0, LADO_BUSCA_MARCADORES / max(gray.shape[:2]))
+    reduzida = (cv2.resize(gray, None, fx=fator, fy=fator, interpolation=cv2.INTER_AREA)
+                if fator < 1.0 else gray)
+    # Limiar local: o marcador é escuro em relação ao papel em volta mesmo sob sombra
+    binaria = cv2.adaptiveThreshold(cv2.GaussianBlur(reduzida, (5, 5), 0), 255,
+                                    cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV, 75, 25)
+    candidatos = _candidatos(binaria)
+    escolhidos = _escolher_cantos(candidatos, reduzida.shape[:2])
+    if escolhidos is None:
+        return None
+    centros = candidatos[escolhidos, :2]
+    if fator < 1.0:
+        # Janela com folga de meio lado em volta de cada marcador
+        raio = int(np.sqrt(candidatos[escolhidos, 2].max()) / fator) + 2
+        centros = np.stack([_refinar(gray, c / fator, raio) for c in centros])
+    return centros
+
+
+def quadrilatero_por_marcadores(centros: np.ndarray) -> np.ndarray:
+    """Cantos do papel (tl, tr, br, bl) na imagem, pela homografia dos centros."""
+    h = cv2.getPerspectiveTransform(centros_modelo(), centros.astype(np.float32))
+    return cv2.perspectiveTransform(cantos_modelo().reshape(-1, 1, 2), h).reshape(4, 2)
@@ -0,0 +1,95 @@
+"""Cartão-resposta imprimível com os marcadores de canto.
+
+A geometria das bolhas é a dos cartões de teste (tests/synthetic.py), escalada
+para `largura`: é a que a detecção de bolhas e a grade do pipeline conhecem.
+Os quatro quadrados sólidos dos cantos seguem omr.marcadores; com eles a
+folha é registrada mesmo fotografada sobre mesa clara ou cortada na borda.
+Para que sejam procurados antes da borda do papel, cadastre o layout da
+prova com "marcadores": true.
+"""
+
+import unicodedata
+from typing import Dict, Tuple
+
+import cv2
+import numpy as np
+
+from .layout import LayoutProva
+from .marcadores import MARCADOR_LADO, PROPORCAO_FOLHA, centros_modelo
+
+LARGURA_IMPRESSAO = 2480        # A4 a 300 dpi
+_LARGURA_REFERENCIA = 1240      # largura dos cartões de teste (raio 14, anel 2)
+
+
+def desenhar_marcadores(img: np.ndarray) -> np.ndarray:
+    """Desenha os quatro marcadores na imagem do papel (altera `img`)."""
+    largura = img.shape[1]
+    meio = MARCADOR_LADO * largura / 2
+    for cx, cy in centros_modelo(largura):
+        cv2.rectangle(img, (int(round(cx - meio)), int(round(cy - meio))),
+                      (int(round(cx + meio)), int(round(cy + meio))), (0, 0, 0), -1)
+    return img
+
+
+def _ascii(texto: str) -> str:
+    """putText só desenha ASCII: tira os acentos."""
+    return unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode('ascii')
+
+
+def posicoes_bolhas(layout: LayoutProva,
+                    largura: int = LARGURA_IMPRESSAO) -> Dict[Tuple[int, str], Tuple[int, int, int]]:
+    """(questão, alternativa) → (cx, cy, raio) de cada bolha no cartão."""
+    altura = int(round(largura * PROPORCAO_FOLHA))
+    s = largura / _LARGURA_REFERENCIA
+    por_coluna = -(-layout.num_questoes // layout.num_colunas)
+    margem_topo, margem_base = int(altura * 0.12), int(altura * 0.05)
+    passo_y = (altura - margem_topo - margem_base) / por_coluna
+    raio = int(round(14 * s))
+    posicoes = {}
+    for col in range(layout.num_colunas):
+        x0 = int(col * largura / layout.num_colunas)
+        x1 = int((col + 1) * largura / layout.num_colunas)
+        area_x0 = x0 + int((x1 - x0) * 0.30)
+        area_x1 = x1 - int((x1 - x0) * 0.08)
+        passo_x = (area_x1 - area_x0) / layout.num_alternativas
+        for i in range(por_coluna):
+            numero = col * por_coluna + i + 1
+            if numero > layout.num_questoes:
+                break
+            cy = int(margem_topo + (i + 0.5) * passo_y)
+            for j, alternativa in enumerate(layout.alternativas):
+                posicoes[(numero, alternativa)] = (int(area_x0 + (j + 0.5) * passo_x), cy, raio)
+    return posicoes
+
+
+def gerar_modelo(layout: LayoutProva, largura: int = LARGURA_IMPRESSAO,
+                 titulo: str = 'CARTAO RESPOSTA') -> np.ndarray:
+    """Imagem em cinza (uint8) do cartão em branco para `layout`."""
+    altura = int(round(largura * PROPORCAO_FOLHA))
+    s = largura / _LARGURA_REFERENCIA
+    img = np.full((altura, largura), 255, np.uint8)
+    desenhar_marcadores(img)
+
+    # O título não pode encostar no marcador do canto superior direito
+    texto, escala, espessura = _ascii(titulo).upper(), 1.2 * s, max(1, int(round(2 * s)))
+    (largura_texto, _), _ = cv2.getTextSize(texto, cv2.FONT_HERSHEY_SIMPLEX, escala, espessura)
+    escala *= min(1.0, largura * 0.55 / max(largura_texto, 1))
+    cv2.putText(img, texto, (int(largura * 0.3), int(altura * 0.06)),
+                cv2.FONT_HERSHEY_SIMPLEX, escala, 0, espessura)
+
+    largura_coluna = largura / layout.num_colunas
+    for (numero, alternativa), (cx, cy, raio) in posicoes_bolhas(layout, largura).items():
+        if alternativa == layout.alternativas[0]:
+            x = int((cx // largura_coluna + 0.10) * largura_coluna)
+            cv2.putText(img, f'{numero:02d}', (x, cy + int(8 * s)),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.7 * s, 0, espessura)
+        cv2.circle(img, (cx, cy), raio, 60, espessura)
+    return img
+
+
+def modelo_png(layout: LayoutProva, largura: int = LARGURA_IMPRESSAO,
+               titulo: str = 'CARTAO RESPOSTA') -> bytes:
+    ok, png = cv2.imencode('.png', gerar_modelo(layout, largura, titulo))
+    if not ok:
+        raise ValueError('Falha ao codificar o modelo em PNG.')
+    return png.tobytes()
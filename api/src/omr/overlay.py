@@ -0,0 +1,148 @@
+"""Sobreposição de depuração: bolhas, preenchimentos e status sobre a folha.
+
+Desenha a partir da geometria gravada na leitura (`resultado['geometria']`),
+sem detectar nada de novo: a folha é retificada direto com o quadrilátero
+salvo e as bolhas vêm das coordenadas já medidas. Leituras sem geometria
+(IA visual, leituras antigas) recebem um painel com a lista de respostas ao
+lado da foto.
+"""
+
+from typing import Any, Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from . import preprocess
+from .classifier import STATUS_EM_BRANCO, STATUS_OK
+
+# Versão do desenho; entra no ETag para invalidar o cache quando o estilo muda
+VERSAO_OVERLAY = '1'
+
+# Cores (BGR)
+COR_OK = (40, 160, 40)
+COR_BRANCO = (150, 150, 150)
+COR_REVISAO = (0, 140, 255)
+COR_REVISADA = (200, 90, 20)
+COR_TEXTO = (20, 20, 20)
+
+LARGURA_SEM_GEOMETRIA = 1000
+LARGURA_PAINEL = 420
+
+
+def retificar(original: Optional[np.ndarray], geometria: Dict[str, Any]) -> np.ndarray:
+    """Folha no mesmo sistema de coordenadas das bolhas gravadas.
+
+    Sem imagem original (arquivo removido) desenha sobre uma folha em branco.
+    """
+    largura, altura = geometria['tamanho']
+    if original is None:
+        return np.full((altura, largura, 3), 255, np.uint8)
+    quad = geometria.get('quadrilatero')
+    folha = original
+    if quad is not None:
+        # Mesmo warp do pré-processamento (redução INTER_AREA antes da perspectiva)
+        folha = preprocess._warp(original, np.array(quad, dtype=np.float32), largura)
+    return cv2.resize(folha, (largura, altura), interpolation=cv2.INTER_AREA)
+
+
+def recortar_questao(folha: np.ndarray, geometria: Dict[str, Any],
+                     numero: int) -> Optional[np.ndarray]:
+    """Região de uma questão (todas as bolhas) na folha de `retificar`, com a
+    mesma margem dos recortes de revisão do pipeline."""
+    bolhas = [b for b in geometria.get('bolhas') or [] if b[0] == numero]
+    if not bolhas:
+        return None
+    cx = [b[2] for b in bolhas]
+    cy = [b[3] for b in bolhas]
+    margem = max(b[4] for b in bolhas) * 2
+    x0, x1 = max(0, min(cx) - margem), min(folha.shape[1], max(cx) + margem)
+    y0, y1 = max(0, min(cy) - margem), min(folha.shape[0], max(cy) + margem)
+    recorte = folha[y0:y1, x0:x1]
+    return recorte if recorte.size else None
+
+
+def _cor_questao(q: Dict[str, Any], revisada: bool):
+    if revisada:
+        return COR_REVISADA
+    if q.get('precisa_revisao'):
+        return COR_REVISAO
+    if q.get('status') == STATUS_EM_BRANCO:
+        return COR_BRANCO
+    return COR_OK
+
+
+def desenhar(folha: np.ndarray, geometria: Dict[str, Any], questoes: List[Dict[str, Any]],
+             revisoes: Optional[Dict[str, Any]] = None) -> np.ndarray:
+    """Desenha (na própria `folha`) cada bolha com o preenchimento medido e a
+    cor do status da questão; a alternativa escolhida recebe contorno grosso."""
+    revisoes = revisoes or {}
+    alternativas = geometria['alternativas']
+    por_numero = {q['numero']: q for q in questoes}
+    fonte = cv2.FONT_HERSHEY_SIMPLEX
+
+    for numero, alt_idx, cx, cy, raio in geometria['bolhas']:
+        q = por_numero.get(numero)
+        if q is None:
+            continue
+        alt = alternativas[alt_idx]
+        revisao = revisoes.get(str(numero))
+        cor = _cor_questao(q, revisao is not None)
+        escolhida = (revisao['alternativa'] if revisao is not None
+                     else q.get('alternativa_detectada'))
+        cv2.circle(folha, (cx, cy), raio + 3, cor, 4 if alt == escolhida else 1,
+                   cv2.LINE_AA)
+        fracao = (q.get('preenchimentos') or {}).get(alt)
+        if fracao is not None:
+            cv2.putText(folha, f'{fracao * 100:.0f}', (cx - raio, cy + raio + 14),
+                        fonte, 0.4, cor, 1, cv2.LINE_AA)
+        if alt_idx == 0:
+            rotulo = 'REV' if revisao is not None else (
+                'OK' if q.get('status') == STATUS_OK and not q.get('precisa_revisao')
+                else str(q.get('status', ''))[:6])
+            cv2.putText(folha, rotulo, (max(0, cx - raio - 70), cy + 5), fonte, 0.45,
+                        cor, 1, cv2.LINE_AA)
+    return folha
+
+
+def desenhar_sem_geometria(original: Optional[np.ndarray], questoes: List[Dict[str, Any]],
+                           revisoes: Optional[Dict[str, Any]] = None) -> np.ndarray:
+    """Foto reduzida + painel com a leitura de cada questão (sem coordenadas)."""
+    revisoes = revisoes or {}
+    if original is None:
+        foto = np.full((1400, LARGURA_SEM_GEOMETRIA, 3), 255, np.uint8)
+    else:
+        escala = LARGURA_SEM_GEOMETRIA / original.shape[1]
+        foto = cv2.resize(original, None, fx=escala, fy=escala,
+                          interpolation=cv2.INTER_AREA if escala < 1 else cv2.INTER_LINEAR)
+    linha = 22
+    altura = max(foto.shape[0], 40 + linha * len(questoes))
+    tela = np.full((altura, foto.shape[1] + LARGURA_PAINEL, 3), 255, np.uint8)
+    tela[:foto.shape[0], :foto.shape[1]] = foto
+
+    x = foto.shape[1] + 16
+    cv2.putText(tela, 'Leitura sem geometria (IA visual)', (x, 26),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.55, COR_TEXTO, 1, cv2.LINE_AA)
+    for i, q in enumerate(questoes):
+        revisao = revisoes.get(str(q['numero']))
+        resposta = (revisao['alternativa'] if revisao is not None
+                    else q.get('alternativa_detectada')) or '-'
+        texto = (f"{q['numero']:>3}  {resposta}  {q.get('confianca', 0):.2f}  "
+                 f"{'REVISADA' if revisao is not None else q.get('status', '')}")
+        cv2.putText(tela, texto, (x, 52 + i * linha), cv2.FONT_HERSHEY_SIMPLEX, 0.5,
+                    _cor_questao(q, revisao is not None), 1, cv2.LINE_AA)
+    return tela
+
+
+def renderizar_png(original: Optional[np.ndarray], resultado: Dict[str, Any],
+                   revisoes: Optional[Dict[str, Any]] = None) -> bytes:
+    """PNG da sobreposição para uma correção gravada."""
+    questoes = resultado.get('questoes') or []
+    geometria = resultado.get('geometria')
+    if geometria and geometria.get('bolhas'):
+        imagem = desenhar(retificar(original, geometria), geometria, questoes, revisoes)
+    else:
+        imagem = desenhar_sem_geometria(original, questoes, revisoes)
+    ok, buf = cv2.imencode('.png', imagem, [int(cv2.IMWRITE_PNG_COMPRESSION), 3])
+    if not ok:
+        raise ValueError('Não foi possível codificar a sobreposição em PNG.')
+    return buf.tobytes()
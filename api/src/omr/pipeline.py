@@ -10,63 +10,34 @@ Garantias:
 
 import base64
 import logging
-from dataclasses import dataclass, field
+import time
 from typing import Any, Dict, List, Optional
 
 import cv2
 import numpy as np
 
 from . import quality, preprocess, detector, classifier
+from .contexto import ContextoPipeline
+from .layout import LayoutProva  # noqa: F401 (reexportado)
+from .pontuacao import (  # noqa: F401 (reexportados)
+    STATUS_APROVADA, STATUS_ERRO, STATUS_REJEITADA, STATUS_REVISAO, aplicar_gabarito,
+)
 
 logger = logging.getLogger('omr.pipeline')
 
-STATUS_APROVADA = 'APROVADA_AUTOMATICA'
-STATUS_REVISAO = 'PRECISA_REVISAO'
-STATUS_REJEITADA = 'REJEITADA_QUALIDADE'
-STATUS_ERRO = 'ERRO_PROCESSAMENTO'
-
-
-@dataclass
-class LayoutProva:
-    """Configuração do layout do cartão-resposta (flexível por prova)."""
-    num_questoes: int = 44
-    num_alternativas: int = 5
-    num_colunas: int = 2
-    alternativas: List[str] = field(default_factory=lambda: ['A', 'B', 'C', 'D', 'E'])
-    # margens relativas usadas apenas no fallback de grade matemática
-    margens: Dict[str, float] = field(default_factory=lambda: {
-        'superior': 0.20, 'inferior': 0.02, 'esquerda': 0.30, 'direita': 0.02,
-    })
-
-    def __post_init__(self):
-        if len(self.alternativas) != self.num_alternativas:
-            self.alternativas = [chr(ord('A') + i) for i in range(self.num_alternativas)]
-
-    @classmethod
-    def from_dict(cls, data: Optional[Dict[str, Any]]) -> 'LayoutProva':
-        if not data:
-            return cls()
-        return cls(
-            num_questoes=int(data.get('num_questoes', 44)),
-            num_alternativas=int(data.get('num_alternativas', 5)),
-            num_colunas=int(data.get('num_colunas', 2)),
-            alternativas=data.get('alternativas') or
-                [chr(ord('A') + i) for i in range(int(data.get('num_alternativas', 5)))],
-            margens={**cls().margens, **(data.get('margens') or {})},
-        )
-
 
-def _recorte_base64(imagem: np.ndarray, bolhas: List[detector.Bolha],
+def _recorte_base64(imagem: np.ndarray, bolhas: detector.BolhasCompactas,
                     numero: int) -> Optional[str]:
     """Recorta a região da questão (todas as bolhas) e devolve PNG em base64."""
-    pts = [(b.cx, b.cy, b.raio) for b in bolhas if b.questao == numero]
-    if not pts:
+    s = bolhas.fatia(numero)
+    if s.start == s.stop:
         return None
-    margem = int(max(r for _, _, r in pts) * 2)
-    x0 = max(0, min(p[0] for p in pts) - margem)
-    x1 = min(imagem.shape[1], max(p[0] for p in pts) + margem)
-    y0 = max(0, min(p[1] for p in pts) - margem)
-    y1 = min(imagem.shape[0], max(p[1] for p in pts) + margem)
+    cx, cy = bolhas.cx[s], bolhas.cy[s]
+    margem = int(bolhas.raio[s].max()) * 2
+    x0 = max(0, int(cx.min()) - margem)
+    x1 = min(imagem.shape[1], int(cx.max()) + margem)
+    y0 = max(0, int(cy.min()) - margem)
+    y1 = min(imagem.shape[0], int(cy.max()) + margem)
     recorte = imagem[y0:y1, x0:x1]
     if recorte.size == 0:
         return None
@@ -74,18 +45,75 @@ def _recorte_base64(imagem: np.ndarray, bolhas: List[detector.Bolha],
     return base64.b64encode(buf).decode('ascii') if ok else None
 
 
+def reforcar_revisao_grade(questoes: List[classifier.QuestaoClassificada]):
+    """Regra de segurança extra: no modo grade (fallback, posições não
+    validadas), só leituras OK com confiança alta passam; o restante —
+    inclusive "em branco", que pode ser só grade desalinhada — vai para
+    revisão. Falso positivo é erro crítico; excesso de revisão não é."""
+    for qc in questoes:
+        if qc.status == classifier.STATUS_OK and qc.confianca >= 0.85:
+            continue
+        if qc.precisa_revisao:
+            continue
+        qc.status = classifier.STATUS_AMBIGUA
+        qc.alternativa = None
+        qc.motivo = ('Leitura por grade aproximada (bolhas não localizadas '
+                     'individualmente); confirmação manual necessária.')
+
+
 class CorrecaoPipeline:
     """Pipeline completo: qualidade → pré-processamento → detecção →
-    classificação → comparação com gabarito → regras de segurança."""
+    classificação → comparação com gabarito → regras de segurança.
+
+    `ler` faz tudo o que depende da imagem; `corrigir` aplica o gabarito
+    sobre essa leitura (ver pontuacao.aplicar_gabarito).
+
+    `tempos` guarda a duração (ms) de cada etapa da última chamada; é usado
+    pelo benchmark (benchmarks/omr.py) e pelos logs de diagnóstico.
+    """
+
+    def __init__(self, manter_folha: bool = False):
+        self.tempos: Dict[str, float] = {}
+        self._inicio_etapa = 0.0
+        # Com manter_folha, `folha` guarda o resultado do pré-processamento da
+        # última leitura (para o cache de folhas, ver src/cache_folhas.py)
+        self.manter_folha = manter_folha
+        self.folha: Optional[preprocess.FolhaPreprocessada] = None
+
+    def _etapa(self, nome: Optional[str] = None):
+        """Fecha a etapa em andamento como `nome` e inicia a seguinte."""
+        agora = time.perf_counter()
+        if nome is not None:
+            self.tempos[nome] = (agora - self._inicio_etapa) * 1000
+        self._inicio_etapa = agora
 
     def corrigir(self, image: np.ndarray,
                  gabarito: Dict[str, str],
                  layout: Optional[LayoutProva] = None) -> Dict[str, Any]:
         layout = layout or LayoutProva(num_questoes=len(gabarito) or 44)
+        leitura = self.ler(image, layout)
+        self._etapa()
+        resultado = aplicar_gabarito(leitura, gabarito, layout.num_questoes)
+        self._etapa('pontuacao')
+        return resultado
+
+    def ler(self, image: np.ndarray,
+            layout: Optional[LayoutProva] = None) -> Dict[str, Any]:
+        """Lê o cartão sem gabarito: qualidade, folha, bolhas e classificação."""
+        layout = layout or LayoutProva()
         diagnostico: List[str] = []
+        self.tempos = {}
+        self.folha = None
+        self._etapa()
+
+        # Intermediários compartilhados entre etapas, liberados após o último uso
+        contexto = ContextoPipeline(image)
 
         # ── 1. Validação de qualidade ────────────────────────────────────
-        q = quality.validar_imagem(image)
+        q, cinza = quality.avaliar_imagem(image)
+        contexto.guardar('cinza', cinza)
+        del cinza
+        self._etapa('qualidade')
         if not q.aprovada:
             logger.warning('Imagem rejeitada por qualidade: %s', q.problemas)
             return {
@@ -98,8 +126,42 @@ class CorrecaoPipeline:
         diagnostico.extend(q.problemas)  # avisos não bloqueantes (ex.: sombra)
 
         # ── 2. Pré-processamento ─────────────────────────────────────────
-        prep = preprocess.preprocessar(image)
-        if not prep.folha_detectada:
+        folha_detectada, metodo_folha = preprocess.preprocessar_contexto(
+            contexto, layout.iluminacao, layout.marcadores)
+        self._etapa('preprocessamento')
+        if self.manter_folha:
+            quad = contexto.ler('quadrilatero')
+            self.folha = preprocess.FolhaPreprocessada(
+                cinza=cv2.cvtColor(contexto.ler('corrigida'), cv2.COLOR_BGR2GRAY),
+                binaria=contexto.ler('binaria'),
+                folha_detectada=folha_detectada, metodo=metodo_folha,
+                quadrilatero=quad.tolist() if quad is not None else None,
+                qualidade=q.to_dict(),
+            )
+        return self._ler_folha(contexto, layout, q.to_dict(), folha_detectada,
+                               metodo_folha, diagnostico)
+
+    def ler_folha(self, folha: 'preprocess.FolhaPreprocessada',
+                  layout: Optional[LayoutProva] = None) -> Dict[str, Any]:
+        """Lê a partir da folha já retificada e binarizada (ex.: cache em disco
+        no reprocessamento): pula decodificação, qualidade, warp e binarização."""
+        layout = layout or LayoutProva()
+        self.tempos = {}
+        self._etapa()
+        contexto = ContextoPipeline(folha.cinza)
+        contexto.guardar('corrigida', folha.cinza)
+        contexto.guardar('binaria', folha.binaria)
+        if folha.quadrilatero is not None:
+            contexto.guardar('quadrilatero', np.array(folha.quadrilatero, dtype=np.float32))
+        diagnostico = list(folha.qualidade.get('problemas', []))
+        return self._ler_folha(contexto, layout, folha.qualidade, folha.folha_detectada,
+                               folha.metodo, diagnostico)
+
+    def _ler_folha(self, contexto: ContextoPipeline, layout: LayoutProva,
+                   qualidade: Dict[str, Any], folha_detectada: bool, metodo_folha: str,
+                   diagnostico: List[str]) -> Dict[str, Any]:
+        """Etapas 3 a 5 sobre 'corrigida' e 'binaria' guardadas no contexto."""
+        if not folha_detectada:
             diagnostico.append(
                 'Borda da folha não detectada; processando a imagem completa. '
                 'Garanta que o cartão apareça inteiro com fundo contrastante.'
@@ -107,13 +169,13 @@ class CorrecaoPipeline:
 
         # ── 3. Localização das bolhas ────────────────────────────────────
         det = detector.detectar_por_contornos(
-            prep.imagem_binaria, layout.num_questoes,
+            contexto.ler('binaria'), layout.num_questoes,
             layout.num_alternativas, layout.num_colunas, layout.alternativas,
         )
         usou_fallback = det is None
         if usou_fallback:
             det = detector.detectar_por_grade(
-                prep.imagem_binaria, layout.num_questoes,
+                contexto.ler('binaria'), layout.num_questoes,
                 layout.num_alternativas, layout.num_colunas,
                 layout.alternativas, layout.margens,
             )
@@ -121,77 +183,57 @@ class CorrecaoPipeline:
                 'Bolhas não localizadas individualmente; usada grade aproximada. '
                 'A exigência de revisão manual foi reforçada.'
             )
-        logger.info('Detecção: metodo=%s bolhas=%d', det.metodo, len(det.bolhas))
+        logger.info('Detecção: metodo=%s bolhas=%d', det.metodo, len(det.compactas))
+        self._etapa('deteccao')
 
         # ── 4. Medição e classificação ───────────────────────────────────
-        preenchimentos = detector.medir_preenchimentos(prep.imagem_binaria, det.bolhas)
-        questoes = classifier.classificar_prova(layout.num_questoes, preenchimentos)
+        preenchimentos = detector.medir_preenchimentos(contexto.consumir('binaria'),
+                                                      det.compactas)
+        limiares = classifier.limiares_configurados()
+        questoes = classifier.classificar_prova(layout.num_questoes, preenchimentos, limiares)
 
-        # Regra de segurança extra: no modo grade (fallback, posições não
-        # validadas), só leituras OK com confiança alta passam; o restante —
-        # inclusive "em branco", que pode ser só grade desalinhada — vai para
-        # revisão. Falso positivo é erro crítico; excesso de revisão não é.
         if usou_fallback:
-            for qc in questoes:
-                if qc.status == classifier.STATUS_OK and qc.confianca >= 0.85:
-                    continue
-                if qc.precisa_revisao:
-                    continue
-                qc.status = classifier.STATUS_AMBIGUA
-                qc.alternativa = None
-                qc.motivo = ('Leitura por grade aproximada (bolhas não localizadas '
-                             'individualmente); confirmação manual necessária.')
-
-        # ── 5. Comparação com o gabarito e nota ─────────────────────────
-        acertos = erros = em_branco = pendentes = 0
+            reforcar_revisao_grade(questoes)
+        self._etapa('classificacao')
+
+        # Geometria da leitura: permite desenhar a sobreposição de depuração
+        # depois (omr.overlay) sem detectar de novo
+        quad = contexto.consumir('quadrilatero')
+        corrigida = contexto.ler('corrigida')
+        geometria = {
+            'quadrilatero': quad.round(1).tolist() if quad is not None else None,
+            'tamanho': [int(corrigida.shape[1]), int(corrigida.shape[0])],
+            'alternativas': list(det.compactas.alternativas),
+            'bolhas': det.compactas.registros(),
+        }
+
+        # ── 5. Itens por questão (recorte das pendentes para revisão) ────
         detalhes = []
         for qc in questoes:
-            correta = gabarito.get(str(qc.numero))
             item = qc.to_dict()
-            item['resposta_correta'] = correta
             if qc.precisa_revisao:
-                pendentes += 1
-                item['acertou'] = None
-                item['recorte'] = _recorte_base64(prep.imagem_corrigida, det.bolhas, qc.numero)
-            elif qc.status == classifier.STATUS_EM_BRANCO:
-                em_branco += 1
-                erros += 1
-                item['acertou'] = False
-            else:
-                acertou = (qc.alternativa == correta)
-                acertos += int(acertou)
-                erros += int(not acertou)
-                item['acertou'] = acertou
+                item['recorte'] = _recorte_base64(contexto.ler('corrigida'), det.compactas,
+                                                  qc.numero)
             detalhes.append(item)
+        contexto.descartar_tudo()
+        self._etapa('recortes')
 
-        total = layout.num_questoes
-        # Nota sempre sobre o total de questões do gabarito
-        nota_provisoria = round(acertos / total * 10, 2) if total else 0.0
-        nota_maxima_possivel = round((acertos + pendentes) / total * 10, 2) if total else 0.0
-
-        status = STATUS_APROVADA if pendentes == 0 else STATUS_REVISAO
+        pendentes = sum(1 for qc in questoes if qc.precisa_revisao)
         if pendentes:
             diagnostico.append(
                 f'{pendentes} questão(ões) exigem revisão manual do professor '
                 'antes da confirmação da nota.'
             )
 
-        return {
-            'status': status,
-            'qualidade': q.to_dict(),
-            'folha': {'detectada': prep.folha_detectada, 'metodo': prep.metodo},
-            'deteccao': {'metodo': det.metodo, 'bolhas_localizadas': len(det.bolhas)},
-            'gabarito_usado': gabarito,
+        leitura = {
+            'status': STATUS_APROVADA if pendentes == 0 else STATUS_REVISAO,
+            'qualidade': qualidade,
+            'folha': {'detectada': folha_detectada, 'metodo': metodo_folha},
+            'deteccao': {'metodo': det.metodo, 'bolhas_localizadas': len(det.compactas)},
+            'geometria': geometria,
             'questoes': detalhes,
-            'resumo': {
-                'total_questoes': total,
-                'acertos': acertos,
-                'erros': erros,
-                'em_branco': em_branco,
-                'pendentes_revisao': pendentes,
-                'nota_provisoria': nota_provisoria,
-                'nota_maxima_possivel': nota_maxima_possivel,
-                'nota_confirmada': nota_provisoria if pendentes == 0 else None,
-            },
             'diagnostico': diagnostico,
         }
+        if limiares.origem != 'padrao':
+            leitura['limiares'] = limiares.to_dict()
+        return leitura
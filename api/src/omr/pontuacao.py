@@ -0,0 +1,116 @@
+"""Pontuação: aplica o gabarito oficial sobre a leitura do cartão.
+
+A leitura (qualidade, detecção, classificação por questão) não depende do
+gabarito; por isso é separada da pontuação. Trocar ou corrigir o gabarito
+exige apenas recalcular acertos e nota a partir das leituras já feitas,
+sem processar a imagem de novo.
+"""
+
+import copy
+from typing import Any, Dict, Iterable, Optional
+
+from .classifier import STATUS_EM_BRANCO
+
+STATUS_APROVADA = 'APROVADA_AUTOMATICA'
+STATUS_REVISAO = 'PRECISA_REVISAO'
+STATUS_REJEITADA = 'REJEITADA_QUALIDADE'
+STATUS_ERRO = 'ERRO_PROCESSAMENTO'
+
+
+def validar_gabarito(gabarito: Any, alternativas: Iterable[str]) -> Optional[str]:
+    """Mensagem de erro se o gabarito for inválido; None se estiver correto."""
+    alternativas = list(alternativas)
+    if not isinstance(gabarito, dict) or not gabarito:
+        return 'Gabarito oficial é obrigatório e não pode estar vazio.'
+    for chave, valor in gabarito.items():
+        if not str(chave).isdigit():
+            return f"Chave de questão inválida no gabarito: '{chave}'."
+        if valor not in alternativas:
+            return (f"Questão {chave}: resposta '{valor}' inválida. "
+                    f"Use: {', '.join(alternativas)}.")
+    return None
+
+
+def aplicar_gabarito(leitura: Dict[str, Any], gabarito: Dict[str, str],
+                     total: int) -> Dict[str, Any]:
+    """Monta o resultado completo (acertou por questão, resumo e nota).
+
+    `leitura` não é alterada. A nota é sempre calculada sobre `total`, o
+    total de questões do gabarito, e nunca sobre as questões detectadas.
+    """
+    resultado = copy.deepcopy(leitura)
+    if resultado.get('status') == STATUS_REJEITADA:
+        resultado.setdefault('resumo', None)
+        return resultado
+
+    acertos = erros = em_branco = pendentes = 0
+    for q in resultado['questoes']:
+        correta = gabarito.get(str(q['numero']))
+        q['resposta_correta'] = correta
+        if q['precisa_revisao']:
+            pendentes += 1
+            q['acertou'] = None
+        elif q['status'] == STATUS_EM_BRANCO:
+            em_branco += 1
+            erros += 1
+            q['acertou'] = False
+        else:
+            acertou = q['alternativa_detectada'] == correta
+            acertos += int(acertou)
+            erros += int(not acertou)
+            q['acertou'] = acertou
+
+    nota = round(acertos / total * 10, 2) if total else 0.0
+    resultado['status'] = STATUS_APROVADA if pendentes == 0 else STATUS_REVISAO
+    resultado['gabarito_usado'] = gabarito
+    resultado['resumo'] = {
+        'total_questoes': total,
+        'acertos': acertos,
+        'erros': erros,
+        'em_branco': em_branco,
+        'pendentes_revisao': pendentes,
+        'nota_provisoria': nota,
+        'nota_maxima_possivel': round((acertos + pendentes) / total * 10, 2) if total else 0.0,
+        'nota_confirmada': nota if pendentes == 0 else None,
+    }
+    return resultado
+
+
+def resumo_com_revisoes(resultado: Dict[str, Any],
+                        revisoes: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """Recalcula acertos/nota aplicando as revisões manuais por cima da leitura."""
+    gabarito = resultado.get('gabarito_usado', {})
+    total = resultado['resumo']['total_questoes']
+    acertos = erros = em_branco = pendentes = 0
+
+    for q in resultado['questoes']:
+        numero = str(q['numero'])
+        if numero in revisoes:
+            resposta = revisoes[numero]['alternativa']  # None = em branco confirmado
+            if resposta is None:
+                em_branco += 1
+                erros += 1
+            elif resposta == gabarito.get(numero):
+                acertos += 1
+            else:
+                erros += 1
+        elif q['precisa_revisao']:
+            pendentes += 1
+        elif q['status'] == STATUS_EM_BRANCO:
+            em_branco += 1
+            erros += 1
+        else:
+            acertos += int(bool(q['acertou']))
+            erros += int(not q['acertou'])
+
+    nota = round(acertos / total * 10, 2) if total else 0.0
+    return {
+        'total_questoes': total,
+        'acertos': acertos,
+        'erros': erros,
+        'em_branco': em_branco,
+        'pendentes_revisao': pendentes,
+        'nota_provisoria': nota,
+        'nota_maxima_possivel': round((acertos + pendentes) / total * 10, 2) if total else 0.0,
+        'nota_confirmada': nota if pendentes == 0 else None,
+    }
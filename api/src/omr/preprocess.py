@@ -1,15 +1,35 @@
 """Pré-processamento: normalização de iluminação, detecção da folha,
 correção de perspectiva e binarização adaptativa.
+
+Os intermediários circulam por um `ContextoPipeline`: a borda da folha é
+procurada numa versão reduzida do cinza e a folha é retificada já perto da
+largura de trabalho, então nenhuma cópia em resolução nativa sobrevive além
+da busca da folha.
 """
 
 import cv2
 import numpy as np
-from dataclasses import dataclass
-from typing import Optional, Tuple
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from .contexto import ContextoPipeline
+from .marcadores import localizar_marcadores, quadrilatero_por_marcadores
+from .layout import (  # noqa: F401 (reexportados)
+    ILUMINACAO_MORFOLOGICA, ILUMINACAO_PADRAO, ILUMINACAO_REDUZIDA, METODOS_ILUMINACAO,
+)
 
 # A folha precisa ocupar uma fração mínima da foto para o quadrilátero ser confiável
 AREA_MINIMA_FOLHA = 0.25
 LARGURA_PADRAO = 1200  # largura de trabalho após o warp
+LADO_BUSCA_FOLHA = 1000  # lado maior do cinza reduzido usado para achar a folha
+
+# Versão do pré-processamento (busca da folha, warp, iluminação, binarização).
+# Mudá-la invalida as folhas guardadas em src/cache_folhas.py.
+VERSAO_PREPROCESSAMENTO = '2'
+
+# Métodos de estimativa do fundo: ver layout.METODOS_ILUMINACAO
+KERNEL_FUNDO = 51
+FATOR_REDUCAO_FUNDO = 6
 
 
 @dataclass
@@ -17,7 +37,19 @@ class ResultadoPreprocessamento:
     imagem_corrigida: np.ndarray        # BGR, perspectiva corrigida
     imagem_binaria: np.ndarray          # binária invertida (marcações = branco)
     folha_detectada: bool
-    metodo: str                          # 'quadrilatero' | 'imagem_completa'
+    metodo: str                          # 'quadrilatero' | 'marcadores' | 'imagem_completa'
+
+
+@dataclass
+class FolhaPreprocessada:
+    """Produtos do pré-processamento reaproveitáveis sem a imagem original:
+    folha retificada em cinza e binária (largura LARGURA_PADRAO)."""
+    cinza: np.ndarray
+    binaria: np.ndarray
+    folha_detectada: bool
+    metodo: str
+    quadrilatero: Optional[List[List[float]]] = None   # cantos na imagem original
+    qualidade: Dict[str, Any] = field(default_factory=dict)
 
 
 def _ordenar_pontos(pts: np.ndarray) -> np.ndarray:
@@ -32,17 +64,41 @@ def _ordenar_pontos(pts: np.ndarray) -> np.ndarray:
     return rect
 
 
-def normalizar_iluminacao(gray: np.ndarray) -> np.ndarray:
+def _fundo_reduzido(gray: np.ndarray) -> np.ndarray:
+    """Fundo estimado em 1/FATOR_REDUCAO_FUNDO da resolução e ampliado de volta.
+
+    A sombra é um gradiente suave, então perder detalhe no fundo não importa;
+    o fechamento com kernel proporcional custa uma fração do de 51x51.
+    """
+    h, w = gray.shape
+    f = FATOR_REDUCAO_FUNDO
+    pequena = cv2.resize(gray, (max(1, w // f), max(1, h // f)), interpolation=cv2.INTER_AREA)
+    lado = max(3, (KERNEL_FUNDO // f) | 1)
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (lado, lado))
+    pequena = cv2.morphologyEx(pequena, cv2.MORPH_CLOSE, kernel)
+    return cv2.resize(pequena, (w, h), interpolation=cv2.INTER_LINEAR)
+
+
+def normalizar_iluminacao(gray: np.ndarray, metodo: Optional[str] = None) -> np.ndarray:
     """Remove gradientes de sombra dividindo pela estimativa do fundo.
 
     O fundo (papel) é estimado com fechamento morfológico de kernel grande;
     a divisão aplaina sombras e iluminação desigual sem apagar as marcações.
+    `metodo` escolhe onde o fechamento roda (ver METODOS_ILUMINACAO).
     """
-    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (51, 51))
-    fundo = cv2.morphologyEx(gray, cv2.MORPH_CLOSE, kernel)
-    fundo = np.where(fundo == 0, 1, fundo)
-    normalizada = cv2.divide(gray, fundo, scale=255)
-    return cv2.normalize(normalizada, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
+    metodo = metodo or ILUMINACAO_PADRAO
+    if metodo == ILUMINACAO_REDUZIDA:
+        fundo = _fundo_reduzido(gray)
+    elif metodo == ILUMINACAO_MORFOLOGICA:
+        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (KERNEL_FUNDO, KERNEL_FUNDO))
+        fundo = cv2.morphologyEx(gray, cv2.MORPH_CLOSE, kernel)
+    else:
+        raise ValueError(f"Método de iluminação desconhecido: '{metodo}'. "
+                         f"Use: {', '.join(METODOS_ILUMINACAO)}.")
+    # Tudo no próprio buffer do fundo: evita as cópias de np.where/astype
+    np.maximum(fundo, 1, out=fundo)
+    cv2.divide(gray, fundo, dst=fundo, scale=255)
+    return cv2.normalize(fundo, fundo, 0, 255, cv2.NORM_MINMAX)
 
 
 def _encontrar_quadrilatero_folha(gray: np.ndarray) -> Optional[np.ndarray]:
@@ -71,15 +127,34 @@ def _encontrar_quadrilatero_folha(gray: np.ndarray) -> Optional[np.ndarray]:
     return None
 
 
-def _warp(image: np.ndarray, quad: np.ndarray) -> np.ndarray:
+def _reduzir(gray: np.ndarray, lado_maximo: int) -> Tuple[np.ndarray, float]:
+    """Reduz para caber em `lado_maximo`. Devolve a imagem e o fator aplicado."""
+    fator = min(1.0, lado_maximo / max(gray.shape[:2]))
+    if fator >= 1.0:
+        return gray, 1.0
+    return cv2.resize(gray, None, fx=fator, fy=fator, interpolation=cv2.INTER_AREA), fator
+
+
+def _warp(image: np.ndarray, quad: np.ndarray,
+          largura_alvo: Optional[int] = None) -> np.ndarray:
+    """Retifica a folha. Com `largura_alvo`, a imagem é antes reduzida com
+    INTER_AREA para perto dessa largura (o warp interpola linearmente e
+    serrilharia os anéis finos se reduzisse muito de uma vez)."""
     rect = _ordenar_pontos(quad)
     (tl, tr, br, bl) = rect
     largura = max(int(np.linalg.norm(br - bl)), int(np.linalg.norm(tr - tl)))
+    if largura_alvo and largura > largura_alvo:
+        fator = largura_alvo / largura
+        image = cv2.resize(image, None, fx=fator, fy=fator, interpolation=cv2.INTER_AREA)
+        rect = rect * fator
+        (tl, tr, br, bl) = rect
+    largura = max(int(np.linalg.norm(br - bl)), int(np.linalg.norm(tr - tl)))
     altura = max(int(np.linalg.norm(tr - br)), int(np.linalg.norm(tl - bl)))
     dst = np.array([[0, 0], [largura - 1, 0], [largura - 1, altura - 1], [0, altura - 1]],
                    dtype='float32')
     m = cv2.getPerspectiveTransform(rect, dst)
-    return cv2.warpPerspective(image, m, (largura, altura))
+    # Pelos marcadores, o canto calculado do papel pode cair fora da foto
+    return cv2.warpPerspective(image, m, (largura, altura), borderMode=cv2.BORDER_REPLICATE)
 
 
 def binarizar(gray: np.ndarray) -> np.ndarray:
@@ -93,36 +168,85 @@ def binarizar(gray: np.ndarray) -> np.ndarray:
     return cv2.morphologyEx(binaria, cv2.MORPH_OPEN, np.ones((3, 3), np.uint8))
 
 
-def preprocessar(image: np.ndarray) -> ResultadoPreprocessamento:
-    """Pipeline completo de pré-processamento."""
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+def _quadrilatero_por_marcadores(reduzida: np.ndarray) -> Optional[np.ndarray]:
+    centros = localizar_marcadores(reduzida)
+    return quadrilatero_por_marcadores(centros) if centros is not None else None
+
+
+def preprocessar_contexto(contexto: ContextoPipeline,
+                          iluminacao: Optional[str] = None,
+                          marcadores: bool = False) -> Tuple[bool, str]:
+    """Pré-processa `contexto.imagem`, guardando no contexto 'corrigida'
+    (BGR na largura de trabalho), 'binaria' e, se a folha foi encontrada,
+    'quadrilatero' (cantos tl, tr, br, bl na imagem original).
+
+    Consome 'cinza' se a validação de qualidade já a tiver guardado.
+    `iluminacao` escolhe o método de normalizar_iluminacao. Com `marcadores`
+    (cartão impresso com os marcadores de canto, ver omr.marcadores) eles são
+    procurados antes da borda; sem, só quando a borda não é achada.
+    Devolve (folha_detectada, metodo).
+    """
+    image = contexto.imagem
+    gray = contexto.consumir('cinza')
+    if gray is None:
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+    # A borda da folha é procurada no cinza ORIGINAL (reduzido): a normalização
+    # de iluminação aplaina o contraste folha/fundo e apagaria a borda.
+    reduzida, fator = _reduzir(gray, LADO_BUSCA_FOLHA)
+    del gray
+    buscas = [('quadrilatero', _encontrar_quadrilatero_folha),
+              ('marcadores', _quadrilatero_por_marcadores)]
+    if marcadores:
+        buscas.reverse()
+    quad, metodo = None, 'imagem_completa'
+    for nome, buscar in buscas:
+        quad = buscar(reduzida)
+        if quad is not None:
+            metodo = nome
+            break
+    del reduzida
 
-    # A borda da folha é procurada no cinza ORIGINAL: a normalização de
-    # iluminação aplaina o contraste folha/fundo e apagaria a borda.
-    quad = _encontrar_quadrilatero_folha(gray)
     if quad is not None:
-        corrigida = _warp(image, quad)
+        contexto.guardar('quadrilatero', _ordenar_pontos(quad / fator))
+        corrigida = _warp(image, quad / fator, LARGURA_PADRAO)
         folha_detectada = True
-        metodo = 'quadrilatero'
     else:
         # Foto provavelmente já enquadrada na folha: segue sem warp,
         # mas o pipeline registra isso e reduz a confiança global.
-        corrigida = image.copy()
+        corrigida = image
         folha_detectada = False
-        metodo = 'imagem_completa'
 
-    # Redimensiona para largura de trabalho padronizada (estabiliza thresholds)
+    # Redimensiona para largura de trabalho padronizada (estabiliza thresholds).
+    # O resize sempre aloca um buffer novo, então a entrada nunca é alterada.
     escala = LARGURA_PADRAO / corrigida.shape[1]
     corrigida = cv2.resize(corrigida, None, fx=escala, fy=escala,
                            interpolation=cv2.INTER_AREA if escala < 1 else cv2.INTER_CUBIC)
+    contexto.guardar('corrigida', corrigida)
+
+    contexto.guardar('normalizada',
+                     normalizar_iluminacao(cv2.cvtColor(corrigida, cv2.COLOR_BGR2GRAY),
+                                           iluminacao))
+    contexto.guardar('binaria', binarizar(contexto.consumir('normalizada')))
+    return folha_detectada, metodo
 
-    gray_corr = cv2.cvtColor(corrigida, cv2.COLOR_BGR2GRAY)
-    gray_corr = normalizar_iluminacao(gray_corr)
-    binaria = binarizar(gray_corr)
 
+def preprocessar(image: np.ndarray,
+                 gray: Optional[np.ndarray] = None,
+                 iluminacao: Optional[str] = None,
+                 marcadores: bool = False) -> ResultadoPreprocessamento:
+    """Pipeline completo de pré-processamento.
+
+    `gray` é a versão em cinza de `image`, quando já calculada pela validação
+    de qualidade.
+    """
+    contexto = ContextoPipeline(image)
+    if gray is not None:
+        contexto.guardar('cinza', gray)
+    folha_detectada, metodo = preprocessar_contexto(contexto, iluminacao, marcadores)
     return ResultadoPreprocessamento(
-        imagem_corrigida=corrigida,
-        imagem_binaria=binaria,
+        imagem_corrigida=contexto.ler('corrigida'),
+        imagem_binaria=contexto.ler('binaria'),
         folha_detectada=folha_detectada,
         metodo=metodo,
     )
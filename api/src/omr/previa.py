@@ -0,0 +1,92 @@
+"""Verificação rápida de qualidade para a pré-visualização da câmera.
+
+Roda sobre um quadro pequeno (lado maior ≤ PREVIA_LADO_MAXIMO) enviado pelo
+app antes da foto definitiva: mede brilho, contraste, iluminação e nitidez
+com os mesmos cálculos de `quality` e procura a borda da folha com o mesmo
+detector do pré-processamento, em poucos milissegundos.
+
+É só uma orientação para o professor refazer o enquadramento antes de enviar
+megabytes: a foto definitiva continua passando por `quality.avaliar_imagem`
+no upload. A nitidez do quadro reduzido não enxerga desfoque menor que um
+pixel dele, por isso tem limite próprio (NITIDEZ_MINIMA_PREVIA) e só pega
+tremor/foco grosseiros.
+"""
+
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+import cv2
+import numpy as np
+
+from . import preprocess, quality
+
+PREVIA_LADO_MAXIMO = 640
+# Variância do Laplaciano no quadro de até 640 px: abaixo disso o borrão
+# passa de ~0,8 px no quadro (~3 px numa foto de 12 MP)
+NITIDEZ_MINIMA_PREVIA = 100.0
+
+
+@dataclass
+class ResultadoPrevia:
+    pronta: bool = True                  # sem problemas: pode tirar a foto
+    nitidez: float = 0.0
+    brilho: float = 0.0
+    contraste: float = 0.0
+    desvio_iluminacao: float = 0.0
+    folha_visivel: bool = False
+    # Cantos tl, tr, br, bl em fração da largura/altura do quadro
+    quadrilatero: Optional[List[List[float]]] = None
+    problemas: List[str] = field(default_factory=list)
+
+    def to_dict(self):
+        return {
+            'pronta': self.pronta,
+            'nitidez': round(self.nitidez, 1),
+            'brilho': round(self.brilho, 1),
+            'contraste': round(self.contraste, 1),
+            'desvio_iluminacao': round(self.desvio_iluminacao, 1),
+            'folha_visivel': self.folha_visivel,
+            'quadrilatero': self.quadrilatero,
+            'problemas': self.problemas,
+        }
+
+
+def avaliar_previa(gray: np.ndarray) -> ResultadoPrevia:
+    """Avalia um quadro em cinza (lado maior ≤ PREVIA_LADO_MAXIMO)."""
+    r = ResultadoPrevia()
+    altura, largura = gray.shape[:2]
+
+    r.nitidez = quality._nitidez(gray)
+    if r.nitidez < NITIDEZ_MINIMA_PREVIA:
+        r.problemas.append('Imagem tremida ou fora de foco. Segure firme e aguarde o foco.')
+
+    media, desvio = cv2.meanStdDev(gray)
+    r.brilho = float(media[0, 0])
+    r.contraste = float(desvio[0, 0])
+    if r.brilho < quality.BRILHO_MINIMO:
+        r.problemas.append('Ambiente escuro demais. Procure mais luz.')
+    elif r.brilho > quality.BRILHO_MAXIMO:
+        r.problemas.append('Imagem clara demais. Evite flash direto ou reflexo.')
+    if r.contraste < quality.CONTRASTE_MINIMO:
+        r.problemas.append('Contraste muito baixo. Verifique iluminação e foco.')
+
+    bloqueantes = len(r.problemas)
+    blocos = cv2.resize(gray.astype(np.float32), (4, 4), interpolation=cv2.INTER_AREA)
+    r.desvio_iluminacao = float(blocos.max() - blocos.min())
+    sombra = r.desvio_iluminacao > quality.SOMBRA_MAX_DESVIO
+
+    quad = preprocess._encontrar_quadrilatero_folha(gray)
+    r.folha_visivel = quad is not None
+    if quad is not None:
+        cantos = preprocess._ordenar_pontos(quad) / np.array([largura, altura], np.float32)
+        r.quadrilatero = [[round(float(x), 4), round(float(y), 4)] for x, y in cantos]
+    else:
+        r.problemas.append('Cartão não encontrado. Enquadre a folha inteira, com fundo '
+                           'contrastante ao redor.')
+        bloqueantes += 1
+
+    # Como em quality, sombra é só aviso: o pré-processamento compensa
+    if sombra:
+        r.problemas.append('Sombra sobre o cartão. Se possível, mude o ângulo ou a luz.')
+    r.pronta = bloqueantes == 0
+    return r
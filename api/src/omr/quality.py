@@ -2,12 +2,17 @@
 
 Uma imagem reprovada aqui NUNCA chega ao corretor automático — o professor
 recebe o motivo e orientação para capturar novamente.
+
+As métricas são calculadas em uma só passada barata: brilho, contraste e
+blocos de iluminação sobre uma miniatura de tamanho limitado, e nitidez sobre
+a imagem inteira em resolução nativa (reduzir a imagem falsearia o foco, e um
+recorte mede outra densidade de bordas que a do cartão todo).
 """
 
 import cv2
 import numpy as np
 from dataclasses import dataclass, field
-from typing import List
+from typing import List, Tuple
 
 # Limites mínimos calibrados para cartões A4 fotografados com celular
 RESOLUCAO_MINIMA = 600           # menor lado em pixels
@@ -17,6 +22,8 @@ BRILHO_MAXIMO = 235.0
 CONTRASTE_MINIMO = 25.0          # desvio padrão de cinza
 SOMBRA_MAX_DESVIO = 90.0         # desvio entre blocos de iluminação
 
+MINIATURA_LADO_MAXIMO = 512      # lado maior da miniatura de brilho/contraste
+
 
 @dataclass
 class ResultadoQualidade:
@@ -41,8 +48,32 @@ class ResultadoQualidade:
         }
 
 
-def validar_imagem(image: np.ndarray) -> ResultadoQualidade:
-    """Valida nitidez, iluminação, contraste e resolução da imagem."""
+def _miniatura(gray: np.ndarray) -> np.ndarray:
+    """Amostra por vizinho mais próximo: preserva média e desvio padrão
+    (INTER_AREA suavizaria as bordas e subestimaria o contraste)."""
+    escala = MINIATURA_LADO_MAXIMO / max(gray.shape)
+    if escala >= 1:
+        return gray
+    return cv2.resize(gray, None, fx=escala, fy=escala, interpolation=cv2.INTER_NEAREST)
+
+
+def _nitidez(gray: np.ndarray) -> float:
+    """Variância do Laplaciano da imagem inteira.
+
+    CV_16S comporta o Laplaciano de uint8 sem perda e meanStdDev acumula sem
+    converter para float: mesmo valor do CV_64F + var(), em uma fração do tempo.
+    """
+    lap = cv2.Laplacian(gray, cv2.CV_16S)
+    _, desvio = cv2.meanStdDev(lap)
+    return float(desvio[0, 0]) ** 2
+
+
+def avaliar_imagem(image: np.ndarray) -> Tuple[ResultadoQualidade, np.ndarray]:
+    """Valida nitidez, iluminação, contraste e resolução da imagem.
+
+    Devolve também a imagem em cinza, para o pré-processamento não repetir a
+    conversão BGR→cinza.
+    """
     r = ResultadoQualidade()
     r.altura, r.largura = image.shape[:2]
 
@@ -55,31 +86,29 @@ def validar_imagem(image: np.ndarray) -> ResultadoQualidade:
     gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
 
     # Nitidez: variância do Laplaciano (medida clássica de foco)
-    r.nitidez = float(cv2.Laplacian(gray, cv2.CV_64F).var())
+    r.nitidez = _nitidez(gray)
     if r.nitidez < NITIDEZ_MINIMA:
         r.problemas.append(
             'Imagem desfocada/borrada. Refaça a foto mantendo o celular estável '
             'e aguarde o foco automático.'
         )
 
-    # Iluminação global
-    r.brilho = float(gray.mean())
+    # Iluminação global (miniatura: a média e o desvio não dependem da resolução)
+    mini = _miniatura(gray)
+    media, desvio = cv2.meanStdDev(mini)
+    r.brilho = float(media[0, 0])
     if r.brilho < BRILHO_MINIMO:
         r.problemas.append('Imagem muito escura. Fotografe em ambiente mais iluminado.')
     elif r.brilho > BRILHO_MAXIMO:
         r.problemas.append('Imagem estourada/clara demais. Evite flash direto ou luz forte refletida.')
 
-    r.contraste = float(gray.std())
+    r.contraste = float(desvio[0, 0])
     if r.contraste < CONTRASTE_MINIMO:
         r.problemas.append('Contraste muito baixo. Verifique iluminação e foco.')
 
     # Iluminação desigual (sombra forte): compara brilho médio de blocos 4x4
-    h, w = gray.shape
-    blocos = [
-        gray[i * h // 4:(i + 1) * h // 4, j * w // 4:(j + 1) * w // 4].mean()
-        for i in range(4) for j in range(4)
-    ]
-    r.desvio_iluminacao = float(max(blocos) - min(blocos))
+    blocos = cv2.resize(mini.astype(np.float32), (4, 4), interpolation=cv2.INTER_AREA)
+    r.desvio_iluminacao = float(blocos.max() - blocos.min())
     if r.desvio_iluminacao > SOMBRA_MAX_DESVIO:
         # Sombra não reprova sozinha (o pré-processamento normaliza), mas é registrada
         r.problemas.append(
@@ -90,4 +119,9 @@ def validar_imagem(image: np.ndarray) -> ResultadoQualidade:
     # Só os problemas estruturais reprovam; sombra é apenas aviso
     problemas_bloqueantes = [p for p in r.problemas if not p.startswith('Iluminação desigual')]
     r.aprovada = len(problemas_bloqueantes) == 0
-    return r
+    return r, gray
+
+
+def validar_imagem(image: np.ndarray) -> ResultadoQualidade:
+    """Valida nitidez, iluminação, contraste e resolução da imagem."""
+    return avaliar_imagem(image)[0]
@@ -0,0 +1,331 @@
+"""Reprocessamento em lote após mudança de versão do algoritmo.
+
+Seleciona as correções não confirmadas cuja `versao_algoritmo` difere da
+atual e relê cada imagem original num pool de processos. As leituras voltam
+ao processo principal, que as grava em transações por lote (uma por
+`tamanho_lote` correções) — o banco nunca é escrito pelos trabalhadores.
+
+Depois de cada lote o progresso vai para um arquivo de checkpoint (JSON):
+interrompido, o reprocessamento recomeça de onde parou com o mesmo
+checkpoint. As correções já gravadas saem da seleção sozinhas (a versão foi
+atualizada); o checkpoint guarda as falhas, que não são repetidas sem
+`repetir_falhas`, e o relatório acumulado de mudanças de status:
+  - transicoes: contagem por "ANTES -> DEPOIS"
+  - novas_aprovacoes: correções que passaram a APROVADA_AUTOMATICA
+  - novas_revisoes: correções que passaram a PRECISA_REVISAO
+  - revisoes_descartadas: leitura mudou e as revisões manuais caíram
+  - notas_alteradas: correções com nota provisória diferente
+
+As imagens são relidas pelo pipeline local (OpenCV), qualquer que seja o
+MOTOR_LEITURA da API: com o padrão 'ia', o lote mandaria cada correção
+pendente à API de visão da OpenAI, em paralelo. Reler com a IA exige pedir
+explicitamente (--motor ia / "motor": "ia"); nesse caso a leitura é feita
+uma por vez, sem pool, e o custo fica por conta de quem pediu.
+
+Uso (a partir da raiz da API):
+    python -m src.reprocessamento [--turma 3A] [--trabalhadores 4] [--lote 50]
+        [--checkpoint arquivo.json] [--recomecar] [--repetir-falhas] [--simular]
+        [--motor local|ia]
+
+Também disponível por POST /api/v2/admin/reprocessamento (routes/admin.py).
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.models.correcao import VERSAO_ALGORITMO, Correcao
+from src.models.user import db
+from src.omr.pontuacao import STATUS_APROVADA, STATUS_REVISAO
+from src.routes.correcao import MOTOR_IA, MOTOR_LOCAL, MOTORES_LEITURA
+
+logger = logging.getLogger('api.reprocessamento')
+
+STATUS_CONFIRMADA = 'CONFIRMADA'
+TAMANHO_LOTE_PADRAO = 50
+
+# (id, caminho da imagem, layout, gabarito) -> (id, leitura, erro)
+Tarefa = Tuple[int, Optional[str], Dict[str, Any], Dict[str, str]]
+Progresso = Callable[[Dict[str, Any]], None]
+
+
+def limite_trabalhadores() -> int:
+    """Teto do pool: a leitura é presa à CPU, mais processos só disputam núcleos."""
+    return os.cpu_count() or 1
+
+
+def caminho_checkpoint_padrao() -> str:
+    import src.routes.correcao as rotas
+    return os.path.join(rotas.STORAGE_DIR, 'reprocessamento',
+                        f'checkpoint-{VERSAO_ALGORITMO}.json')
+
+
+def consulta_pendentes(turma: Optional[str] = None):
+    """Correções não confirmadas lidas por outra versão do algoritmo."""
+    consulta = Correcao.query.filter(
+        Correcao.status != STATUS_CONFIRMADA,
+        db.or_(Correcao.versao_algoritmo.is_(None),
+               Correcao.versao_algoritmo != VERSAO_ALGORITMO),
+    )
+    if turma:
+        consulta = consulta.filter(Correcao.turma == turma)
+    return consulta.order_by(Correcao.id)
+
+
+# ── Checkpoint ───────────────────────────────────────────────────────────
+
+def _checkpoint_novo(turma: Optional[str], motor: str) -> Dict[str, Any]:
+    return {
+        'versao_alvo': VERSAO_ALGORITMO,
+        'turma': turma,
+        'motor': motor,
+        'estado': 'executando',
+        'iniciado_em': datetime.now(timezone.utc).isoformat(),
+        'atualizado_em': None,
+        'total': 0,
+        'processadas': 0,
+        'falhas': {},
+        'relatorio': {
+            'transicoes': {},
+            'novas_aprovacoes': [],
+            'novas_revisoes': [],
+            'revisoes_descartadas': [],
+            'notas_alteradas': 0,
+        },
+    }
+
+
+def carregar_checkpoint(caminho: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(caminho, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError):
+        logger.warning('Checkpoint ilegível ignorado: %s', caminho)
+        return None
+
+
+def _salvar_checkpoint(caminho: str, checkpoint: Dict[str, Any]):
+    checkpoint['atualizado_em'] = datetime.now(timezone.utc).isoformat()
+    diretorio = os.path.dirname(caminho) or '.'
+    os.makedirs(diretorio, exist_ok=True)
+    # Escrita atômica: uma interrupção nunca deixa o checkpoint pela metade
+    fd, temporario = tempfile.mkstemp(dir=diretorio, suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f, indent=2, ensure_ascii=False)
+    os.replace(temporario, caminho)
+
+
+# ── Trabalhadores ────────────────────────────────────────────────────────
+
+def _iniciar_trabalhador(storage_dir: str):
+    import src.routes.correcao as rotas
+    rotas.STORAGE_DIR = storage_dir   # caches de leitura/folha no mesmo lugar da API
+
+
+def _ler_tarefa(tarefa: Tarefa, motor: str = MOTOR_LOCAL
+                ) -> Tuple[int, Optional[dict], Optional[str]]:
+    """Relê uma imagem original (roda no trabalhador; não toca no banco)."""
+    from src.omr import LayoutProva
+    from src.routes.correcao import _ler_cartao
+
+    correcao_id, caminho, layout, gabarito = tarefa
+    if not caminho or not os.path.exists(caminho):
+        return correcao_id, None, 'Imagem original não está mais disponível.'
+    try:
+        with open(caminho, 'rb') as f:
+            dados = f.read()
+        leitura = _ler_cartao(dados, gabarito, LayoutProva.from_dict(layout), motor)
+        return correcao_id, leitura, None
+    except Exception as exc:  # uma imagem ruim não derruba o lote
+        logger.exception('Falha ao reler a correção %s', correcao_id)
+        return correcao_id, None, f'{type(exc).__name__}: {exc}'
+
+
+def _tarefa(correcao: Correcao) -> Tarefa:
+    from src.routes.correcao import _layout_gravado
+    gabarito = correcao.gabarito
+    return (correcao.id, correcao.imagem_original_path,
+            _layout_gravado(correcao, gabarito).to_dict(), gabarito)
+
+
+# ── Execução ─────────────────────────────────────────────────────────────
+
+def _registrar_mudanca(relatorio: Dict[str, Any], correcao_id: int, antes: str, depois: str,
+                       nota_antes, nota_depois, revisoes_descartadas: bool):
+    transicao = f'{antes} -> {depois}'
+    relatorio['transicoes'][transicao] = relatorio['transicoes'].get(transicao, 0) + 1
+    if depois != antes and depois == STATUS_APROVADA:
+        relatorio['novas_aprovacoes'].append(correcao_id)
+    if depois != antes and depois == STATUS_REVISAO:
+        relatorio['novas_revisoes'].append(correcao_id)
+    if revisoes_descartadas:
+        relatorio['revisoes_descartadas'].append(correcao_id)
+    if nota_antes != nota_depois:
+        relatorio['notas_alteradas'] += 1
+
+
+def _gravar_lote(leituras, checkpoint: Dict[str, Any]) -> int:
+    """Aplica as leituras de um lote numa única transação."""
+    from src.routes.correcao import _aplicar_releitura, _layout_gravado
+
+    gravadas = 0
+    for correcao_id, leitura, erro in leituras:
+        if erro is not None:
+            checkpoint['falhas'][str(correcao_id)] = erro
+            continue
+        correcao = db.session.get(Correcao, correcao_id)
+        # Confirmada ou reprocessada por outro caminho enquanto era lida
+        if (correcao is None or correcao.status == STATUS_CONFIRMADA
+                or correcao.versao_algoritmo == VERSAO_ALGORITMO):
+            continue
+        antes, nota_antes = correcao.status, correcao.nota_provisoria
+        tinha_revisoes = bool(correcao.revisoes)
+        gabarito = correcao.gabarito
+        _aplicar_releitura(correcao, leitura, gabarito, _layout_gravado(correcao, gabarito))
+        _registrar_mudanca(checkpoint['relatorio'], correcao_id, antes, correcao.status,
+                           nota_antes, correcao.nota_provisoria,
+                           tinha_revisoes and not correcao.revisoes)
+        checkpoint['falhas'].pop(str(correcao_id), None)
+        gravadas += 1
+    db.session.commit()
+    return gravadas
+
+
+def reprocessar(turma: Optional[str] = None, trabalhadores: Optional[int] = None,
+                tamanho_lote: int = TAMANHO_LOTE_PADRAO, checkpoint_path: Optional[str] = None,
+                recomecar: bool = False, repetir_falhas: bool = False,
+                progresso: Optional[Progresso] = None,
+                motor: str = MOTOR_LOCAL) -> Dict[str, Any]:
+    """Reprocessa as correções pendentes; exige contexto de aplicação Flask.
+
+    `trabalhadores=0` lê no próprio processo (útil em testes e depuração);
+    acima de `limite_trabalhadores()` o pool fica no limite. `motor` é o
+    pipeline local, a menos que a IA seja pedida: aí não há pool.
+    Devolve o checkpoint final (progresso, falhas e relatório de mudanças).
+    """
+    import src.routes.correcao as rotas
+
+    if motor not in MOTORES_LEITURA:
+        raise ValueError(f"Motor de leitura desconhecido: '{motor}'.")
+    checkpoint_path = checkpoint_path or caminho_checkpoint_padrao()
+    checkpoint = None if recomecar else carregar_checkpoint(checkpoint_path)
+    if (checkpoint is None or checkpoint.get('versao_alvo') != VERSAO_ALGORITMO
+            or checkpoint.get('turma') != turma
+            or checkpoint.get('motor', MOTOR_LOCAL) != motor):
+        checkpoint = _checkpoint_novo(turma, motor)
+    checkpoint['estado'] = 'executando'
+
+    ignorar = set() if repetir_falhas else {int(i) for i in checkpoint['falhas']}
+    ids = [cid for (cid,) in consulta_pendentes(turma).with_entities(Correcao.id)
+           if cid not in ignorar]
+    checkpoint['total'] = checkpoint['processadas'] + len(ids)
+    _salvar_checkpoint(checkpoint_path, checkpoint)
+    logger.info('Reprocessamento para a versão %s: %d correções pendentes',
+                VERSAO_ALGORITMO, len(ids))
+
+    if trabalhadores is None:
+        trabalhadores = limite_trabalhadores()
+    trabalhadores = min(trabalhadores, limite_trabalhadores())
+    if motor == MOTOR_IA:
+        # Cada leitura é uma chamada paga à API de visão: uma por vez
+        logger.warning('Reprocessamento pela IA: %d imagens serão enviadas à OpenAI, '
+                       'uma por vez', len(ids))
+        trabalhadores = 0
+    ler = partial(_ler_tarefa, motor=motor)
+    pool = None
+    if trabalhadores > 0 and ids:
+        # spawn: seguro mesmo disparado de uma thread do servidor
+        pool = ProcessPoolExecutor(
+            max_workers=trabalhadores, mp_context=multiprocessing.get_context('spawn'),
+            initializer=_iniciar_trabalhador, initargs=(rotas.STORAGE_DIR,))
+    inicio = time.perf_counter()
+    feitas = 0
+    try:
+        for i in range(0, len(ids), tamanho_lote):
+            lote = ids[i:i + tamanho_lote]
+            tarefas = [_tarefa(c) for c in
+                       Correcao.query.filter(Correcao.id.in_(lote)).order_by(Correcao.id)]
+            db.session.rollback()   # não segura a transação de leitura durante o lote
+            if pool is not None:
+                leituras = list(pool.map(ler, tarefas))
+            else:
+                leituras = [ler(t) for t in tarefas]
+            checkpoint['processadas'] += _gravar_lote(leituras, checkpoint)
+            feitas += len(lote)
+            _salvar_checkpoint(checkpoint_path, checkpoint)
+
+            decorrido = time.perf_counter() - inicio
+            if progresso is not None:
+                progresso({'feitas': feitas, 'total': len(ids), 'falhas': len(checkpoint['falhas']),
+                           'por_segundo': feitas / decorrido if decorrido else 0.0,
+                           'restante_s': decorrido / feitas * (len(ids) - feitas)})
+    except BaseException:
+        db.session.rollback()
+        checkpoint['estado'] = 'interrompido'
+        _salvar_checkpoint(checkpoint_path, checkpoint)
+        raise
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    checkpoint['estado'] = 'concluido'
+    _salvar_checkpoint(checkpoint_path, checkpoint)
+    logger.info('Reprocessamento concluído: %d gravadas, %d falhas',
+                checkpoint['processadas'], len(checkpoint['falhas']))
+    return checkpoint
+
+
+def _imprimir_progresso(p: Dict[str, Any]):
+    pct = 100 * p['feitas'] / p['total'] if p['total'] else 100.0
+    print(f"[{p['feitas']:>6}/{p['total']:<6}] {pct:5.1f}%  {p['por_segundo']:.1f}/s  "
+          f"falhas={p['falhas']}  restante~{p['restante_s'] / 60:.1f} min",
+          file=sys.stderr, flush=True)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--turma', help='só esta turma')
+    parser.add_argument('--trabalhadores', type=int, default=None,
+                        help='processos de leitura (padrão e máximo: nº de CPUs; 0 = sem pool)')
+    parser.add_argument('--lote', type=int, default=TAMANHO_LOTE_PADRAO,
+                        help='correções por transação')
+    parser.add_argument('--checkpoint', help='arquivo de checkpoint (padrão: em STORAGE_DIR)')
+    parser.add_argument('--recomecar', action='store_true',
+                        help='ignora o checkpoint existente')
+    parser.add_argument('--repetir-falhas', action='store_true',
+                        help='tenta de novo as correções que falharam antes')
+    parser.add_argument('--simular', action='store_true',
+                        help='só conta as correções pendentes')
+    parser.add_argument('--motor', choices=MOTORES_LEITURA, default=MOTOR_LOCAL,
+                        help='motor de releitura (padrão: local, independente de '
+                             'MOTOR_LEITURA; "ia" envia cada imagem à OpenAI, uma por vez)')
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from src.main import app
+    with app.app_context():
+        if args.simular:
+            print(f'{consulta_pendentes(args.turma).count()} correções pendentes '
+                  f'para a versão {VERSAO_ALGORITMO}')
+            return 0
+        checkpoint = reprocessar(args.turma, args.trabalhadores, args.lote, args.checkpoint,
+                                 args.recomecar, args.repetir_falhas, _imprimir_progresso,
+                                 args.motor)
+    print(json.dumps({k: checkpoint[k] for k in ('processadas', 'falhas', 'relatorio')},
+                     indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
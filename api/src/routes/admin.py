@@ -0,0 +1,125 @@
+"""API v2 de administração.
+
+Endpoints (prefixo /api/v2/admin), restritos aos emails listados em
+ADMIN_EMAILS (separados por vírgula):
+- GET   /admin/reprocessamento     pendentes da versão atual e checkpoint
+                                   (progresso e relatório de mudanças)
+- POST  /admin/reprocessamento     inicia o reprocessamento em lote em segundo
+                                   plano (ver src/reprocessamento.py); relê com
+                                   o pipeline local salvo "motor": "ia" explícito
+
+Para volumes grandes prefira o comando `python -m src.reprocessamento`: o
+endpoint roda numa thread do worker que recebeu a requisição.
+"""
+
+import logging
+import os
+import threading
+from functools import wraps
+
+from flask import Blueprint, current_app, jsonify, request
+
+from src import reprocessamento
+from src.models.correcao import VERSAO_ALGORITMO
+from src.routes.auth import requer_login
+from src.routes.correcao import MOTOR_LOCAL, MOTORES_LEITURA, _erro
+
+logger = logging.getLogger('api.admin')
+
+admin_bp = Blueprint('admin', __name__)
+
+_execucao = None            # thread do reprocessamento em andamento neste processo
+_lock_execucao = threading.Lock()
+
+
+def _emails_admin() -> set:
+    return {e.strip().lower() for e in os.environ.get('ADMIN_EMAILS', '').split(',')
+            if e.strip()}
+
+
+def requer_admin(f):
+    """Decorator: além do login, exige email listado em ADMIN_EMAILS."""
+    @requer_login
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        if (request.usuario_atual.email or '').lower() not in _emails_admin():
+            return _erro('Acesso restrito a administradores.', 'SEM_PERMISSAO', 403)
+        return f(*args, **kwargs)
+    return wrapper
+
+
+def _inteiro(valor) -> bool:
+    return isinstance(valor, int) and not isinstance(valor, bool)
+
+
+def _em_andamento() -> bool:
+    return _execucao is not None and _execucao.is_alive()
+
+
+@admin_bp.route('/admin/reprocessamento', methods=['GET'])
+@requer_admin
+def status_reprocessamento():
+    turma = request.args.get('turma') or None
+    return jsonify({
+        'versao_algoritmo': VERSAO_ALGORITMO,
+        'pendentes': reprocessamento.consulta_pendentes(turma).count(),
+        'em_andamento': _em_andamento(),
+        'checkpoint': reprocessamento.carregar_checkpoint(
+            reprocessamento.caminho_checkpoint_padrao()),
+    })
+
+
+@admin_bp.route('/admin/reprocessamento', methods=['POST'])
+@requer_admin
+def iniciar_reprocessamento():
+    """Corpo opcional: {turma, trabalhadores, lote, recomecar, repetir_falhas, motor}.
+
+    `trabalhadores` vai de 0 a `reprocessamento.limite_trabalhadores()` (nº de
+    CPUs); `recomecar` e `repetir_falhas` só aceitam true/false. A releitura é
+    local; "motor": "ia" precisa vir explícito (uma imagem por vez à OpenAI).
+    """
+    global _execucao
+    data = request.get_json(silent=True) or {}
+    trabalhadores = data.get('trabalhadores')
+    lote = data.get('lote', reprocessamento.TAMANHO_LOTE_PADRAO)
+    limite = reprocessamento.limite_trabalhadores()
+    if (trabalhadores is not None and (not _inteiro(trabalhadores)
+                                       or not 0 <= trabalhadores <= limite)):
+        return _erro(f'"trabalhadores" deve ser um inteiro de 0 a {limite}.',
+                     'DADOS_INVALIDOS', 400)
+    if not _inteiro(lote) or lote < 1:
+        return _erro('"lote" deve ser um inteiro positivo.', 'DADOS_INVALIDOS', 400)
+    # bool("false") seria True: descartaria o checkpoint e recomeçaria tudo
+    recomecar = data.get('recomecar', False)
+    repetir_falhas = data.get('repetir_falhas', False)
+    if not isinstance(recomecar, bool) or not isinstance(repetir_falhas, bool):
+        return _erro('"recomecar" e "repetir_falhas" devem ser true ou false.',
+                     'DADOS_INVALIDOS', 400)
+    motor = data.get('motor', MOTOR_LOCAL)
+    if motor not in MOTORES_LEITURA:
+        return _erro(f'"motor" deve ser um de: {", ".join(MOTORES_LEITURA)}.',
+                     'DADOS_INVALIDOS', 400)
+    turma = data.get('turma') or None
+
+    with _lock_execucao:
+        if _em_andamento():
+            return _erro('Já existe um reprocessamento em andamento.',
+                         'REPROCESSAMENTO_EM_ANDAMENTO', 409)
+        pendentes = reprocessamento.consulta_pendentes(turma).count()
+        app = current_app._get_current_object()
+
+        def executar():
+            with app.app_context():
+                try:
+                    reprocessamento.reprocessar(
+                        turma, trabalhadores, lote, recomecar=recomecar,
+                        repetir_falhas=repetir_falhas, motor=motor)
+                except Exception:
+                    logger.exception('Reprocessamento em lote falhou')
+
+        _execucao = threading.Thread(target=executar, name='reprocessamento', daemon=True)
+        _execucao.start()
+    logger.info('Reprocessamento iniciado por %s (%d pendentes, motor %s)',
+                request.usuario_atual.email, pendentes, motor)
+    return jsonify({'versao_algoritmo': VERSAO_ALGORITMO, 'pendentes': pendentes,
+                    'motor': motor, 'em_andamento': True}), 202
@@ -2,18 +2,86 @@
 
 Usa tokens assinados com itsdangerous (já presente nas dependências do Flask),
 com expiração de 12 horas.
+
+Tokens já verificados ficam num cache em processo (token → dados do usuário)
+por TOKEN_CACHE_TTL segundos (padrão 60; 0 desliga): a sequência de PATCHes
+da revisão de uma folha não refaz o HMAC nem consulta o banco a cada chamada.
+Alterar ou excluir o usuário pelo ORM invalida as entradas dele neste
+processo; nos demais workers elas expiram pelo TTL.
 """
 
+import os
+import threading
+import time
+from collections import OrderedDict
 from functools import wraps
+from typing import NamedTuple, Optional
 
 from flask import Blueprint, current_app, jsonify, request
 from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+from sqlalchemy import event
 
 from src.models.user import User, db
 
 auth_bp = Blueprint('auth', __name__)
 
 TOKEN_VALIDADE_SEGUNDOS = 12 * 3600
+TOKEN_CACHE_TTL_SEGUNDOS = float(os.environ.get('TOKEN_CACHE_TTL', 60))
+MAX_TOKENS_EM_CACHE = 1024
+
+
+class UsuarioAutenticado(NamedTuple):
+    """Dados do usuário disponíveis em `request.usuario_atual`."""
+    id: int
+    username: str
+    email: str
+
+
+_tokens: 'OrderedDict[str, tuple]' = OrderedDict()   # token -> (expira_em, usuario)
+_lock_tokens = threading.Lock()
+
+
+def _token_em_cache(token: str) -> Optional[UsuarioAutenticado]:
+    with _lock_tokens:
+        entrada = _tokens.get(token)
+        if entrada is None:
+            return None
+        if entrada[0] <= time.monotonic():
+            del _tokens[token]
+            return None
+        _tokens.move_to_end(token)
+        return entrada[1]
+
+
+def _guardar_token(token: str, usuario: UsuarioAutenticado, emitido_em: float):
+    if TOKEN_CACHE_TTL_SEGUNDOS <= 0:
+        return
+    # Nunca além da validade do próprio token
+    restante = emitido_em + TOKEN_VALIDADE_SEGUNDOS - time.time()
+    expira_em = time.monotonic() + min(TOKEN_CACHE_TTL_SEGUNDOS, restante)
+    with _lock_tokens:
+        _tokens[token] = (expira_em, usuario)
+        _tokens.move_to_end(token)
+        while len(_tokens) > MAX_TOKENS_EM_CACHE:
+            _tokens.popitem(last=False)
+
+
+def invalidar_tokens_do_usuario(user_id: int):
+    with _lock_tokens:
+        for token in [t for t, (_, u) in _tokens.items() if u.id == user_id]:
+            del _tokens[token]
+
+
+def limpar_cache_tokens():
+    with _lock_tokens:
+        _tokens.clear()
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _usuario_alterado(mapper, connection, alvo):
+    # Troca de senha/email ou exclusão: o token não pode continuar valendo
+    invalidar_tokens_do_usuario(alvo.id)
 
 
 def _serializer():
@@ -32,18 +100,25 @@ def requer_login(f):
         if not header.startswith('Bearer '):
             return jsonify({'erro': 'Token de autenticação ausente.',
                             'codigo': 'NAO_AUTENTICADO'}), 401
-        try:
-            dados = _serializer().loads(header[7:], max_age=TOKEN_VALIDADE_SEGUNDOS)
-        except SignatureExpired:
-            return jsonify({'erro': 'Sessão expirada. Faça login novamente.',
-                            'codigo': 'TOKEN_EXPIRADO'}), 401
-        except BadSignature:
-            return jsonify({'erro': 'Token inválido.', 'codigo': 'TOKEN_INVALIDO'}), 401
-
-        user = db.session.get(User, dados.get('id'))
-        if user is None:
-            return jsonify({'erro': 'Usuário não encontrado.', 'codigo': 'TOKEN_INVALIDO'}), 401
-        request.usuario_atual = user
+        token = header[7:]
+        usuario = _token_em_cache(token)
+        if usuario is None:
+            try:
+                dados, emitido_em = _serializer().loads(
+                    token, max_age=TOKEN_VALIDADE_SEGUNDOS, return_timestamp=True)
+            except SignatureExpired:
+                return jsonify({'erro': 'Sessão expirada. Faça login novamente.',
+                                'codigo': 'TOKEN_EXPIRADO'}), 401
+            except BadSignature:
+                return jsonify({'erro': 'Token inválido.', 'codigo': 'TOKEN_INVALIDO'}), 401
+
+            user = db.session.get(User, dados.get('id'))
+            if user is None:
+                return jsonify({'erro': 'Usuário não encontrado.',
+                                'codigo': 'TOKEN_INVALIDO'}), 401
+            usuario = UsuarioAutenticado(user.id, user.username, user.email)
+            _guardar_token(token, usuario, emitido_em.timestamp())
+        request.usuario_atual = usuario
         return f(*args, **kwargs)
     return wrapper
 
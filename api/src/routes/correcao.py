@@ -5,33 +5,49 @@ e exportação de notas da turma.
 
 Endpoints (prefixo /api/v2):
 - POST   /correcoes                      processa e salva uma correção
+                                         (gabarito_oficial ou gabarito_id)
 - GET    /correcoes?turma=X              histórico (resumo)
 - GET    /correcoes/<id>                 correção completa
+- GET    /correcoes/<id>/debug.png       sobreposição de depuração (sob demanda, com ETag)
 - PATCH  /correcoes/<id>/questoes/<n>    revisão manual de uma questão
+- PATCH  /correcoes/<id>/questoes        várias revisões de uma vez (+ confirmar)
 - POST   /correcoes/<id>/confirmar       confirma a nota (bloqueado se houver pendência)
 - POST   /correcoes/<id>/reprocessar     reexecuta o pipeline na imagem original
 - GET    /correcoes/export?turma=X       exporta notas da turma em CSV
+
+Correção devolvida (POST /correcoes, GET /correcoes/<id>, reprocessar) aceita
+projeções para clientes móveis: ?compacto=1 troca o resultado completo pelas
+respostas numa string e a lista de pendentes; ?campos=a,b,resultado.resumo
+escolhe os campos (também na listagem, só campos de primeiro nível). JSON
+grande vai comprimido e GETs têm ETag (ver src/compressao.py).
 """
 
 import base64
 import csv
+import glob
+import hashlib
 import io
 import json
 import logging
 import os
 import uuid
 from datetime import datetime, timezone
+from typing import Optional
 
-import cv2
-import numpy as np
 from flask import Blueprint, Response, jsonify, request
 
-from src.ai_omr import resultado_por_ia
-from src.models.correcao import Correcao
+from src.cache_leituras import CacheLeituras, chave_leitura, hash_imagem
+from src.models.correcao import VERSAO_ALGORITMO, Correcao
+from src.models.gabarito import carregar_gabarito
 from src.models.user import db
 from src.omr import LayoutProva
-from src.omr.classifier import STATUS_OK, STATUS_EM_BRANCO
-from src.omr.pipeline import STATUS_APROVADA, STATUS_REVISAO, STATUS_REJEITADA
+from src.omr.classifier import (
+    STATUS_OK, STATUS_EM_BRANCO, LimiaresInvalidos, limiares_configurados,
+)
+from src.omr.pontuacao import (
+    STATUS_APROVADA, STATUS_REJEITADA, STATUS_REVISAO, aplicar_gabarito,
+    resumo_com_revisoes, validar_gabarito,
+)
 from src.routes.auth import requer_login
 
 logger = logging.getLogger('api.correcao')
@@ -41,77 +57,141 @@ correcao_bp = Blueprint('correcao', __name__)
 STORAGE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'storage')
 STATUS_CONFIRMADA = 'CONFIRMADA'
 
+# Motor de leitura do cartão (variável de ambiente MOTOR_LEITURA)
+MOTOR_IA = 'ia'          # IA visual (ai_omr), padrão em produção
+MOTOR_LOCAL = 'local'    # pipeline OpenCV local (omr.CorrecaoPipeline)
+MOTORES_LEITURA = (MOTOR_IA, MOTOR_LOCAL)
+
+
+class ImagemInvalida(ValueError):
+    """Bytes recebidos não formam uma imagem decodificável."""
+
 
 def _erro(mensagem: str, codigo: str, http: int):
     return jsonify({'erro': mensagem, 'codigo': codigo}), http
 
 
-def _decodificar_imagem(imagem_b64: str):
-    """Decodifica imagem base64 (com ou sem prefixo data:) em ndarray BGR."""
+def _bytes_imagem(imagem_b64: str) -> bytes:
+    """Extrai os bytes da imagem base64 (com ou sem prefixo data:)."""
     if ',' in imagem_b64 and imagem_b64.strip().startswith('data:'):
         imagem_b64 = imagem_b64.split(',', 1)[1]
-    image_bytes = base64.b64decode(imagem_b64)
-    nparr = np.frombuffer(image_bytes, np.uint8)
-    return cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    return base64.b64decode(imagem_b64)
+
 
+def _decodificar_imagem(dados: bytes):
+    """Decodifica os bytes da imagem em ndarray BGR (None se não suportado)."""
+    import cv2  # sob demanda: o worker sobe sem OpenCV (ver src/aquecimento.py)
+    import numpy as np
+    return cv2.imdecode(np.frombuffer(dados, np.uint8), cv2.IMREAD_COLOR)
 
-def _salvar_imagem(image, sufixo: str) -> str:
+
+def _salvar_original(dados: bytes) -> str:
+    """Guarda os bytes enviados sem recodificar (sem perda e sem custo de codec).
+
+    Os mesmos bytes voltam a gerar o mesmo hash no reprocessamento, o que
+    permite reaproveitar a leitura em cache.
+    """
     os.makedirs(STORAGE_DIR, exist_ok=True)
-    nome = f'{uuid.uuid4().hex}_{sufixo}.jpg'
-    caminho = os.path.join(STORAGE_DIR, nome)
-    cv2.imwrite(caminho, image)
+    extensao = 'png' if dados.startswith(b'\x89PNG') else 'jpg'
+    caminho = os.path.join(STORAGE_DIR, f'{uuid.uuid4().hex}_original.{extensao}')
+    with open(caminho, 'wb') as f:
+        f.write(dados)
     return caminho
 
 
-def _validar_gabarito(gabarito, alternativas):
-    if not isinstance(gabarito, dict) or not gabarito:
-        return 'Gabarito oficial é obrigatório e não pode estar vazio.'
-    for chave, valor in gabarito.items():
-        if not str(chave).isdigit():
-            return f"Chave de questão inválida no gabarito: '{chave}'."
-        if valor not in alternativas:
-            return (f"Questão {chave}: resposta '{valor}' inválida. "
-                    f"Use: {', '.join(alternativas)}.")
-    return None
+def _motor_leitura() -> str:
+    return os.environ.get('MOTOR_LEITURA', MOTOR_IA)
+
+
+def validar_motor_leitura():
+    """MOTOR_LEITURA desconhecido cairia calado na IA: o app verifica no boot."""
+    if _motor_leitura() not in MOTORES_LEITURA:
+        raise ValueError(f"MOTOR_LEITURA='{_motor_leitura()}' desconhecido. "
+                         f"Use: {', '.join(MOTORES_LEITURA)}.")
+
+
+def _cache_leituras() -> CacheLeituras:
+    return CacheLeituras(os.environ.get('CACHE_LEITURAS_DIR') or
+                         os.path.join(STORAGE_DIR, 'cache_leituras'))
+
+
+def _ler_cartao(dados: bytes, gabarito: dict, layout: LayoutProva,
+                motor: Optional[str] = None) -> dict:
+    """Leitura do cartão (sem pontuação), reaproveitando o cache. `motor`
+    substitui MOTOR_LEITURA (o reprocessamento em lote lê localmente).
+
+    A imagem só é decodificada e lida quando esta mesma foto ainda não foi lida
+    com o mesmo layout, motor, versão do algoritmo e limiares (LIMIARES_ARQUIVO)
+    — e, na IA, com o mesmo gabarito.
+    """
+    motor = motor or _motor_leitura()
+    cache = _cache_leituras()
+    versao = VERSAO_ALGORITMO
+    if motor == MOTOR_LOCAL:
+        limiares = limiares_configurados()
+        if limiares.origem != 'padrao':
+            versao = f'{VERSAO_ALGORITMO}+{limiares.origem}'
+    # A IA lê com o gabarito no prompt: outro gabarito, outra leitura
+    chave = chave_leitura(hash_imagem(dados), layout.to_dict(), motor, versao,
+                          gabarito if motor == MOTOR_IA else None)
+    leitura = cache.obter(chave)
+    if leitura is not None:
+        logger.info('Leitura reaproveitada do cache (%s)', chave[:12])
+        return leitura
+
+    if motor == MOTOR_LOCAL:
+        leitura = _ler_local(dados, layout)
+    else:
+        image = _decodificar_imagem(dados)
+        if image is None:
+            raise ImagemInvalida('Formato de imagem não suportado.')
+        from src.ai_omr import leitura_por_ia
+        leitura = leitura_por_ia(image, gabarito, layout)
+    cache.guardar(chave, leitura)
+    return leitura
+
+
+def _ler_local(dados: bytes, layout: LayoutProva) -> dict:
+    """Leitura pelo pipeline local; com CACHE_FOLHAS=1 a folha pré-processada
+    fica guardada em disco e releituras da mesma foto partem dela."""
+    from src.cache_folhas import CacheFolhas, cache_folhas_ativo, chave_folha
+    from src.omr.pipeline import CorrecaoPipeline
+
+    cache = None
+    if cache_folhas_ativo():
+        cache = CacheFolhas(os.environ.get('CACHE_FOLHAS_DIR') or
+                            os.path.join(STORAGE_DIR, 'cache_folhas'))
+        chave = chave_folha(hash_imagem(dados), layout.iluminacao, layout.marcadores)
+        folha = cache.obter(chave)
+        if folha is not None:
+            logger.info('Folha pré-processada reaproveitada do cache (%s)', chave[:12])
+            return CorrecaoPipeline().ler_folha(folha, layout)
+
+    image = _decodificar_imagem(dados)
+    if image is None:
+        raise ImagemInvalida('Formato de imagem não suportado.')
+    pipeline = CorrecaoPipeline(manter_folha=cache is not None)
+    leitura = pipeline.ler(image, layout)
+    if cache is not None and pipeline.folha is not None:
+        cache.guardar(chave, pipeline.folha)
+    return leitura
 
 
-def _recalcular_resumo(resultado: dict, revisoes: dict) -> dict:
-    """Recalcula acertos/nota aplicando as revisões manuais por cima da leitura."""
-    gabarito = resultado.get('gabarito_usado', {})
-    total = resultado['resumo']['total_questoes']
-    acertos = erros = em_branco = pendentes = 0
-
-    for q in resultado['questoes']:
-        numero = str(q['numero'])
-        if numero in revisoes:
-            resposta = revisoes[numero]['alternativa']  # None = em branco confirmado
-            if resposta is None:
-                em_branco += 1
-                erros += 1
-            elif resposta == gabarito.get(numero):
-                acertos += 1
-            else:
-                erros += 1
-        elif q['precisa_revisao']:
-            pendentes += 1
-        elif q['status'] == STATUS_EM_BRANCO:
-            em_branco += 1
-            erros += 1
-        else:
-            acertos += int(bool(q['acertou']))
-            erros += int(not q['acertou'])
-
-    nota = round(acertos / total * 10, 2) if total else 0.0
-    return {
-        'total_questoes': total,
-        'acertos': acertos,
-        'erros': erros,
-        'em_branco': em_branco,
-        'pendentes_revisao': pendentes,
-        'nota_provisoria': nota,
-        'nota_maxima_possivel': round((acertos + pendentes) / total * 10, 2) if total else 0.0,
-        'nota_confirmada': nota if pendentes == 0 else None,
-    }
+def _erro_leitura(exc: Exception):
+    if isinstance(exc, LimiaresInvalidos):
+        logger.error('Configuração inválida: %s', exc)
+        return _erro(str(exc), 'CONFIGURACAO_INVALIDA', 500)
+    if _motor_leitura() == MOTOR_LOCAL:
+        logger.exception('Falha na leitura local')
+        return _erro(f'Falha ao processar a imagem: {exc}', 'ERRO_PROCESSAMENTO', 500)
+    logger.exception('Falha na leitura por IA')
+    return _erro(f'Nao foi possivel corrigir com IA: {exc}', 'IA_CORRECAO_FALHOU', 503)
+
+
+def _assinatura_leitura(resultado: dict) -> list:
+    """O que uma revisão manual pressupõe da leitura de cada questão."""
+    return [(q['numero'], q['status'], q.get('alternativa_detectada'))
+            for q in resultado.get('questoes', [])]
 
 
 @correcao_bp.route('/correcoes', methods=['POST'])
@@ -120,63 +200,115 @@ def criar_correcao():
     data = request.get_json(silent=True)
     if not data:
         return _erro('Corpo JSON ausente ou inválido.', 'PAYLOAD_INVALIDO', 400)
+    erro = _erro_campos(_campos_pedidos())   # antes de gravar: projeção inválida não cria nada
+    if erro is not None:
+        return erro
     if 'imagem' not in data:
         return _erro('Campo "imagem" (base64) é obrigatório.', 'IMAGEM_AUSENTE', 400)
 
-    layout = LayoutProva.from_dict(data.get('layout'))
-    gabarito = data.get('gabarito_oficial') or {}
-    erro_gabarito = _validar_gabarito(gabarito, layout.alternativas)
-    if erro_gabarito:
-        return _erro(erro_gabarito, 'GABARITO_INVALIDO', 400)
-    layout.num_questoes = max(int(k) for k in gabarito.keys())
+    gabarito_id, gabarito, layout, turma_padrao, erro = _resolver_gabarito(data)
+    if erro is not None:
+        return erro
 
     try:
-        image = _decodificar_imagem(data['imagem'])
+        dados = _bytes_imagem(data['imagem'])
     except Exception:
         return _erro('Não foi possível decodificar a imagem base64.', 'IMAGEM_INVALIDA', 400)
-    if image is None:
-        return _erro('Formato de imagem não suportado.', 'IMAGEM_INVALIDA', 400)
 
     try:
-        resultado = resultado_por_ia(image, gabarito, layout)
+        leitura = _ler_cartao(dados, gabarito, layout)
+    except ImagemInvalida as exc:
+        return _erro(str(exc), 'IMAGEM_INVALIDA', 400)
     except Exception as exc:
-        logger.exception('Falha na leitura por IA')
-        return _erro(
-            f'Nao foi possivel corrigir com IA: {exc}',
-            'IA_CORRECAO_FALHOU',
-            503,
-        )
+        return _erro_leitura(exc)
+
+    correcao = _nova_correcao(dados, leitura, gabarito, gabarito_id, layout,
+                              turma=str(data.get('turma') or turma_padrao),
+                              aluno=str(data.get('aluno') or 'sem_nome'),
+                              professor_id=request.usuario_atual.id)
+    db.session.add(correcao)
+    db.session.commit()
+    logger.info('Correção %s criada: status=%s aluno=%s turma=%s',
+                correcao.id, correcao.status, correcao.aluno, correcao.turma)
+
+    resposta, erro = _representacao(correcao)
+    if erro is not None:
+        return erro
+    http = 200 if correcao.status != STATUS_REJEITADA else 422
+    return jsonify(resposta), http
+
+
+def _layout_da_requisicao(dados):
+    """(layout, resposta de erro 400 LAYOUT_INVALIDO) a partir do corpo."""
+    try:
+        return LayoutProva.from_dict(dados), None
+    except (TypeError, ValueError, AttributeError) as exc:
+        return None, _erro(f'Layout inválido: {exc}', 'LAYOUT_INVALIDO', 400)
+
+
+def _resolver_gabarito(data: dict):
+    """(gabarito_id, gabarito, layout, turma padrão, resposta de erro) a partir
+    de `gabarito_id` (cadastrado) ou de `gabarito_oficial` + `layout`."""
+    gabarito_id = data.get('gabarito_id')
+    if gabarito_id is not None:
+        # Gabarito cadastrado: já validado na criação e decodificado em cache
+        # bool é subclasse de int: "gabarito_id": true não pode virar o id 1
+        valido = isinstance(gabarito_id, int) and not isinstance(gabarito_id, bool)
+        carregado = carregar_gabarito(gabarito_id) if valido else None
+        if carregado is None:
+            return None, None, None, None, _erro(
+                f'Gabarito {gabarito_id} não encontrado.', 'GABARITO_INEXISTENTE', 400)
+        layout = LayoutProva.from_dict(carregado.layout)
+        gabarito = carregado.respostas
+        turma_padrao = carregado.turma
+    else:
+        layout, erro = _layout_da_requisicao(data.get('layout'))
+        if erro is not None:
+            return None, None, None, None, erro
+        gabarito = data.get('gabarito_oficial') or {}
+        erro_gabarito = validar_gabarito(gabarito, layout.alternativas)
+        if erro_gabarito:
+            return None, None, None, None, _erro(erro_gabarito, 'GABARITO_INVALIDO', 400)
+        turma_padrao = 'sem_turma'
+    layout.num_questoes = max(int(k) for k in gabarito.keys())
+    return gabarito_id, gabarito, layout, turma_padrao, None
+
+
+def _nova_correcao(dados: bytes, leitura: dict, gabarito: dict, gabarito_id,
+                   layout: LayoutProva, turma: str, aluno: str, professor_id) -> Correcao:
+    """Pontua a leitura, guarda a imagem original e monta a correção (sem
+    adicioná-la à sessão)."""
+    resultado = aplicar_gabarito(leitura, gabarito, layout.num_questoes)
+    resultado['layout'] = layout.to_dict()
 
     # Auditoria: salva imagem original sempre (permite reprocessar depois)
-    caminho_original = _salvar_imagem(image, 'original')
+    caminho_original = _salvar_original(dados)
 
     correcao = Correcao(
-        professor_id=request.usuario_atual.id,
-        turma=str(data.get('turma') or 'sem_turma'),
-        aluno=str(data.get('aluno') or 'sem_nome'),
+        professor_id=professor_id,
+        turma=turma,
+        aluno=aluno,
         status=resultado['status'],
-        gabarito_json=json.dumps(gabarito),
+        gabarito_id=gabarito_id,
+        gabarito_json='' if gabarito_id is not None else json.dumps(gabarito),
         resultado_json=json.dumps(resultado),
         nota_provisoria=(resultado['resumo'] or {}).get('nota_provisoria'),
         nota_final=None,
         imagem_original_path=caminho_original,
+        versao_algoritmo=VERSAO_ALGORITMO,
     )
-    # Nota só é final automaticamente quando não há nenhuma pendência
+    _confirmar_se_aprovada(correcao, resultado)
+    return correcao
+
+
+def _confirmar_se_aprovada(correcao: Correcao, resultado: dict):
+    """Nota só é final automaticamente quando não há nenhuma pendência."""
     if resultado['status'] == STATUS_APROVADA:
         correcao.nota_final = resultado['resumo']['nota_confirmada']
         correcao.status = STATUS_CONFIRMADA
         correcao.confirmada_em = datetime.now(timezone.utc)
         correcao.confirmada_por = 'sistema (correção automática íntegra)'
 
-    db.session.add(correcao)
-    db.session.commit()
-    logger.info('Correção %s criada: status=%s aluno=%s turma=%s',
-                correcao.id, correcao.status, correcao.aluno, correcao.turma)
-
-    resposta = correcao.to_dict(incluir_resultado=True)
-    http = 200 if resultado['status'] != STATUS_REJEITADA else 422
-    return jsonify(resposta), http
-
 
 @correcao_bp.route('/correcoes', methods=['GET'])
 @requer_login
@@ -189,7 +321,14 @@ def listar_correcoes():
     if status:
         consulta = consulta.filter_by(status=status)
     correcoes = consulta.order_by(Correcao.criada_em.desc()).limit(500).all()
-    return jsonify({'correcoes': [c.to_dict() for c in correcoes]})
+    campos = _campos_pedidos()
+    itens = [c.to_dict() for c in correcoes]
+    if campos:
+        invalidos = [c for c in campos if c not in Correcao().to_dict()]
+        if invalidos:
+            return _erro(f'Campos desconhecidos: {", ".join(invalidos)}.', 'CAMPO_INVALIDO', 400)
+        itens = [{c: item[c] for c in campos} for item in itens]
+    return jsonify({'correcoes': itens})
 
 
 @correcao_bp.route('/correcoes/<int:correcao_id>', methods=['GET'])
@@ -198,7 +337,200 @@ def obter_correcao(correcao_id):
     correcao = db.session.get(Correcao, correcao_id)
     if correcao is None:
         return _erro('Correção não encontrada.', 'NAO_ENCONTRADA', 404)
-    return jsonify(correcao.to_dict(incluir_resultado=True))
+    resposta, erro = _representacao(correcao)
+    return erro if erro is not None else jsonify(resposta)
+
+
+def _campos_pedidos() -> list:
+    return [c.strip() for c in (request.args.get('campos') or '').split(',') if c.strip()]
+
+
+def _respostas_compactas(resultado: dict, revisoes: dict) -> dict:
+    """Uma letra por questão na ordem dos números ('-' em branco, '?' sem
+    leitura válida), já com as revisões do professor, e os números das
+    questões ainda pendentes de revisão."""
+    letras, pendentes = [], []
+    for q in resultado.get('questoes', []):
+        revisao = revisoes.get(str(q['numero']))
+        if revisao is not None:
+            letras.append(revisao['alternativa'] or '-')
+            continue
+        if q.get('precisa_revisao'):
+            pendentes.append(q['numero'])
+        if q.get('alternativa_detectada'):
+            letras.append(q['alternativa_detectada'])
+        else:
+            letras.append('-' if q.get('status') == STATUS_EM_BRANCO else '?')
+    return {'respostas': ''.join(letras), 'pendentes': pendentes}
+
+
+# Campos que ?campos= aceita além dos de Correcao.to_dict(incluir_resultado=True)
+CAMPOS_COMPACTOS = ('respostas', 'pendentes', 'resumo')
+CAMPOS_RESULTADO = ('status', 'qualidade', 'folha', 'deteccao', 'geometria', 'questoes',
+                    'diagnostico', 'resumo', 'gabarito_usado', 'layout')
+
+
+def _campos_invalidos(campos: list) -> list:
+    validos = set(Correcao().to_dict(incluir_resultado=True)) | set(CAMPOS_COMPACTOS)
+    return [c for c in campos if c not in validos
+            and not (c.startswith('resultado.') and c[10:] in CAMPOS_RESULTADO)]
+
+
+def _erro_campos(campos: list):
+    invalidos = _campos_invalidos(campos)
+    if invalidos:
+        return _erro(f'Campos desconhecidos: {", ".join(invalidos)}.', 'CAMPO_INVALIDO', 400)
+    return None
+
+
+def _representacao(correcao: Correcao):
+    """(dict, resposta de erro) da correção conforme ?compacto= e ?campos=."""
+    campos = _campos_pedidos()
+    compacto = request.args.get('compacto') in ('1', 'true')
+    if not campos and not compacto:
+        return correcao.to_dict(incluir_resultado=True), None
+    erro = _erro_campos(campos)
+    if erro is not None:
+        return None, erro
+
+    d = correcao.to_dict()
+    resultado = correcao.resultado
+    d.update(_respostas_compactas(resultado, correcao.revisoes))
+    d['resumo'] = resultado.get('resumo')
+    if not campos:
+        return d, None
+
+    projetado = {}
+    for campo in campos:
+        if campo.startswith('resultado.'):
+            projetado.setdefault('resultado', {})[campo[10:]] = resultado.get(campo[10:])
+        elif campo in d:
+            projetado[campo] = d[campo]
+        elif campo == 'resultado':
+            projetado[campo] = resultado
+        else:   # 'gabarito'
+            projetado[campo] = correcao.gabarito
+    return projetado, None
+
+
+def _etag_debug(correcao: Correcao) -> str:
+    """Muda quando a leitura, as revisões ou o estilo do desenho mudam."""
+    from src.omr.overlay import VERSAO_OVERLAY
+    bruto = '|'.join([VERSAO_OVERLAY, correcao.resultado_json or '',
+                      correcao.revisoes_json or ''])
+    return hashlib.sha256(bruto.encode('utf-8')).hexdigest()[:20]
+
+
+@correcao_bp.route('/correcoes/<int:correcao_id>/debug.png', methods=['GET'])
+@requer_login
+def debug_correcao(correcao_id):
+    """Sobreposição com bolhas, preenchimentos e status, desenhada a partir da
+    geometria gravada (sem detectar de novo). Só é renderizada quando alguém a
+    abre; a primeira renderização fica em disco e é servida com ETag."""
+    correcao = db.session.get(Correcao, correcao_id)
+    if correcao is None:
+        return _erro('Correção não encontrada.', 'NAO_ENCONTRADA', 404)
+
+    etag = _etag_debug(correcao)
+    if etag in request.if_none_match:
+        resposta = Response(status=304)
+        resposta.set_etag(etag)
+        return resposta
+
+    diretorio = os.path.join(STORAGE_DIR, 'debug')
+    caminho = os.path.join(diretorio, f'{correcao_id}-{etag}.png')
+    try:
+        with open(caminho, 'rb') as f:
+            png = f.read()
+    except FileNotFoundError:
+        from src.omr.overlay import renderizar_png
+        original = None
+        if correcao.imagem_original_path and os.path.exists(correcao.imagem_original_path):
+            with open(correcao.imagem_original_path, 'rb') as f:
+                original = _decodificar_imagem(f.read())
+        try:
+            png = renderizar_png(original, correcao.resultado, correcao.revisoes)
+        except Exception as exc:
+            logger.exception('Falha ao desenhar a depuração da correção %s', correcao_id)
+            return _erro(f'Falha ao gerar a imagem de depuração: {exc}',
+                         'ERRO_PROCESSAMENTO', 500)
+        # Versões anteriores desta correção não serão mais pedidas
+        for antigo in glob.glob(os.path.join(diretorio, f'{correcao_id}-*.png')):
+            try:
+                os.remove(antigo)
+            except OSError:
+                pass
+        os.makedirs(diretorio, exist_ok=True)
+        temporario = f'{caminho}.{uuid.uuid4().hex}.tmp'
+        with open(temporario, 'wb') as f:
+            f.write(png)
+        os.replace(temporario, caminho)
+
+    resposta = Response(png, mimetype='image/png')
+    resposta.set_etag(etag)
+    resposta.headers['Cache-Control'] = 'private, no-cache'
+    return resposta
+
+
+def _alternativas_validas(resultado: dict) -> list:
+    return sorted({a for q in resultado.get('questoes', [])
+                   for a in (q.get('preenchimentos') or {})}) or ['A', 'B', 'C', 'D', 'E']
+
+
+def _erro_revisao(resultado: dict, numero: int, alternativa, alternativas_validas: list):
+    """Mensagem e código do problema da revisão, ou None se ela é válida."""
+    if numero not in {q['numero'] for q in resultado.get('questoes', [])}:
+        return f'Questão {numero} não existe nesta correção.', 'QUESTAO_INVALIDA'
+    if alternativa is not None and alternativa not in alternativas_validas:
+        return f"Alternativa '{alternativa}' inválida.", 'ALTERNATIVA_INVALIDA'
+    return None
+
+
+def _aplicar_revisoes(correcao: Correcao, resultado: dict, decisoes: dict,
+                      origem: Optional[str] = None) -> tuple:
+    """Grava as decisões {numero: alternativa} e recalcula o resumo UMA vez
+    (sem commit). Devolve (revisões gravadas, resumo). `origem` marca na
+    auditoria decisões que não foram tomadas questão a questão ('grupo')."""
+    revisoes = correcao.revisoes
+    agora = datetime.now(timezone.utc).isoformat()
+    for numero, alternativa in decisoes.items():
+        revisoes[str(numero)] = {
+            'alternativa': alternativa,
+            'revisado_por': request.usuario_atual.email,
+            'revisado_em': agora,
+        }
+        if origem:
+            revisoes[str(numero)]['origem'] = origem
+    correcao.revisoes_json = json.dumps(revisoes)
+
+    resumo = resumo_com_revisoes(resultado, revisoes)
+    resultado['resumo'] = resumo
+    correcao.resultado_json = json.dumps(resultado)
+    correcao.nota_provisoria = resumo['nota_provisoria']
+    return revisoes, resumo
+
+
+def _erro_confirmacao(correcao: Correcao, resumo: dict):
+    if correcao.status == STATUS_REJEITADA:
+        return _erro('Correção rejeitada por qualidade de imagem; refaça a captura.',
+                     'REJEITADA_QUALIDADE', 409)
+    if resumo['pendentes_revisao'] > 0:
+        return _erro(
+            f"Há {resumo['pendentes_revisao']} questão(ões) pendente(s) de revisão "
+            'manual. Revise todas antes de confirmar a nota.',
+            'PENDENCIAS_DE_REVISAO', 409,
+        )
+    return None
+
+
+def _confirmar(correcao: Correcao, resultado: dict, resumo: dict):
+    """Fecha a nota (sem commit); o resumo já deve estar sem pendências."""
+    correcao.nota_final = resumo['nota_confirmada']
+    correcao.status = STATUS_CONFIRMADA
+    correcao.confirmada_em = datetime.now(timezone.utc)
+    correcao.confirmada_por = request.usuario_atual.email
+    resultado['resumo'] = resumo
+    correcao.resultado_json = json.dumps(resultado)
 
 
 @correcao_bp.route('/correcoes/<int:correcao_id>/questoes/<int:numero>', methods=['PATCH'])
@@ -219,31 +551,78 @@ def revisar_questao(correcao_id, numero):
     alternativa = data['alternativa']
 
     resultado = correcao.resultado
-    numeros_validos = {q['numero'] for q in resultado.get('questoes', [])}
-    if numero not in numeros_validos:
-        return _erro(f'Questão {numero} não existe nesta correção.', 'QUESTAO_INVALIDA', 400)
+    problema = _erro_revisao(resultado, numero, alternativa, _alternativas_validas(resultado))
+    if problema:
+        return _erro(*problema, 400)
 
-    alternativas_validas = sorted({a for q in resultado['questoes']
-                                   for a in (q.get('preenchimentos') or {})}) or \
-                           ['A', 'B', 'C', 'D', 'E']
-    if alternativa is not None and alternativa not in alternativas_validas:
-        return _erro(f"Alternativa '{alternativa}' inválida.", 'ALTERNATIVA_INVALIDA', 400)
+    revisoes, resumo = _aplicar_revisoes(correcao, resultado, {numero: alternativa})
+    db.session.commit()
 
-    revisoes = correcao.revisoes
-    revisoes[str(numero)] = {
-        'alternativa': alternativa,
-        'revisado_por': request.usuario_atual.email,
-        'revisado_em': datetime.now(timezone.utc).isoformat(),
-    }
-    correcao.revisoes_json = json.dumps(revisoes)
+    return jsonify({'questao': numero, 'revisao': revisoes[str(numero)], 'resumo': resumo})
 
-    resumo = _recalcular_resumo(resultado, revisoes)
-    resultado['resumo'] = resumo
-    correcao.resultado_json = json.dumps(resultado)
-    correcao.nota_provisoria = resumo['nota_provisoria']
+
+@correcao_bp.route('/correcoes/<int:correcao_id>/questoes', methods=['PATCH'])
+@requer_login
+def revisar_questoes(correcao_id):
+    """Várias revisões de uma vez, opcionalmente confirmando a nota.
+
+    Corpo: {"questoes": {"3": "C", "7": null, ...}, "confirmar": true}. Tudo é
+    validado antes; qualquer problema (ou pendência restante com confirmar)
+    devolve erro sem aplicar nada. Um único recálculo do resumo e um commit.
+    """
+    correcao = db.session.get(Correcao, correcao_id)
+    if correcao is None:
+        return _erro('Correção não encontrada.', 'NAO_ENCONTRADA', 404)
+    if correcao.status == STATUS_CONFIRMADA:
+        return _erro('Correção já confirmada; não pode mais ser alterada.',
+                     'JA_CONFIRMADA', 409)
+
+    data = request.get_json(silent=True) or {}
+    questoes = data.get('questoes') or {}
+    confirmar = data.get('confirmar', False)
+    if not isinstance(confirmar, bool):   # bool("false") confirmaria a nota
+        return _erro('"confirmar" deve ser true ou false.', 'PAYLOAD_INVALIDO', 400)
+    if not isinstance(questoes, dict) or (not questoes and not confirmar):
+        return _erro('Informe "questoes" como {numero: alternativa} (null para em branco) '
+                     'e/ou "confirmar": true.', 'PAYLOAD_INVALIDO', 400)
+
+    resultado = correcao.resultado
+    alternativas_validas = _alternativas_validas(resultado)
+    decisoes, problemas = {}, []
+    for chave, alternativa in questoes.items():
+        try:
+            numero = int(chave)
+        except (TypeError, ValueError):
+            problemas.append({'questao': chave, 'erro': 'Número de questão inválido.',
+                              'codigo': 'QUESTAO_INVALIDA'})
+            continue
+        problema = _erro_revisao(resultado, numero, alternativa, alternativas_validas)
+        if problema:
+            problemas.append({'questao': numero, 'erro': problema[0], 'codigo': problema[1]})
+        else:
+            decisoes[numero] = alternativa
+    if problemas:
+        return jsonify({'erro': 'Revisões inválidas; nada foi aplicado.',
+                        'codigo': 'REVISOES_INVALIDAS', 'problemas': problemas}), 400
+
+    revisoes, resumo = _aplicar_revisoes(correcao, resultado, decisoes)
+    if confirmar:
+        erro = _erro_confirmacao(correcao, resumo)
+        if erro is not None:
+            db.session.rollback()
+            return erro
+        _confirmar(correcao, resultado, resumo)
     db.session.commit()
+    if confirmar:
+        logger.info('Correção %s revisada (%d questões) e confirmada por %s: nota=%.2f',
+                    correcao.id, len(decisoes), correcao.confirmada_por, correcao.nota_final)
 
-    return jsonify({'questao': numero, 'revisao': revisoes[str(numero)], 'resumo': resumo})
+    return jsonify({
+        'revisoes': {str(n): revisoes[str(n)] for n in decisoes},
+        'resumo': resumo,
+        'status': correcao.status,
+        'nota_final': correcao.nota_final,
+    })
 
 
 @correcao_bp.route('/correcoes/<int:correcao_id>/confirmar', methods=['POST'])
@@ -255,25 +634,13 @@ def confirmar_correcao(correcao_id):
         return _erro('Correção não encontrada.', 'NAO_ENCONTRADA', 404)
     if correcao.status == STATUS_CONFIRMADA:
         return _erro('Correção já confirmada.', 'JA_CONFIRMADA', 409)
-    if correcao.status == STATUS_REJEITADA:
-        return _erro('Correção rejeitada por qualidade de imagem; refaça a captura.',
-                     'REJEITADA_QUALIDADE', 409)
 
     resultado = correcao.resultado
-    resumo = _recalcular_resumo(resultado, correcao.revisoes)
-    if resumo['pendentes_revisao'] > 0:
-        return _erro(
-            f"Há {resumo['pendentes_revisao']} questão(ões) pendente(s) de revisão "
-            'manual. Revise todas antes de confirmar a nota.',
-            'PENDENCIAS_DE_REVISAO', 409,
-        )
-
-    correcao.nota_final = resumo['nota_confirmada']
-    correcao.status = STATUS_CONFIRMADA
-    correcao.confirmada_em = datetime.now(timezone.utc)
-    correcao.confirmada_por = request.usuario_atual.email
-    resultado['resumo'] = resumo
-    correcao.resultado_json = json.dumps(resultado)
+    resumo = resumo_com_revisoes(resultado, correcao.revisoes)
+    erro = _erro_confirmacao(correcao, resumo)
+    if erro is not None:
+        return erro
+    _confirmar(correcao, resultado, resumo)
     db.session.commit()
 
     logger.info('Correção %s confirmada por %s: nota=%.2f',
@@ -288,30 +655,59 @@ def reprocessar_correcao(correcao_id):
     correcao = db.session.get(Correcao, correcao_id)
     if correcao is None:
         return _erro('Correção não encontrada.', 'NAO_ENCONTRADA', 404)
+    erro = _erro_campos(_campos_pedidos())   # antes de regravar a leitura
+    if erro is not None:
+        return erro
     if correcao.status == STATUS_CONFIRMADA:
         return _erro('Correção confirmada não pode ser reprocessada.', 'JA_CONFIRMADA', 409)
     if not correcao.imagem_original_path or not os.path.exists(correcao.imagem_original_path):
         return _erro('Imagem original não está mais disponível.', 'IMAGEM_INDISPONIVEL', 410)
 
-    image = cv2.imread(correcao.imagem_original_path)
+    with open(correcao.imagem_original_path, 'rb') as f:
+        dados = f.read()
     gabarito = correcao.gabarito
-    layout = LayoutProva(num_questoes=max(int(k) for k in gabarito.keys()))
+    layout = _layout_gravado(correcao, gabarito)
     try:
-        resultado = resultado_por_ia(image, gabarito, layout)
+        leitura = _ler_cartao(dados, gabarito, layout)
+    except ImagemInvalida as exc:
+        return _erro(str(exc), 'IMAGEM_INDISPONIVEL', 410)
     except Exception as exc:
-        logger.exception('Falha ao reprocessar por IA')
-        return _erro(
-            f'Nao foi possivel reprocessar com IA: {exc}',
-            'IA_CORRECAO_FALHOU',
-            503,
-        )
+        return _erro_leitura(exc)
+    _aplicar_releitura(correcao, leitura, gabarito, layout)
+    db.session.commit()
+    resposta, erro = _representacao(correcao)
+    return erro if erro is not None else jsonify(resposta)
+
+
+def _layout_gravado(correcao: Correcao, gabarito: dict) -> LayoutProva:
+    """Layout com que a correção foi lida (correções antigas: só o nº de questões)."""
+    anterior = correcao.resultado
+    if anterior.get('layout'):
+        return LayoutProva.from_dict(anterior['layout'])
+    return LayoutProva(num_questoes=max(int(k) for k in gabarito.keys()))
+
+
+def _aplicar_releitura(correcao: Correcao, leitura: dict, gabarito: dict,
+                       layout: LayoutProva) -> dict:
+    """Pontua a nova leitura e a grava na correção (sem commit).
+
+    As revisões do professor só sobrevivem se a leitura não mudou."""
+    anterior = correcao.resultado
+    resultado = aplicar_gabarito(leitura, gabarito, layout.num_questoes)
+    resultado['layout'] = layout.to_dict()
+
+    revisoes = correcao.revisoes
+    if revisoes and _assinatura_leitura(resultado) == _assinatura_leitura(anterior):
+        # Mesma leitura (ex.: veio do cache): as revisões continuam valendo
+        resultado['resumo'] = resumo_com_revisoes(resultado, revisoes)
+    else:
+        correcao.revisoes_json = None  # leitura mudou; revisões antigas não valem mais
 
     correcao.resultado_json = json.dumps(resultado)
-    correcao.revisoes_json = None  # leitura mudou; revisões antigas não valem mais
     correcao.status = resultado['status']
     correcao.nota_provisoria = (resultado['resumo'] or {}).get('nota_provisoria')
-    db.session.commit()
-    return jsonify(correcao.to_dict(incluir_resultado=True))
+    correcao.versao_algoritmo = VERSAO_ALGORITMO
+    return resultado
 
 
 @correcao_bp.route('/correcoes/export', methods=['GET'])
@@ -1,16 +1,121 @@
 from flask import Blueprint, request, jsonify
 from flask_cors import cross_origin
 import base64
-import cv2
-import numpy as np
 import os
-import tempfile
 from datetime import datetime
 
-from ..vision_processor import VisionProcessorSimplesFuncional
+# cv2, numpy e o processador legado são importados só quando a rota v1 é
+# chamada: a maioria dos workers nunca atende a v1.
 
 gabarito_bp = Blueprint('gabarito', __name__)
 
+# Motor da v1 (variável de ambiente GABARITO_V1_MOTOR):
+# 'legado'   → VisionProcessorSimplesFuncional (grade fixa, padrão)
+# 'pipeline' → omr.CorrecaoPipeline com a resposta adaptada ao formato v1
+MOTOR_V1_LEGADO = 'legado'
+MOTOR_V1_PIPELINE = 'pipeline'
+
+
+def _motor_v1():
+    return os.environ.get('GABARITO_V1_MOTOR', MOTOR_V1_LEGADO)
+
+
+def _decodificar_imagem(data):
+    """
+    Decodifica a imagem base64 do corpo direto em memória.
+    Retorna (imagem, None) ou (None, resposta de erro)
+    """
+    imagem_data = data['imagem']
+    if not isinstance(imagem_data, str):
+        return None, (jsonify({"erro": "Formato de imagem não suportado"}), 400)
+    try:
+        import cv2
+        import numpy as np
+        if imagem_data.startswith('data:image'):
+            imagem_data = imagem_data.split(',')[1]
+        nparr = np.frombuffer(base64.b64decode(imagem_data), np.uint8)
+        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    except Exception as e:
+        return None, (jsonify({"erro": f"Erro ao processar imagem base64: {str(e)}"}), 400)
+    if image is None:
+        return None, (jsonify({"erro": "Não foi possível decodificar a imagem"}), 400)
+    return image, None
+
+
+def _questoes_configuradas(configuracao_questoes):
+    if configuracao_questoes is None:
+        return list(range(1, 45))
+    return [q for questoes in configuracao_questoes.values() for q in questoes]
+
+
+def _ler_pipeline(image, num_questoes):
+    """
+    Leitura pelo pipeline v2; devolve {questao: alternativa} só das leituras
+    confiáveis (as duvidosas ficam de fora, como as não lidas da v1)
+    """
+    from src.omr import LayoutProva
+    from src.omr.pipeline import STATUS_REJEITADA, CorrecaoPipeline
+    leitura = CorrecaoPipeline().ler(image, LayoutProva(num_questoes=num_questoes))
+    if leitura['status'] == STATUS_REJEITADA:
+        return None, leitura
+    respostas = {q['numero']: q['alternativa_detectada'] for q in leitura['questoes']
+                 if not q['precisa_revisao'] and q['alternativa_detectada']}
+    return respostas, leitura
+
+
+def _adaptar_resultado(processor, respostas, leitura, configuracao_questoes,
+                       gabarito_oficial):
+    """
+    Resposta no formato v1 a partir das respostas lidas (qualquer motor)
+    """
+    resultado = processor.montar_resultado(respostas, configuracao_questoes,
+                                           gabarito_oficial or None)
+    if leitura is not None:
+        questoes = set(_questoes_configuradas(configuracao_questoes))
+        resultado['questoes_para_revisao'] = [
+            q['numero'] for q in leitura['questoes']
+            if q['precisa_revisao'] and q['numero'] in questoes
+        ]
+    return resultado
+
+
+def _processar(image, configuracoes, gabarito_oficial, num_questoes=None):
+    """
+    Lê a imagem UMA vez e monta o resultado v1 para cada configuração.
+    Retorna {nome: resultado} ou {nome: {"erro": ...}} se a leitura falhar.
+    `num_questoes` (opcional no corpo) define a grade; padrão 44
+    """
+    from ..vision_processor import VisionProcessorSimplesFuncional
+    processor = VisionProcessorSimplesFuncional()
+    num_questoes = int(num_questoes) if num_questoes else None
+    leitura = None
+    if _motor_v1() == MOTOR_V1_PIPELINE:
+        num_questoes = num_questoes or max(max(_questoes_configuradas(c), default=0)
+                                           for c in configuracoes.values()) or 44
+        respostas, leitura = _ler_pipeline(image, num_questoes)
+        if respostas is None:
+            erro = {"erro": "Imagem reprovada na validação de qualidade",
+                    "problemas": leitura['qualidade'].get('problemas', [])}
+            return {nome: dict(erro) for nome in configuracoes}, processor
+    else:
+        respostas = processor.processar_murtaza_hassan_style(image, num_questoes or 44)
+
+    resultados = {}
+    for nome, config in configuracoes.items():
+        try:
+            resultados[nome] = _adaptar_resultado(processor, respostas, leitura,
+                                                  config, gabarito_oficial)
+        except Exception as e:
+            resultados[nome] = {"erro": str(e)}
+    return resultados, processor
+
+
+def _metodo():
+    if _motor_v1() == MOTOR_V1_PIPELINE:
+        return 'pipeline_omr_v2'
+    return 'sistema_corrigido_funcional'
+
+
 @gabarito_bp.route('/health', methods=['GET'])
 @cross_origin()
 def health_check():
@@ -41,57 +146,20 @@ def processar_gabarito():
         if 'imagem' not in data:
             return jsonify({"erro": "Imagem é obrigatória"}), 400
         
-        # Gabarito oficial (opcional)
-        gabarito_oficial = data.get('gabarito_oficial', {})
-        
-        # Configuração de questões (opcional)
-        configuracao_questoes = data.get('configuracao_questoes', None)
+        image, erro = _decodificar_imagem(data)
+        if erro:
+            return erro
         
-        # Processar imagem
-        imagem_data = data['imagem']
-        
-        # Suporte para base64
-        if isinstance(imagem_data, str):
-            try:
-                if imagem_data.startswith('data:image'):
-                    imagem_data = imagem_data.split(',')[1]
-                
-                image_bytes = base64.b64decode(imagem_data)
-                nparr = np.frombuffer(image_bytes, np.uint8)
-                image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-                
-                if image is None:
-                    return jsonify({"erro": "Não foi possível decodificar a imagem"}), 400
-                
-                # Salvar temporariamente
-                with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as tmp_file:
-                    cv2.imwrite(tmp_file.name, image)
-                    image_path = tmp_file.name
-                    
-            except Exception as e:
-                return jsonify({"erro": f"Erro ao processar imagem base64: {str(e)}"}), 400
-        else:
-            return jsonify({"erro": "Formato de imagem não suportado"}), 400
-        
-        # Processar gabarito com sistema corrigido
-        processor = VisionProcessorSimplesFuncional()
-        resultado = processor.processar_gabarito(
-            image_path, 
-            configuracao_questoes=configuracao_questoes,
-            gabarito_oficial=gabarito_oficial if gabarito_oficial else None
-        )
-        
-        # Limpar arquivo temporário
-        try:
-            os.unlink(image_path)
-        except:
-            pass
+        resultados, _ = _processar(image, {'_': data.get('configuracao_questoes', None)},
+                                   data.get('gabarito_oficial', {}),
+                                   data.get('num_questoes'))
+        resultado = resultados['_']
         
         if 'erro' in resultado:
             return jsonify(resultado), 500
         
         # Adicionar informações extras
-        resultado['metodo'] = 'sistema_corrigido_funcional'
+        resultado['metodo'] = _metodo()
         resultado['versao'] = '3.0'
         resultado['timestamp'] = datetime.now().isoformat()
         resultado['base'] = 'Murtaza Hassan Style'
@@ -117,78 +185,28 @@ def debug_gabarito():
         if 'imagem' not in data:
             return jsonify({"erro": "Imagem é obrigatória"}), 400
         
-        # Gabarito oficial (opcional)
-        gabarito_oficial = data.get('gabarito_oficial', {})
-        
-        # Configuração de questões (opcional)
-        configuracao_questoes = data.get('configuracao_questoes', None)
-        
-        # Processar imagem
-        imagem_data = data['imagem']
-        
-        # Suporte para base64
-        if isinstance(imagem_data, str):
-            try:
-                if imagem_data.startswith('data:image'):
-                    imagem_data = imagem_data.split(',')[1]
-                
-                image_bytes = base64.b64decode(imagem_data)
-                nparr = np.frombuffer(image_bytes, np.uint8)
-                image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-                
-                if image is None:
-                    return jsonify({"erro": "Não foi possível decodificar a imagem"}), 400
-                
-                # Salvar temporariamente
-                with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as tmp_file:
-                    cv2.imwrite(tmp_file.name, image)
-                    image_path = tmp_file.name
-                    
-            except Exception as e:
-                return jsonify({"erro": f"Erro ao processar imagem base64: {str(e)}"}), 400
-        else:
-            return jsonify({"erro": "Formato de imagem não suportado"}), 400
-        
-        # Processar e gerar debug
-        processor = VisionProcessorSimplesFuncional()
-        resultado = processor.processar_gabarito(
-            image_path, 
-            configuracao_questoes=configuracao_questoes,
-            gabarito_oficial=gabarito_oficial if gabarito_oficial else None
-        )
-        
-        # Gerar debug
-        debug_path = os.path.join(tempfile.gettempdir(), f"debug_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png")
-        processor.gerar_debug(image_path, resultado, debug_path)
+        image, erro = _decodificar_imagem(data)
+        if erro:
+            return erro
         
-        # Limpar arquivo temporário
-        try:
-            os.unlink(image_path)
-        except:
-            pass
+        resultados, processor = _processar(
+            image, {'_': data.get('configuracao_questoes', None)},
+            data.get('gabarito_oficial', {}), data.get('num_questoes'))
+        resultado = resultados['_']
+        if 'erro' in resultado:
+            return jsonify(resultado), 500
         
-        if not os.path.exists(debug_path):
+        # Gerar debug e codificar em memória
+        import cv2
+        ok, buf = cv2.imencode('.png', processor.gerar_debug_imagem(image, resultado))
+        if not ok:
             return jsonify({"erro": "Não foi possível gerar imagem de debug"}), 500
+        debug_base64 = base64.b64encode(buf).decode('utf-8')
         
-        # Converter debug para base64
-        try:
-            with open(debug_path, 'rb') as f:
-                debug_bytes = f.read()
-                debug_base64 = base64.b64encode(debug_bytes).decode('utf-8')
-            
-            # Limpar debug temporário
-            try:
-                os.unlink(debug_path)
-            except:
-                pass
-            
-            return jsonify({
-                "debug_image": f"data:image/png;base64,{debug_base64}",
-                "resultado": resultado
-            })
-            
-        except Exception as e:
-            return jsonify({"erro": f"Erro ao converter debug: {str(e)}"}), 500
+        return jsonify({
+            "debug_image": f"data:image/png;base64,{debug_base64}",
+            "resultado": resultado
+        })
         
     except Exception as e:
         return jsonify({"erro": f"Erro interno: {str(e)}"}), 500
@@ -198,6 +216,7 @@ def debug_gabarito():
 def configurar_questoes():
     """
     Endpoint para testar diferentes configurações de questões
+    (a imagem é lida uma única vez para todas elas)
     """
     try:
         data = request.get_json()
@@ -209,58 +228,13 @@ def configurar_questoes():
         if 'imagem' not in data or 'configuracoes' not in data:
             return jsonify({"erro": "Imagem e configurações são obrigatórias"}), 400
         
-        # Gabarito oficial (opcional)
-        gabarito_oficial = data.get('gabarito_oficial', {})
+        image, erro = _decodificar_imagem(data)
+        if erro:
+            return erro
         
-        # Configurações para testar
-        configuracoes = data['configuracoes']
-        
-        # Processar imagem
-        imagem_data = data['imagem']
-        
-        # Suporte para base64
-        if isinstance(imagem_data, str):
-            try:
-                if imagem_data.startswith('data:image'):
-                    imagem_data = imagem_data.split(',')[1]
-                
-                image_bytes = base64.b64decode(imagem_data)
-                nparr = np.frombuffer(image_bytes, np.uint8)
-                image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-                
-                if image is None:
-                    return jsonify({"erro": "Não foi possível decodificar a imagem"}), 400
-                
-                # Salvar temporariamente
-                with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as tmp_file:
-                    cv2.imwrite(tmp_file.name, image)
-                    image_path = tmp_file.name
-                    
-            except Exception as e:
-                return jsonify({"erro": f"Erro ao processar imagem base64: {str(e)}"}), 400
-        else:
-            return jsonify({"erro": "Formato de imagem não suportado"}), 400
-        
-        # Testar cada configuração
-        processor = VisionProcessorSimplesFuncional()
-        resultados = {}
-        
-        for nome_config, config_questoes in configuracoes.items():
-            try:
-                resultado = processor.processar_gabarito(
-                    image_path, 
-                    configuracao_questoes=config_questoes,
-                    gabarito_oficial=gabarito_oficial if gabarito_oficial else None
-                )
-                resultados[nome_config] = resultado
-            except Exception as e:
-                resultados[nome_config] = {"erro": str(e)}
-        
-        # Limpar arquivo temporário
-        try:
-            os.unlink(image_path)
-        except:
-            pass
+        resultados, _ = _processar(image, data['configuracoes'],
+                                   data.get('gabarito_oficial', {}),
+                                   data.get('num_questoes'))
         
         return jsonify({
             "resultados": resultados,
@@ -298,7 +272,7 @@ def info_api():
             "status": "Funcionando corretamente"
         },
         "configuracao": {
-            "questoes_padrao": "1-44 (automático)",
+            "questoes_padrao": "1-44 (automático; configurável com num_questoes)",
             "configuracao_manual": "Suportada",
             "tabelas_suportadas": "1 ou 2",
             "opcoes": ["A", "B", "C", "D", "E"]
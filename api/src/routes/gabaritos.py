@@ -0,0 +1,295 @@
+"""API v2 de gabaritos oficiais.
+
+Endpoints (prefixo /api/v2):
+- POST   /gabaritos                      cadastra um gabarito (versão 1 ou seguinte)
+- GET    /gabaritos?turma=X              lista gabaritos cadastrados
+- GET    /gabaritos/<id>                 gabarito completo
+- GET    /gabaritos/<id>/modelo.png      cartão-resposta imprimível do layout,
+                                         com os marcadores de canto
+- POST   /gabaritos/<id>/versoes         nova versão; pode repontuar as correções
+                                         não confirmadas das versões anteriores
+- POST   /gabaritos/<turma>/rescore      aplica o gabarito corrigido de uma prova
+                                         às correções não confirmadas dela na turma
+                                         (cria a versão seguinte, como /versoes)
+
+O gabarito é validado uma vez, no cadastro; as correções referenciam a
+versão por `gabarito_id` e não guardam cópia própria. Duas requisições
+simultâneas para a mesma prova disputam o mesmo número de versão: a que
+perde tenta o número seguinte (TENTATIVAS_VERSAO) e, esgotadas as
+tentativas, recebe 409 VERSAO_CONCORRENTE.
+"""
+
+import json
+import logging
+from typing import Optional
+
+from flask import Blueprint, Response, jsonify, request
+from sqlalchemy.exc import IntegrityError
+
+from src.models.correcao import Correcao
+from src.models.gabarito import Gabarito, carregar_gabarito
+from src.models.user import db
+from src.omr import LayoutProva
+from src.omr.pontuacao import (
+    STATUS_REJEITADA, aplicar_gabarito, resumo_com_revisoes, validar_gabarito,
+)
+from src.routes.auth import requer_login
+from src.routes.correcao import STATUS_CONFIRMADA, _erro, _layout_da_requisicao
+
+logger = logging.getLogger('api.gabaritos')
+
+gabaritos_bp = Blueprint('gabaritos', __name__)
+
+TENTATIVAS_VERSAO = 3
+
+
+def _repontuar(correcao: Correcao, gabarito: dict, gabarito_id: int) -> dict:
+    """Refaz acertos e resumo a partir das leituras gravadas na correção,
+    mantendo as revisões manuais, e a liga à versão `gabarito_id`. Não toca
+    na imagem."""
+    resultado = aplicar_gabarito(correcao.resultado, gabarito,
+                                 max(int(k) for k in gabarito))
+    revisoes = correcao.revisoes
+    if revisoes:
+        resultado['resumo'] = resumo_com_revisoes(resultado, revisoes)
+    correcao.gabarito_id = gabarito_id
+    correcao.gabarito_json = ''
+    correcao.resultado_json = json.dumps(resultado)
+    correcao.nota_provisoria = resultado['resumo']['nota_provisoria']
+    return resultado['resumo']
+
+
+def _ler_gabarito(data: dict):
+    """(gabarito normalizado, layout, resposta de erro) a partir do corpo."""
+    layout, erro = _layout_da_requisicao(data.get('layout'))
+    if erro is not None:
+        return None, None, erro
+    gabarito = data.get('gabarito_oficial')
+    mensagem = validar_gabarito(gabarito, layout.alternativas)
+    if mensagem:
+        return None, layout, _erro(mensagem, 'GABARITO_INVALIDO', 400)
+    return {str(int(k)): v for k, v in gabarito.items()}, layout, None
+
+
+def _ultima_versao(turma: str, prova: str) -> int:
+    return (db.session.query(db.func.max(Gabarito.versao))
+            .filter_by(turma=turma, prova=prova).scalar()) or 0
+
+
+def _criar_versao(turma: str, prova: str, gabarito: dict,
+                  layout: LayoutProva) -> Optional[Gabarito]:
+    """Grava (flush, sem commit) a próxima versão da prova; None se outras
+    requisições levaram o número TENTATIVAS_VERSAO vezes seguidas."""
+    layout.num_questoes = max(int(k) for k in gabarito)
+    for _ in range(TENTATIVAS_VERSAO):
+        novo = Gabarito(professor_id=request.usuario_atual.id, turma=turma, prova=prova,
+                        versao=_ultima_versao(turma, prova) + 1,
+                        respostas_json=json.dumps(gabarito),
+                        layout_json=json.dumps(layout.to_dict()))
+        try:
+            # Savepoint: a colisão desfaz só esta inserção, não a transação
+            with db.session.begin_nested():
+                db.session.add(novo)
+        except IntegrityError:
+            logger.info('Versão %d de %s/%s criada por outra requisição; tentando a seguinte',
+                        novo.versao, turma, prova)
+            continue
+        return novo
+    return None
+
+
+def _erro_versao_concorrente():
+    return _erro('Outra versão deste gabarito foi criada ao mesmo tempo; tente novamente.',
+                 'VERSAO_CONCORRENTE', 409)
+
+
+def _repontuar_correcoes(correcoes, gabarito: dict, gabarito_id: int):
+    """Repontua em lote; devolve (atualizadas, ignoradas). Não faz commit."""
+    atualizadas, ignoradas = [], []
+    for correcao in correcoes:
+        numeros = {str(q['numero']) for q in correcao.resultado.get('questoes', [])}
+        if numeros != set(gabarito):
+            ignoradas.append({'id': correcao.id, 'aluno': correcao.aluno,
+                              'motivo': 'Questões da leitura não batem com o gabarito.'})
+            continue
+        nota_anterior = correcao.nota_provisoria
+        resumo = _repontuar(correcao, gabarito, gabarito_id)
+        atualizadas.append({'id': correcao.id, 'aluno': correcao.aluno,
+                            'nota_anterior': nota_anterior,
+                            'nota_provisoria': resumo['nota_provisoria'],
+                            'pendentes_revisao': resumo['pendentes_revisao']})
+    return atualizadas, ignoradas
+
+
+def _separar_por_prova(correcoes, versoes: set):
+    """(correções ligadas a uma das `versoes` da prova, ignoradas). As de outra
+    prova e as de gabarito avulso (sem prova conhecida) não são tocadas."""
+    da_prova, ignoradas = [], []
+    for correcao in correcoes:
+        if correcao.gabarito_id in versoes:
+            da_prova.append(correcao)
+            continue
+        motivo = ('Correção de outra prova.' if correcao.gabarito_id is not None
+                  else 'Correção com gabarito avulso: a prova não é conhecida.')
+        ignoradas.append({'id': correcao.id, 'aluno': correcao.aluno, 'motivo': motivo})
+    return da_prova, ignoradas
+
+
+def _nao_confirmadas(consulta):
+    return consulta.filter(~Correcao.status.in_([STATUS_CONFIRMADA, STATUS_REJEITADA]))
+
+
+@gabaritos_bp.route('/gabaritos', methods=['POST'])
+@requer_login
+def criar_gabarito():
+    """Cadastra o gabarito de uma prova. Se já existir, vira a próxima versão."""
+    data = request.get_json(silent=True) or {}
+    turma = str(data.get('turma') or '').strip()
+    prova = str(data.get('prova') or '').strip()
+    if not turma or not prova:
+        return _erro('Campos "turma" e "prova" são obrigatórios.', 'PAYLOAD_INVALIDO', 400)
+    gabarito, layout, erro = _ler_gabarito(data)
+    if erro is not None:
+        return erro
+
+    novo = _criar_versao(turma, prova, gabarito, layout)
+    if novo is None:
+        db.session.rollback()
+        return _erro_versao_concorrente()
+    db.session.commit()
+    logger.info('Gabarito %s cadastrado: turma=%s prova=%s versao=%d',
+                novo.id, turma, prova, novo.versao)
+    return jsonify(novo.to_dict()), 201
+
+
+@gabaritos_bp.route('/gabaritos', methods=['GET'])
+@requer_login
+def listar_gabaritos():
+    consulta = Gabarito.query
+    turma = request.args.get('turma')
+    if turma:
+        consulta = consulta.filter_by(turma=turma)
+    gabaritos = consulta.order_by(Gabarito.turma, Gabarito.prova, Gabarito.versao).all()
+    return jsonify({'gabaritos': [g.to_dict() for g in gabaritos]})
+
+
+@gabaritos_bp.route('/gabaritos/<int:gabarito_id>', methods=['GET'])
+@requer_login
+def obter_gabarito(gabarito_id):
+    gabarito = db.session.get(Gabarito, gabarito_id)
+    if gabarito is None:
+        return _erro('Gabarito não encontrado.', 'NAO_ENCONTRADO', 404)
+    return jsonify(gabarito.to_dict())
+
+
+@gabaritos_bp.route('/gabaritos/<int:gabarito_id>/modelo.png', methods=['GET'])
+@requer_login
+def modelo_gabarito(gabarito_id):
+    """Cartão em branco para impressão (A4, 300 dpi por padrão; ?largura=)."""
+    from src.omr.modelo import LARGURA_IMPRESSAO, modelo_png
+
+    gabarito = db.session.get(Gabarito, gabarito_id)
+    if gabarito is None:
+        return _erro('Gabarito não encontrado.', 'NAO_ENCONTRADO', 404)
+    try:
+        largura = int(request.args.get('largura', LARGURA_IMPRESSAO))
+    except ValueError:
+        largura = 0
+    if not 600 <= largura <= 4960:
+        return _erro('"largura" deve ser um inteiro entre 600 e 4960.', 'PAYLOAD_INVALIDO', 400)
+    png = modelo_png(LayoutProva.from_dict(gabarito.layout), largura,
+                     f'{gabarito.prova} - {gabarito.turma}')
+    resposta = Response(png, mimetype='image/png')
+    resposta.headers['Content-Disposition'] = (
+        f'inline; filename="cartao-{gabarito.id}-v{gabarito.versao}.png"')
+    return resposta
+
+
+@gabaritos_bp.route('/gabaritos/<int:gabarito_id>/versoes', methods=['POST'])
+@requer_login
+def nova_versao(gabarito_id):
+    """Corrige um gabarito cadastrado criando a versão seguinte.
+
+    Com `repontuar: true`, as correções não confirmadas que usam qualquer
+    versão anterior da mesma prova passam a referenciar a nova e têm a nota
+    recalculada a partir das leituras gravadas, na mesma transação.
+    """
+    atual = carregar_gabarito(gabarito_id)
+    if atual is None:
+        return _erro('Gabarito não encontrado.', 'NAO_ENCONTRADO', 404)
+    data = request.get_json(silent=True) or {}
+    data.setdefault('layout', atual.layout)
+    gabarito, layout, erro = _ler_gabarito(data)
+    if erro is not None:
+        return erro
+
+    atualizadas, ignoradas = [], []
+    try:
+        novo = _criar_versao(atual.turma, atual.prova, gabarito, layout)
+        if novo is None:
+            db.session.rollback()
+            return _erro_versao_concorrente()
+        if data.get('repontuar'):
+            anteriores = (db.session.query(Gabarito.id)
+                          .filter_by(turma=atual.turma, prova=atual.prova)
+                          .filter(Gabarito.id != novo.id))
+            correcoes = _nao_confirmadas(
+                Correcao.query.filter(Correcao.gabarito_id.in_(anteriores))).all()
+            atualizadas, ignoradas = _repontuar_correcoes(correcoes, gabarito, novo.id)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    logger.info('Gabarito %s: nova versão %d (%s); %d correções repontuadas',
+                gabarito_id, novo.versao, novo.id, len(atualizadas))
+    return jsonify({'gabarito': novo.to_dict(), 'atualizadas': atualizadas,
+                    'ignoradas': ignoradas}), 201
+
+
+@gabaritos_bp.route('/gabaritos/<turma>/rescore', methods=['POST'])
+@requer_login
+def repontuar_turma(turma):
+    """Corrige o gabarito de uma prova da turma e recalcula as notas sem
+    reler imagens. Corpo: {prova, gabarito_oficial, layout?}.
+
+    O gabarito corrigido vira a versão seguinte da prova (layout da última
+    versão, se não vier outro) e as correções repontuadas passam a
+    referenciá-la. Só entram correções não confirmadas ligadas a uma versão
+    dessa prova; as de outra prova, as de gabarito avulso e as lidas com
+    outro conjunto de questões são ignoradas e listadas. Tudo é gravado numa
+    única transação.
+    """
+    data = dict(request.get_json(silent=True) or {})
+    prova = str(data.get('prova') or '').strip()
+    if not prova:
+        return _erro('Informe a "prova" cujo gabarito foi corrigido.', 'PAYLOAD_INVALIDO', 400)
+    versoes = (Gabarito.query.filter_by(turma=turma, prova=prova)
+               .order_by(Gabarito.versao.desc()).all())
+    if not versoes:
+        return _erro(f'Prova "{prova}" sem gabarito cadastrado na turma {turma}.',
+                     'GABARITO_INEXISTENTE', 404)
+    data.setdefault('layout', versoes[0].layout)
+    gabarito, layout, erro = _ler_gabarito(data)
+    if erro is not None:
+        return erro
+
+    correcoes = _nao_confirmadas(Correcao.query.filter(Correcao.turma == turma)).all()
+    da_prova, de_fora = _separar_por_prova(correcoes, {g.id for g in versoes})
+    try:
+        novo = _criar_versao(turma, prova, gabarito, layout)
+        if novo is None:
+            db.session.rollback()
+            return _erro_versao_concorrente()
+        atualizadas, ignoradas = _repontuar_correcoes(da_prova, gabarito, novo.id)
+        ignoradas = de_fora + ignoradas
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    logger.info('Gabarito da prova %s da turma %s corrigido na versão %d: %d correções '
+                'repontuadas, %d ignoradas', prova, turma, novo.versao, len(atualizadas),
+                len(ignoradas))
+    return jsonify({'turma': turma, 'prova': prova, 'gabarito': novo.to_dict(),
+                    'atualizadas': atualizadas, 'ignoradas': ignoradas})
@@ -0,0 +1,127 @@
+"""API v2 de lotes de correção (cartões de uma turma enviados de uma vez).
+
+Endpoints (prefixo /api/v2):
+- POST  /lotes                 recebe os cartões e os corrige em segundo plano
+                               (202; gabarito_oficial + layout ou gabarito_id)
+- GET   /lotes/<id>            situação do lote
+- GET   /lotes/<id>/eventos    fluxo SSE com um evento por cartão terminado
+
+Eventos (text/event-stream; `id` é a ordem de término do cartão no lote):
+    event: correcao   data: {ordem, total, correcao_id, aluno, status,
+                             nota_provisoria, pendentes}
+    event: falha      data: {ordem, total, posicao, aluno, codigo, erro}
+    event: fim        data: o lote (to_dict); o fluxo termina em seguida
+O lote sem cartão novo há LOTE_PARADO_SEGUNDOS (padrão 600) passa a
+INTERROMPIDO e também recebe 'fim': o fluxo nunca fica aberto para sempre.
+Reconexões com o header Last-Event-ID (ou ?desde=N) retomam do evento
+seguinte. Sem novidades, um comentário de keep-alive sai a cada
+SSE_KEEPALIVE_SEGUNDOS.
+"""
+
+import json
+import logging
+
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
+
+from src import lotes
+from src.models.lote import Lote
+from src.models.user import db
+from src.routes.auth import requer_login
+from src.routes.correcao import _erro, _resolver_gabarito
+
+logger = logging.getLogger('api.lotes')
+
+lotes_bp = Blueprint('lotes', __name__)
+
+MAX_CARTOES_POR_LOTE = 200
+SSE_KEEPALIVE_SEGUNDOS = 15.0
+# Intervalo máximo entre consultas ao banco: cobre lotes processados por
+# outro worker, cujo barramento em memória não alcança este processo
+SSE_CONSULTA_SEGUNDOS = 2.0
+
+
+@lotes_bp.route('/lotes', methods=['POST'])
+@requer_login
+def criar_lote():
+    """Corpo: {turma, gabarito_id | gabarito_oficial + layout,
+    cartoes: [{aluno, imagem (base64)}]}."""
+    data = request.get_json(silent=True)
+    if not data:
+        return _erro('Corpo JSON ausente ou inválido.', 'PAYLOAD_INVALIDO', 400)
+    cartoes = data.get('cartoes')
+    if not isinstance(cartoes, list) or not cartoes:
+        return _erro('Informe a lista "cartoes" com {aluno, imagem}.', 'CARTOES_AUSENTES', 400)
+    if len(cartoes) > MAX_CARTOES_POR_LOTE:
+        return _erro(f'No máximo {MAX_CARTOES_POR_LOTE} cartões por lote.',
+                     'LOTE_GRANDE_DEMAIS', 400)
+    if not all(isinstance(c, dict) for c in cartoes):
+        return _erro('Cada cartão deve ser um objeto {aluno, imagem}.', 'CARTOES_AUSENTES', 400)
+
+    gabarito_id, gabarito, layout, turma_padrao, erro = _resolver_gabarito(data)
+    if erro is not None:
+        return erro
+
+    turma = str(data.get('turma') or turma_padrao)
+    lote = Lote(professor_id=request.usuario_atual.id, turma=turma, total=len(cartoes))
+    db.session.add(lote)
+    db.session.commit()
+    lotes.iniciar_lote(current_app._get_current_object(), lote, cartoes, {
+        'gabarito': gabarito, 'gabarito_id': gabarito_id, 'layout': layout,
+        'turma': turma, 'professor_id': request.usuario_atual.id,
+    })
+    logger.info('Lote %s criado: %d cartões, turma=%s', lote.id, lote.total, turma)
+    return jsonify(lote.to_dict()), 202
+
+
+@lotes_bp.route('/lotes/<int:lote_id>', methods=['GET'])
+@requer_login
+def obter_lote(lote_id):
+    lote = db.session.get(Lote, lote_id)
+    if lote is None:
+        return _erro('Lote não encontrado.', 'NAO_ENCONTRADO', 404)
+    lotes.encerrar_se_parado(lote)
+    return jsonify(lote.to_dict())
+
+
+def _sse(evento: dict) -> str:
+    return (f"id: {evento['id']}\nevent: {evento['tipo']}\n"
+            f"data: {json.dumps(evento['dados'], ensure_ascii=False)}\n\n")
+
+
+@lotes_bp.route('/lotes/<int:lote_id>/eventos', methods=['GET'])
+@requer_login
+def eventos_lote(lote_id):
+    if db.session.get(Lote, lote_id) is None:
+        return _erro('Lote não encontrado.', 'NAO_ENCONTRADO', 404)
+    try:
+        ultimo = int(request.headers.get('Last-Event-ID') or request.args.get('desde') or 0)
+    except ValueError:
+        return _erro('Last-Event-ID/desde deve ser inteiro.', 'DADOS_INVALIDOS', 400)
+
+    def gerar():
+        nonlocal ultimo
+        ocioso = 0.0
+        while True:
+            versao = lotes.barramento.versao(lote_id)
+            db.session.rollback()   # encerra a leitura anterior: enxerga o que foi gravado
+            lote = db.session.get(Lote, lote_id)
+            db.session.refresh(lote)
+            lotes.encerrar_se_parado(lote)
+            eventos = lotes.eventos_desde(lote, ultimo)
+            for evento in eventos:
+                yield _sse(evento)
+                if evento['tipo'] == 'fim':
+                    return
+                ultimo = evento['id']
+            if eventos:
+                ocioso = 0.0
+            elif ocioso >= SSE_KEEPALIVE_SEGUNDOS:
+                yield ': keep-alive\n\n'
+                ocioso = 0.0
+            lotes.barramento.aguardar(lote_id, versao, SSE_CONSULTA_SEGUNDOS)
+            ocioso += SSE_CONSULTA_SEGUNDOS
+
+    resposta = Response(stream_with_context(gerar()), mimetype='text/event-stream')
+    resposta.headers['Cache-Control'] = 'no-cache'
+    resposta.headers['X-Accel-Buffering'] = 'no'   # nginx/Render: não bufferizar o fluxo
+    return resposta
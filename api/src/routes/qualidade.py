@@ -0,0 +1,114 @@
+"""API v2 de qualidade de captura.
+
+Endpoints (prefixo /api/v2):
+- POST /qualidade/preview    verificação rápida de um quadro da câmera
+                             (lado maior ≤ 640 px) antes da foto definitiva
+
+O quadro vem como JSON {"imagem": base64} ou como bytes crus com
+Content-Type image/*. As dimensões de JPEG, PNG e WebP são lidas do
+cabeçalho, e um quadro grande demais é recusado sem ser decodificado; os
+demais formatos são decodificados (já limitados a MAX_BYTES_PREVIA) e
+conferidos depois. O quadro aceito é decodificado direto em cinza e avaliado
+por `omr.previa`; nada é gravado.
+"""
+
+import struct
+from typing import Optional, Tuple
+
+from flask import Blueprint, jsonify, request
+
+from src.routes.auth import requer_login
+from src.routes.correcao import _bytes_imagem, _erro
+
+qualidade_bp = Blueprint('qualidade', __name__)
+
+# Um quadro de 640 px em JPEG fica bem abaixo disso; acima é foto definitiva
+MAX_BYTES_PREVIA = 512 * 1024
+
+# Marcadores SOFn do JPEG (C4, C8 e CC não são quadros)
+_SOF_JPEG = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def _dimensoes_jpeg(dados: bytes) -> Optional[Tuple[int, int]]:
+    i = 2
+    while i + 4 <= len(dados):
+        if dados[i] != 0xFF:
+            return None
+        marcador = dados[i + 1]
+        if marcador == 0xFF:                       # preenchimento
+            i += 1
+            continue
+        if marcador in (0x01, 0xD8) or 0xD0 <= marcador <= 0xD7:   # sem tamanho
+            i += 2
+            continue
+        if marcador in (0xD9, 0xDA):               # fim / dados antes do quadro
+            return None
+        tamanho = struct.unpack('>H', dados[i + 2:i + 4])[0]
+        if marcador in _SOF_JPEG:
+            if i + 9 > len(dados):
+                return None
+            altura, largura = struct.unpack('>HH', dados[i + 5:i + 9])
+            return largura, altura
+        i += 2 + tamanho
+    return None
+
+
+def _dimensoes_cabecalho(dados: bytes) -> Optional[Tuple[int, int]]:
+    """(largura, altura) lidas do cabeçalho de JPEG, PNG ou WebP; None se o
+    formato não for um desses ou o cabeçalho estiver truncado."""
+    if dados[:8] == b'\x89PNG\r\n\x1a\n' and dados[12:16] == b'IHDR':
+        return struct.unpack('>II', dados[16:24]) if len(dados) >= 24 else None
+    if dados[:2] == b'\xff\xd8':
+        return _dimensoes_jpeg(dados)
+    if dados[:4] == b'RIFF' and dados[8:12] == b'WEBP' and len(dados) >= 30:
+        bloco = dados[12:16]
+        if bloco == b'VP8 ' and dados[23:26] == b'\x9d\x01\x2a':
+            largura, altura = struct.unpack('<HH', dados[26:30])
+            return largura & 0x3FFF, altura & 0x3FFF
+        if bloco == b'VP8L' and dados[20] == 0x2F:
+            bits = int.from_bytes(dados[21:25], 'little')
+            return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+        if bloco == b'VP8X':
+            return (int.from_bytes(dados[24:27], 'little') + 1,
+                    int.from_bytes(dados[27:30], 'little') + 1)
+    return None
+
+
+def _erro_lado(largura: int, altura: int, lado_maximo: int):
+    return _erro(f'Quadro de {largura}x{altura} px; a pré-visualização '
+                 f'aceita lado maior até {lado_maximo} px.', 'PREVIA_GRANDE_DEMAIS', 413)
+
+
+@qualidade_bp.route('/qualidade/preview', methods=['POST'])
+@requer_login
+def previa_qualidade():
+    if request.mimetype.startswith('image/'):
+        dados = request.get_data()
+    else:
+        imagem_b64 = (request.get_json(silent=True) or {}).get('imagem')
+        if not imagem_b64:
+            return _erro('Informe o campo "imagem".', 'DADOS_INVALIDOS', 400)
+        try:
+            dados = _bytes_imagem(imagem_b64)
+        except Exception:
+            return _erro('Não foi possível decodificar a imagem base64.', 'IMAGEM_INVALIDA', 400)
+    if len(dados) > MAX_BYTES_PREVIA:
+        return _erro('Quadro grande demais para a pré-visualização; envie uma versão '
+                     'reduzida (lado maior até 640 px).', 'PREVIA_GRANDE_DEMAIS', 413)
+
+    # Sob demanda: o worker sobe sem OpenCV (ver src/aquecimento.py)
+    import cv2
+    import numpy as np
+
+    from src.omr.previa import PREVIA_LADO_MAXIMO, avaliar_previa
+
+    # Antes de decodificar: recusar um quadro grande custa só ler o cabeçalho
+    dimensoes = _dimensoes_cabecalho(dados)
+    if dimensoes is not None and max(dimensoes) > PREVIA_LADO_MAXIMO:
+        return _erro_lado(*dimensoes, PREVIA_LADO_MAXIMO)
+    gray = cv2.imdecode(np.frombuffer(dados, np.uint8), cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        return _erro('Formato de imagem não suportado.', 'IMAGEM_INVALIDA', 400)
+    if max(gray.shape) > PREVIA_LADO_MAXIMO:
+        return _erro_lado(gray.shape[1], gray.shape[0], PREVIA_LADO_MAXIMO)
+    return jsonify(avaliar_previa(gray).to_dict())
@@ -0,0 +1,394 @@
+"""API v2 da fila de revisão da turma.
+
+Endpoints (prefixo /api/v2):
+- GET /revisao/fila?turma=X                   próximas questões pendentes de
+                                              todas as correções da turma
+- GET /correcoes/<id>/questoes/<n>/recorte.png recorte da questão (com ETag)
+- GET /revisao/grupos?turma=X                 as mesmas pendências, agrupadas
+                                              por semelhança (agrupamento.py)
+- POST /revisao/grupos/decisao                uma alternativa para vários itens
+
+A fila junta as questões que ainda pedem revisão (sem revisão gravada) das
+correções PRECISA_REVISAO da turma, em ordem de prioridade (?prioridade=):
+- impacto (padrão): folhas cuja nota ainda pode mudar mais primeiro
+  (nota_maxima_possivel - nota_provisoria), depois a menor confiança
+- confianca: as leituras mais duvidosas primeiro
+- correcao: folha a folha, na ordem das questões
+
+Paginação por ?limite= (padrão 20, até 100) e ?pular=. Revisar remove a
+questão da fila, então o cliente costuma só pedir a primeira página de novo.
+Ao montar uma página, os recortes da página seguinte são gerados em segundo
+plano e gravados em disco: quando o professor chega neles, o recorte sai
+direto do arquivo, sem decodificar a foto. O nome do arquivo leva a
+assinatura da leitura (geometria e recortes), que revisões não alteram.
+"""
+
+import base64
+import glob
+import hashlib
+import json
+import logging
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from flask import Blueprint, Response, jsonify, request
+
+import src.routes.correcao as rotas_correcao
+from src.models.correcao import Correcao
+from src.models.user import db
+from src.omr.pontuacao import STATUS_REVISAO
+from src.routes.auth import requer_login
+from src.routes.correcao import STATUS_CONFIRMADA, _erro
+
+logger = logging.getLogger('api.revisao')
+
+revisao_bp = Blueprint('revisao', __name__)
+
+LIMITE_PADRAO = 20
+LIMITE_MAXIMO = 100
+
+PRIORIDADES = {
+    'impacto': lambda i: (-i['prioridade'], i['confianca'], i['correcao_id'], i['numero']),
+    'confianca': lambda i: (i['confianca'], i['correcao_id'], i['numero']),
+    'correcao': lambda i: (i['correcao_id'], i['numero']),
+}
+
+_pre_renderizacao = ThreadPoolExecutor(max_workers=1, thread_name_prefix='recortes')
+
+
+def _etag_recorte(resultado: Dict[str, Any]) -> str:
+    """Os recortes dependem só da leitura: geometria e recortes guardados.
+    Revisões e repontuação reescrevem o resumo e a pontuação de cada questão
+    sem mudar o recorte, então ficam de fora da chave."""
+    leitura = {'geometria': resultado.get('geometria'),
+               'recortes': [(q['numero'], q.get('recorte'))
+                            for q in resultado.get('questoes', [])]}
+    bruto = json.dumps(leitura, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(bruto.encode('utf-8')).hexdigest()[:16]
+
+
+def _caminho_recorte(correcao_id: int, numero: int, etag: str) -> str:
+    return os.path.join(rotas_correcao.STORAGE_DIR, 'recortes',
+                        f'{correcao_id}-{numero}-{etag}.png')
+
+
+def _gerar_recortes(caminho_original: Optional[str], resultado: Dict[str, Any],
+                    numeros: List[int]) -> Dict[int, bytes]:
+    """PNG de cada questão: o recorte que o pipeline já guardou na leitura ou,
+    sem ele, cortado da foto original pela geometria gravada. A foto é
+    decodificada no máximo uma vez por correção."""
+    por_numero = {q['numero']: q for q in resultado.get('questoes', [])}
+    pngs, faltando = {}, []
+    for numero in numeros:
+        recorte = (por_numero.get(numero) or {}).get('recorte')
+        if recorte:
+            pngs[numero] = base64.b64decode(recorte)
+        else:
+            faltando.append(numero)
+
+    geometria = resultado.get('geometria')
+    if (faltando and geometria and geometria.get('bolhas') and caminho_original
+            and os.path.exists(caminho_original)):
+        import cv2
+        from src.omr.overlay import recortar_questao, retificar
+        with open(caminho_original, 'rb') as f:
+            original = rotas_correcao._decodificar_imagem(f.read())
+        if original is not None:
+            folha = retificar(original, geometria)
+            for numero in faltando:
+                recorte = recortar_questao(folha, geometria, numero)
+                if recorte is not None:
+                    ok, buf = cv2.imencode('.png', recorte)
+                    if ok:
+                        pngs[numero] = buf.tobytes()
+    return pngs
+
+
+def _gravar_recorte(caminho: str, png: bytes):
+    diretorio = os.path.dirname(caminho)
+    os.makedirs(diretorio, exist_ok=True)
+    correcao_id, numero, _ = os.path.basename(caminho).split('-', 2)
+    # Recortes de leituras anteriores desta questão não serão mais pedidos
+    for antigo in glob.glob(os.path.join(diretorio, f'{correcao_id}-{numero}-*.png')):
+        if antigo != caminho:
+            try:
+                os.remove(antigo)
+            except OSError:
+                pass
+    temporario = f'{caminho}.{uuid.uuid4().hex}.tmp'
+    with open(temporario, 'wb') as f:
+        f.write(png)
+    os.replace(temporario, caminho)
+
+
+def _pre_renderizar(tarefas: List[Dict[str, Any]]):
+    """Grava em disco os recortes ainda ausentes (roda em segundo plano)."""
+    for t in tarefas:
+        numeros = [n for n in t['numeros']
+                   if not os.path.exists(_caminho_recorte(t['correcao_id'], n, t['etag']))]
+        if not numeros:
+            continue
+        try:
+            for numero, png in _gerar_recortes(t['caminho_original'], t['resultado'],
+                                               numeros).items():
+                _gravar_recorte(_caminho_recorte(t['correcao_id'], numero, t['etag']), png)
+        except Exception:
+            logger.exception('Falha ao pré-gerar recortes da correção %s', t['correcao_id'])
+
+
+def _pendentes(turma: str) -> Tuple[List[Dict[str, Any]], Dict[int, tuple]]:
+    """Questões ainda sem revisão das correções PRECISA_REVISAO da turma e,
+    por correção, (caminho da foto, resultado, etag do recorte)."""
+    itens: List[Dict[str, Any]] = []
+    contexto: Dict[int, tuple] = {}
+    for correcao in Correcao.query.filter_by(turma=turma, status=STATUS_REVISAO):
+        resultado = correcao.resultado
+        revisoes = correcao.revisoes
+        resumo = resultado.get('resumo') or {}
+        impacto = round((resumo.get('nota_maxima_possivel') or 0.0)
+                        - (resumo.get('nota_provisoria') or 0.0), 2)
+        etag = _etag_recorte(resultado)
+        contexto[correcao.id] = (correcao.imagem_original_path, resultado, etag)
+        for q in resultado.get('questoes', []):
+            if not q.get('precisa_revisao') or str(q['numero']) in revisoes:
+                continue
+            itens.append({
+                'correcao_id': correcao.id,
+                'aluno': correcao.aluno,
+                'numero': q['numero'],
+                'status': q.get('status'),
+                'motivo': q.get('motivo'),
+                'confianca': q.get('confianca') or 0.0,
+                'alternativa_detectada': q.get('alternativa_detectada'),
+                'preenchimentos': q.get('preenchimentos') or {},
+                'prioridade': impacto,
+                'recorte_url': (f'/api/v2/correcoes/{correcao.id}/questoes/{q["numero"]}'
+                                f'/recorte.png?v={etag}'),
+            })
+    return itens, contexto
+
+
+@revisao_bp.route('/revisao/fila', methods=['GET'])
+@requer_login
+def fila_revisao():
+    turma = request.args.get('turma')
+    if not turma:
+        return _erro('Informe a turma (?turma=).', 'DADOS_INVALIDOS', 400)
+    prioridade = request.args.get('prioridade') or 'impacto'
+    if prioridade not in PRIORIDADES:
+        return _erro(f"Prioridade inválida; use {', '.join(PRIORIDADES)}.",
+                     'DADOS_INVALIDOS', 400)
+    try:
+        limite = min(LIMITE_MAXIMO, max(1, int(request.args.get('limite') or LIMITE_PADRAO)))
+        pular = max(0, int(request.args.get('pular') or 0))
+    except ValueError:
+        return _erro('"limite" e "pular" devem ser inteiros.', 'DADOS_INVALIDOS', 400)
+
+    itens, contexto = _pendentes(turma)
+    itens.sort(key=PRIORIDADES[prioridade])
+    pagina = itens[pular:pular + limite]
+    seguinte = itens[pular + limite:pular + 2 * limite]
+
+    if seguinte:
+        tarefas: Dict[int, Dict[str, Any]] = {}
+        for item in seguinte:
+            caminho_original, resultado, etag = contexto[item['correcao_id']]
+            tarefa = tarefas.setdefault(item['correcao_id'], {
+                'correcao_id': item['correcao_id'], 'caminho_original': caminho_original,
+                'resultado': resultado, 'etag': etag, 'numeros': []})
+            tarefa['numeros'].append(item['numero'])
+        _pre_renderizacao.submit(_pre_renderizar, list(tarefas.values()))
+
+    return jsonify({
+        'turma': turma,
+        'prioridade': prioridade,
+        'total_pendentes': len(itens),
+        'correcoes_pendentes': len(contexto),
+        'itens': pagina,
+        'proxima': ({'pular': pular + limite, 'limite': limite}
+                    if pular + limite < len(itens) else None),
+    })
+
+
+@revisao_bp.route('/correcoes/<int:correcao_id>/questoes/<int:numero>/recorte.png',
+                  methods=['GET'])
+@requer_login
+def recorte_questao(correcao_id, numero):
+    correcao = db.session.get(Correcao, correcao_id)
+    if correcao is None:
+        return _erro('Correção não encontrada.', 'NAO_ENCONTRADA', 404)
+
+    resultado = correcao.resultado
+    etag = _etag_recorte(resultado)
+    if etag in request.if_none_match:
+        resposta = Response(status=304)
+        resposta.set_etag(etag)
+        return resposta
+
+    caminho = _caminho_recorte(correcao_id, numero, etag)
+    try:
+        with open(caminho, 'rb') as f:
+            png = f.read()
+    except FileNotFoundError:
+        png = _gerar_recortes(correcao.imagem_original_path, resultado, [numero]).get(numero)
+        if png is None:
+            return _erro('Recorte indisponível para esta questão.',
+                         'RECORTE_INDISPONIVEL', 404)
+        _gravar_recorte(caminho, png)
+
+    resposta = Response(png, mimetype='image/png')
+    resposta.set_etag(etag)
+    resposta.headers['Cache-Control'] = 'private, max-age=86400'
+    return resposta
+
+
+def _pontos(itens: List[Dict[str, Any]], contexto: Dict[int, tuple],
+            alternativas: List[str], miniaturas: bool):
+    """Vetor de cada item: preenchimentos e, se todos tiverem recorte, a
+    miniatura dele (sem recorte em algum, só os preenchimentos)."""
+    from src import agrupamento
+    preenchimentos = np.stack([agrupamento.vetor_preenchimentos(i['preenchimentos'],
+                                                                alternativas) for i in itens])
+    if not miniaturas:
+        return preenchimentos
+    import cv2
+    por_correcao: Dict[int, List[int]] = {}
+    for item in itens:
+        por_correcao.setdefault(item['correcao_id'], []).append(item['numero'])
+    pngs = {}
+    for correcao_id, numeros in por_correcao.items():
+        caminho_original, resultado, _ = contexto[correcao_id]
+        for numero, png in _gerar_recortes(caminho_original, resultado, numeros).items():
+            pngs[(correcao_id, numero)] = png
+    minis = []
+    for item in itens:
+        png = pngs.get((item['correcao_id'], item['numero']))
+        recorte = (cv2.imdecode(np.frombuffer(png, np.uint8), cv2.IMREAD_GRAYSCALE)
+                   if png else None)
+        if recorte is None or not recorte.size:
+            return preenchimentos
+        minis.append(agrupamento.miniatura(recorte))
+    return np.hstack([preenchimentos, np.stack(minis)])
+
+
+@revisao_bp.route('/revisao/grupos', methods=['GET'])
+@requer_login
+def grupos_revisao():
+    """Questões pendentes da turma agrupadas por semelhança.
+
+    ?raio= ajusta o quanto os itens de um grupo podem diferir (padrão
+    agrupamento.RAIO_PADRAO); ?miniaturas=0 agrupa só pelos preenchimentos.
+    """
+    from src import agrupamento
+
+    turma = request.args.get('turma')
+    if not turma:
+        return _erro('Informe a turma (?turma=).', 'DADOS_INVALIDOS', 400)
+    try:
+        raio = float(request.args.get('raio') or agrupamento.RAIO_PADRAO)
+    except ValueError:
+        return _erro('"raio" deve ser um número.', 'DADOS_INVALIDOS', 400)
+    miniaturas = request.args.get('miniaturas', '1') not in ('0', 'false')
+
+    itens, contexto = _pendentes(turma)
+    grupos = []
+    if itens:
+        alternativas = sorted({a for i in itens for a in i['preenchimentos']}) or \
+            ['A', 'B', 'C', 'D', 'E']
+        pontos = _pontos(itens, contexto, alternativas, miniaturas)
+        for indices in agrupamento.agrupar(pontos, raio):
+            membros = [itens[i] for i in indices]
+            centro = {a: round(float(np.mean([m['preenchimentos'].get(a, 0.0)
+                                              for m in membros])), 3)
+                      for a in alternativas}
+            distancias = np.linalg.norm(pontos[indices] - pontos[indices].mean(0), axis=1)
+            grupos.append({
+                'id': len(grupos) + 1,
+                'tamanho': len(membros),
+                'centro': centro,
+                'sugestao': agrupamento.sugestao(centro),
+                'dispersao': round(float(distancias.max()), 3),
+                'itens': [{k: m[k] for k in ('correcao_id', 'aluno', 'numero', 'status',
+                                             'preenchimentos', 'recorte_url')}
+                          for m in membros],
+            })
+
+    return jsonify({
+        'turma': turma,
+        'total_pendentes': len(itens),
+        'grupos': grupos,
+    })
+
+
+@revisao_bp.route('/revisao/grupos/decisao', methods=['POST'])
+@requer_login
+def decidir_grupo():
+    """Aplica a mesma alternativa a várias questões de uma vez.
+
+    Corpo: {"itens": [{"correcao_id": 1, "numero": 3}, ...], "alternativa": "A"}
+    (null para em branco). O cliente manda os itens do grupo que o professor
+    aceitou — tirando os que não concorda —, então não há estado de grupo no
+    servidor. Tudo é validado antes; qualquer problema devolve erro sem
+    aplicar nada. Cada decisão é gravada em `revisoes` com origem 'grupo'.
+    """
+    data = request.get_json(silent=True) or {}
+    itens = data.get('itens')
+    if not isinstance(itens, list) or not itens or 'alternativa' not in data:
+        return _erro('Informe "itens" ([{correcao_id, numero}, ...]) e "alternativa" '
+                     '(null para em branco).', 'PAYLOAD_INVALIDO', 400)
+    alternativa = data['alternativa']
+
+    por_correcao: Dict[int, List[int]] = {}
+    problemas = []
+    for item in itens:
+        try:
+            correcao_id, numero = int(item['correcao_id']), int(item['numero'])
+        except (KeyError, TypeError, ValueError):
+            problemas.append({'item': item, 'erro': 'Item inválido.',
+                              'codigo': 'QUESTAO_INVALIDA'})
+            continue
+        por_correcao.setdefault(correcao_id, []).append(numero)
+
+    correcoes = {}
+    for correcao_id, numeros in por_correcao.items():
+        correcao = db.session.get(Correcao, correcao_id)
+        if correcao is None:
+            problemas.append({'correcao_id': correcao_id, 'erro': 'Correção não encontrada.',
+                              'codigo': 'NAO_ENCONTRADA'})
+            continue
+        if correcao.status == STATUS_CONFIRMADA:
+            problemas.append({'correcao_id': correcao_id, 'codigo': 'JA_CONFIRMADA',
+                              'erro': 'Correção já confirmada; não pode mais ser alterada.'})
+            continue
+        resultado = correcao.resultado
+        validas = rotas_correcao._alternativas_validas(resultado)
+        for numero in numeros:
+            problema = rotas_correcao._erro_revisao(resultado, numero, alternativa, validas)
+            if problema:
+                problemas.append({'correcao_id': correcao_id, 'questao': numero,
+                                  'erro': problema[0], 'codigo': problema[1]})
+        correcoes[correcao_id] = (correcao, resultado)
+    if problemas:
+        return jsonify({'erro': 'Revisões inválidas; nada foi aplicado.',
+                        'codigo': 'REVISOES_INVALIDAS', 'problemas': problemas}), 400
+
+    resumos = {}
+    for correcao_id, (correcao, resultado) in correcoes.items():
+        _, resumo = rotas_correcao._aplicar_revisoes(
+            correcao, resultado, {n: alternativa for n in por_correcao[correcao_id]},
+            origem='grupo')
+        resumos[correcao_id] = resumo
+    db.session.commit()
+    logger.info('Decisão em grupo por %s: %d questões de %d correções → %s',
+                request.usuario_atual.email, sum(map(len, por_correcao.values())),
+                len(correcoes), alternativa)
+
+    return jsonify({
+        'aplicadas': sum(len(set(n)) for n in por_correcao.values()),
+        'correcoes': [{'id': cid, 'pendentes_revisao': r['pendentes_revisao'],
+                       'nota_provisoria': r['nota_provisoria']}
+                      for cid, r in resumos.items()],
+    })
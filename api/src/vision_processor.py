@@ -16,22 +16,39 @@ class VisionProcessorSimplesFuncional:
                           configuracao_questoes: Optional[Dict[str, List[int]]] = None,
                           gabarito_oficial: Optional[Dict[int, str]] = None) -> Dict[str, Any]:
         """
-        Processa gabarito usando método que funciona (Murtaza Hassan Style)
+        Processa gabarito a partir de um arquivo (ver processar_imagem)
         """
         # Carregar imagem
         image = cv2.imread(image_path)
         if image is None:
             raise ValueError(f"Não foi possível carregar a imagem: {image_path}")
-        
+        return self.processar_imagem(image, configuracao_questoes, gabarito_oficial)
+    
+    def processar_imagem(self, image: np.ndarray,
+                         configuracao_questoes: Optional[Dict[str, List[int]]] = None,
+                         gabarito_oficial: Optional[Dict[int, str]] = None,
+                         num_questoes: int = 44) -> Dict[str, Any]:
+        """
+        Processa gabarito já decodificado em memória (BGR), sem passar pelo disco
+        """
+        # Processar usando método Murtaza Hassan (que funciona)
+        respostas_detectadas = self.processar_murtaza_hassan_style(image, num_questoes)
+        return self.montar_resultado(respostas_detectadas, configuracao_questoes,
+                                     gabarito_oficial)
+    
+    def montar_resultado(self, respostas_detectadas: Dict[int, str],
+                         configuracao_questoes: Optional[Dict[str, List[int]]] = None,
+                         gabarito_oficial: Optional[Dict[int, str]] = None) -> Dict[str, Any]:
+        """
+        Filtra as respostas pela configuração e compara com o gabarito.
+        Separado da leitura para testar várias configurações com uma só leitura.
+        """
         # Se não foi fornecida configuração, usar padrão (1-44)
         if configuracao_questoes is None:
             configuracao_questoes = {
                 'todas_questoes': list(range(1, 45))  # Questões 1-44
             }
         
-        # Processar usando método Murtaza Hassan (que funciona)
-        respostas_detectadas = self.processar_murtaza_hassan_style(image)
-        
         # Filtrar respostas baseado na configuração
         respostas_filtradas = {}
         todas_questoes_config = []
@@ -55,6 +72,8 @@ class VisionProcessorSimplesFuncional:
         
         # Comparar com gabarito oficial se fornecido
         if gabarito_oficial:
+            # Chaves vindas de JSON chegam como texto ("1"); as questões são int
+            gabarito_oficial = {int(k): v for k, v in gabarito_oficial.items()}
             acertos = 0
             total_comparavel = 0
             
@@ -77,7 +96,8 @@ class VisionProcessorSimplesFuncional:
         
         return resultado
     
-    def processar_murtaza_hassan_style(self, image: np.ndarray) -> Dict[int, str]:
+    def processar_murtaza_hassan_style(self, image: np.ndarray,
+                                       num_questoes: int = 44) -> Dict[int, str]:
         """
         Método Murtaza Hassan que funciona bem (43/44 respostas)
         """
@@ -138,7 +158,7 @@ class VisionProcessorSimplesFuncional:
         thresh_warped = cv2.threshold(warped_gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)[1]
         
         # Processar usando grid matemático
-        return self.processar_grid_44_questoes(thresh_warped)
+        return self.processar_grid(thresh_warped, num_questoes)
     
     def order_points(self, pts):
         """Ordena pontos em ordem: top-left, top-right, bottom-right, bottom-left"""
@@ -164,27 +184,67 @@ class VisionProcessorSimplesFuncional:
         """
         Processa grid de 44 questões (método que funciona)
         """
+        return self.processar_grid(thresh_image, 44)
+    
+    def processar_grid(self, thresh_image: np.ndarray, num_questoes: int = 44,
+                       num_colunas: int = 2,
+                       opcoes: Optional[List[str]] = None) -> Dict[int, str]:
+        """
+        Processa o grid dividido em colunas iguais (padrão: 44 questões em
+        duas colunas de 22), lendo cada coluna de forma vetorizada
+        """
         height, width = thresh_image.shape
-        
-        # Configurações do grid (baseado no que funciona)
-        num_questoes = 44
-        num_opcoes = 5  # A, B, C, D, E
-        
-        # Dividir em duas colunas (22 questões cada)
-        meio_x = width // 2
+        opcoes = opcoes or ['A', 'B', 'C', 'D', 'E']
+        por_coluna = -(-num_questoes // num_colunas)
         
         respostas = {}
-        opcoes = ['A', 'B', 'C', 'D', 'E']
+        for c in range(num_colunas):
+            primeira = c * por_coluna + 1
+            ultima = min(num_questoes, (c + 1) * por_coluna)
+            if primeira > ultima:
+                break
+            x0 = c * width // num_colunas
+            x1 = (c + 1) * width // num_colunas
+            respostas.update(self.processar_coluna_vetorizada(
+                thresh_image[:, x0:x1], list(range(primeira, ultima + 1)), opcoes))
+        
+        return respostas
+    
+    def processar_coluna_vetorizada(self, coluna_image: np.ndarray, questoes: List[int],
+                                    opcoes: List[str]) -> Dict[int, str]:
+        """
+        Mesma leitura de processar_coluna, sem laços: uma view
+        (questões, opções, h, w) das células via stride_tricks e uma única
+        contagem de pixels para todas elas
+        """
+        height, width = coluna_image.shape
+        area_util = coluna_image[int(height * 0.2):, int(width * 0.3):]
+        altura_util, largura_util = area_util.shape
+        num_questoes, num_opcoes = len(questoes), len(opcoes)
+        if num_questoes == 0 or altura_util < num_questoes or largura_util < num_opcoes:
+            return {}
         
-        # Processar coluna esquerda (questões 1-22)
-        coluna_esquerda = thresh_image[:, :meio_x]
-        respostas.update(self.processar_coluna(coluna_esquerda, list(range(1, 23)), opcoes))
+        altura_questao = altura_util // num_questoes
+        largura_opcao = largura_util // num_opcoes
         
-        # Processar coluna direita (questões 23-44)
-        coluna_direita = thresh_image[:, meio_x:]
-        respostas.update(self.processar_coluna(coluna_direita, list(range(23, 45)), opcoes))
+        # Região central de cada célula: [1/4, 3/4) da altura e da largura
+        y0, x0 = altura_questao // 4, largura_opcao // 4
+        h = 3 * altura_questao // 4 - y0
+        w = 3 * largura_opcao // 4 - x0
+        if h <= 0 or w <= 0:
+            return {}
         
-        return respostas
+        origem = area_util[y0:, x0:]
+        sy, sx = origem.strides
+        celulas = np.lib.stride_tricks.as_strided(
+            origem, shape=(num_questoes, num_opcoes, h, w),
+            strides=(altura_questao * sy, largura_opcao * sx, sy, sx), writeable=False)
+        percentuais = np.count_nonzero(celulas, axis=(2, 3)) / (h * w)
+        
+        # Opção mais preenchida por questão; marcada se passar de 30%
+        melhor = percentuais.argmax(axis=1)
+        marcada = percentuais[np.arange(num_questoes), melhor] > 0.3
+        return {questoes[i]: opcoes[melhor[i]] for i in np.flatnonzero(marcada)}
     
     def processar_coluna(self, coluna_image: np.ndarray, questoes: List[int], opcoes: List[str]) -> Dict[int, str]:
         """
@@ -260,9 +320,15 @@ class VisionProcessorSimplesFuncional:
     
     def gerar_debug(self, image_path: str, resultado: Dict[str, Any], output_path: str):
         """
-        Gera imagem de debug simples
+        Gera imagem de debug simples a partir de um arquivo
         """
         image = cv2.imread(image_path)
+        cv2.imwrite(output_path, self.gerar_debug_imagem(image, resultado))
+    
+    def gerar_debug_imagem(self, image: np.ndarray, resultado: Dict[str, Any]) -> np.ndarray:
+        """
+        Gera a imagem de debug em memória (a original não é alterada)
+        """
         debug_image = image.copy()
         
         height, width = image.shape[:2]
@@ -286,7 +352,7 @@ class VisionProcessorSimplesFuncional:
             cv2.putText(debug_image, text, (10, 30 + i * 30), 
                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
         
-        cv2.imwrite(output_path, debug_image)
+        return debug_image
 
 
 # Exemplo de uso
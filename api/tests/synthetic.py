@@ -10,6 +10,8 @@ from typing import Dict, List, Optional
 import cv2
 import numpy as np
 
+from src.omr.modelo import desenhar_marcadores
+
 
 @dataclass
 class CartaoSintetico:
@@ -27,12 +29,16 @@ class CartaoSintetico:
               rotacao_graus: float = 0.0,
               sombra: bool = False,
               ruido: float = 0.0,
-              com_borda_folha: bool = True) -> np.ndarray:
+              com_borda_folha: bool = True,
+              com_marcadores: bool = False,
+              cor_fundo: int = 40) -> np.ndarray:
         """Gera a imagem BGR do cartão preenchido.
 
         respostas: {questao: 'A'..'E' ou None (em branco)}
         marcas_fracas: questões com preenchimento parcial (~30%)
         marcas_duplas: segunda alternativa pintada além da resposta
+        com_marcadores: quadrados de canto do cartão impresso (omr.modelo)
+        cor_fundo: cinza da mesa sob a folha (clara = borda quase invisível)
         """
         marcas_fracas = marcas_fracas or {}
         marcas_duplas = marcas_duplas or {}
@@ -44,6 +50,8 @@ class CartaoSintetico:
         margem_base = int(self.altura * 0.05)
         cv2.putText(img, 'CARTAO RESPOSTA', (int(self.largura * 0.3), int(self.altura * 0.06)),
                     cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 0, 0), 2)
+        if com_marcadores:
+            desenhar_marcadores(img)
 
         raio = 14
         for col in range(self.num_colunas):
@@ -89,7 +97,8 @@ class CartaoSintetico:
 
         if com_borda_folha:
             # Coloca a folha sobre um fundo escuro (simula a mesa) com perspectiva leve
-            fundo = np.full((int(self.altura * 1.25), int(self.largura * 1.25), 3), 40, np.uint8)
+            fundo = np.full((int(self.altura * 1.25), int(self.largura * 1.25), 3), cor_fundo,
+                            np.uint8)
             ox = int(self.largura * 0.12)
             oy = int(self.altura * 0.12)
             fundo[oy:oy + self.altura, ox:ox + self.largura] = img
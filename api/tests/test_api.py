@@ -16,14 +16,21 @@ ALTS = ['A', 'B', 'C', 'D', 'E']
 def app(tmp_path, monkeypatch):
     import src.routes.correcao as rc
     monkeypatch.setattr(rc, 'STORAGE_DIR', str(tmp_path / 'storage'))
+    # Leitura pelo pipeline OpenCV local: os testes não dependem da IA/rede
+    monkeypatch.setenv('MOTOR_LEITURA', rc.MOTOR_LOCAL)
+    monkeypatch.delenv('CACHE_LEITURAS_DIR', raising=False)
 
     # O conftest define DATABASE_URL para um sqlite temporário antes do import
     from src.main import app as flask_app
+    from src.models.gabarito import limpar_cache_gabaritos
     from src.models.user import db
+    from src.routes.auth import limpar_cache_tokens
     flask_app.config.update(TESTING=True)
     with flask_app.app_context():
         db.drop_all()
         db.create_all()
+    limpar_cache_gabaritos()
+    limpar_cache_tokens()
     yield flask_app
 
 
@@ -86,6 +93,30 @@ def test_login_valido(client, token):
     assert 'token' in r.get_json()
 
 
+def test_token_verificado_em_cache_e_invalidado_ao_excluir_usuario(client, token, app):
+    from sqlalchemy import event
+    from src.models.user import db
+    consultas = []
+    with app.app_context():
+        engine = db.engine
+
+    def contar(conn, cursor, sql, *args):
+        if 'FROM user' in sql:
+            consultas.append(sql)
+
+    event.listen(engine, 'before_cursor_execute', contar)
+    try:
+        for _ in range(5):
+            assert client.get('/api/v2/correcoes', headers=_auth(token)).status_code == 200
+        assert len(consultas) == 1   # só a primeira verificação vai ao banco
+
+        assert client.delete('/api/users/1').status_code == 204
+        r = client.get('/api/v2/correcoes', headers=_auth(token))
+        assert r.status_code == 401 and r.get_json()['codigo'] == 'TOKEN_INVALIDO'
+    finally:
+        event.remove(engine, 'before_cursor_execute', contar)
+
+
 # ---------- correção ----------
 
 def test_correcao_completa_confirma_automaticamente(client, token):
@@ -105,6 +136,27 @@ def test_gabarito_invalido_rejeitado(client, token):
     assert r.get_json()['codigo'] == 'GABARITO_INVALIDO'
 
 
+def test_layout_invalido_rejeitado_com_400(client, token):
+    payload = _payload()
+    payload['layout']['iluminacao'] = 'xyz'
+    r = client.post('/api/v2/correcoes', json=payload, headers=_auth(token))
+    assert r.status_code == 400 and r.get_json()['codigo'] == 'LAYOUT_INVALIDO'
+    corpo = {'turma': '1N', 'prova': 'P1', 'gabarito_oficial': _gabarito(20),
+             'layout': {'num_questoes': 'vinte'}}
+    r = client.post('/api/v2/gabaritos', json=corpo, headers=_auth(token))
+    assert r.status_code == 400 and r.get_json()['codigo'] == 'LAYOUT_INVALIDO'
+    _cadastrar_gabarito(client, token)
+    r = client.post('/api/v2/gabaritos/1N/rescore', headers=_auth(token),
+                    json={'prova': 'P1', 'gabarito_oficial': _gabarito(20),
+                          'layout': {'margens': [1]}})
+    assert r.status_code == 400 and r.get_json()['codigo'] == 'LAYOUT_INVALIDO'
+    # Só booleanos de verdade: "false" não liga os marcadores
+    for valor in ('false', 1, None):
+        corpo['layout'] = {'num_questoes': 20, 'marcadores': valor}
+        r = client.post('/api/v2/gabaritos', json=corpo, headers=_auth(token))
+        assert r.status_code == 400 and r.get_json()['codigo'] == 'LAYOUT_INVALIDO'
+
+
 def test_imagem_invalida_rejeitada(client, token):
     payload = _payload()
     payload['imagem'] = 'data:image/jpeg;base64,QUJDRA=='
@@ -148,6 +200,38 @@ def test_fluxo_revisao_e_confirmacao(client, token):
     assert r.status_code == 409
 
 
+def test_revisao_em_lote_valida_tudo_e_confirma_numa_transacao(client, token):
+    r = client.post('/api/v2/correcoes', json=_payload(marcas_duplas={3: 'E', 7: 'A'}),
+                    headers=_auth(token))
+    cid = r.get_json()['id']
+    assert r.get_json()['resultado']['resumo']['pendentes_revisao'] == 2
+
+    r = client.patch(f'/api/v2/correcoes/{cid}/questoes', headers=_auth(token),
+                     json={'questoes': {'3': 'C', '7': 'X', '99': 'A'}})
+    assert r.status_code == 400 and r.get_json()['codigo'] == 'REVISOES_INVALIDAS'
+    assert {p['codigo'] for p in r.get_json()['problemas']} == {'ALTERNATIVA_INVALIDA',
+                                                               'QUESTAO_INVALIDA'}
+    # Confirmar com pendência restante: nada é aplicado
+    r = client.patch(f'/api/v2/correcoes/{cid}/questoes', headers=_auth(token),
+                     json={'questoes': {'3': 'C'}, 'confirmar': True})
+    assert r.status_code == 409 and r.get_json()['codigo'] == 'PENDENCIAS_DE_REVISAO'
+    assert client.get(f'/api/v2/correcoes/{cid}', headers=_auth(token)).get_json()['revisoes'] == {}
+    # "confirmar" só aceita booleano: a string "false" não confirma a nota
+    for valor in ('false', '0', 1):
+        r = client.patch(f'/api/v2/correcoes/{cid}/questoes', headers=_auth(token),
+                         json={'questoes': {'3': 'C', '7': 'B'}, 'confirmar': valor})
+        assert r.status_code == 400 and r.get_json()['codigo'] == 'PAYLOAD_INVALIDO'
+    corpo = client.get(f'/api/v2/correcoes/{cid}', headers=_auth(token)).get_json()
+    assert corpo['revisoes'] == {} and corpo['status'] == 'PRECISA_REVISAO'
+
+    r = client.patch(f'/api/v2/correcoes/{cid}/questoes', headers=_auth(token),
+                     json={'questoes': {'3': 'C', '7': 'B'}, 'confirmar': True})
+    assert r.status_code == 200, r.get_json()
+    corpo = r.get_json()
+    assert set(corpo['revisoes']) == {'3', '7'}
+    assert corpo['status'] == 'CONFIRMADA' and corpo['nota_final'] == 10.0
+
+
 def test_historico_e_export_csv(client, token):
     client.post('/api/v2/correcoes', json=_payload(), headers=_auth(token))
 
@@ -161,3 +245,860 @@ def test_historico_e_export_csv(client, token):
     linhas = r.data.decode('utf-8-sig').strip().splitlines()
     assert linhas[0].startswith('turma;aluno;status')
     assert len(linhas) == 2
+
+
+def _quadro_previa(lado=640, **kwargs):
+    img = CartaoSintetico(num_questoes=20).gerar({i: 'A' for i in range(1, 21)}, **kwargs)
+    escala = lado / max(img.shape[:2])
+    return cv2.resize(img, None, fx=escala, fy=escala, interpolation=cv2.INTER_AREA)
+
+
+def test_previa_de_qualidade_do_quadro_da_camera(client, token, monkeypatch):
+    ok, buf = cv2.imencode('.jpg', _quadro_previa())
+    r = client.post('/api/v2/qualidade/preview', data=buf.tobytes(),
+                    content_type='image/jpeg', headers=_auth(token))
+    assert r.status_code == 200, r.get_json()
+    corpo = r.get_json()
+    assert corpo['pronta'] is True and corpo['folha_visivel'] is True
+    assert len(corpo['quadrilatero']) == 4
+    assert all(0 <= v <= 1 for canto in corpo['quadrilatero'] for v in canto)
+
+    escuro = cv2.GaussianBlur(_quadro_previa(), (0, 0), 2) // 6
+    ok, buf = cv2.imencode('.jpg', escuro)
+    r = client.post('/api/v2/qualidade/preview', headers=_auth(token),
+                    json={'imagem': base64.b64encode(buf).decode()})
+    corpo = r.get_json()
+    assert corpo['pronta'] is False
+    assert any('foco' in p for p in corpo['problemas'])
+    assert any('escuro' in p for p in corpo['problemas'])
+
+    # Quadro grande é recusado pelo cabeçalho, sem decodificar
+    grande = _quadro_previa(lado=1200)
+    with monkeypatch.context() as m:
+        m.setattr(cv2, 'imdecode', lambda *a: pytest.fail('decodificou o quadro grande'))
+        for extensao, tipo in (('.jpg', 'image/jpeg'), ('.png', 'image/png'),
+                               ('.webp', 'image/webp')):
+            ok, buf = cv2.imencode(extensao, grande)
+            r = client.post('/api/v2/qualidade/preview', data=buf.tobytes(),
+                            content_type=tipo, headers=_auth(token))
+            assert r.status_code == 413 and r.get_json()['codigo'] == 'PREVIA_GRANDE_DEMAIS'
+            assert f'{grande.shape[1]}x{grande.shape[0]}' in r.get_json()['erro']
+
+
+def test_projecoes_compactas_gzip_e_etag(client, token):
+    import gzip
+    r = client.post('/api/v2/correcoes?compacto=1', json=_payload(marcas_duplas={3: 'E'}),
+                    headers=_auth(token))
+    corpo = r.get_json()
+    assert 'resultado' not in corpo and 'gabarito' not in corpo
+    assert corpo['respostas'] == 'AB?DE' + 'ABCDE' * 3 and corpo['pendentes'] == [3]
+    assert corpo['resumo']['pendentes_revisao'] == 1
+    cid = corpo['id']
+
+    client.patch(f'/api/v2/correcoes/{cid}/questoes/3', json={'alternativa': 'C'},
+                 headers=_auth(token))
+    r = client.get(f'/api/v2/correcoes/{cid}?campos=respostas,pendentes,resultado.resumo',
+                   headers=_auth(token))
+    assert r.get_json() == {'respostas': 'ABCDE' * 4, 'pendentes': [],
+                            'resultado': {'resumo': r.get_json()['resultado']['resumo']}}
+    r = client.get(f'/api/v2/correcoes/{cid}?campos=id,xyz', headers=_auth(token))
+    assert r.status_code == 400 and r.get_json()['codigo'] == 'CAMPO_INVALIDO'
+
+    # Completo: comprimido quando o cliente aceita, com ETag para revalidação
+    r = client.get(f'/api/v2/correcoes/{cid}',
+                   headers={**_auth(token), 'Accept-Encoding': 'gzip'})
+    assert r.headers['Content-Encoding'] == 'gzip'
+    completo = json.loads(gzip.decompress(r.data))
+    assert completo['id'] == cid and len(r.data) < len(json.dumps(completo))
+    etag = r.headers['ETag']
+    r = client.get(f'/api/v2/correcoes/{cid}', headers={**_auth(token), 'If-None-Match': etag})
+    assert r.status_code == 304 and r.data == b''
+
+
+# ---------- cache de leituras ----------
+
+@pytest.fixture()
+def leituras(monkeypatch):
+    """Conta quantas vezes a imagem foi de fato lida pelo pipeline."""
+    from src.omr import CorrecaoPipeline
+    chamadas = []
+    original = CorrecaoPipeline.ler
+
+    def ler(self, image, layout=None):
+        chamadas.append(image.shape)
+        return original(self, image, layout)
+
+    monkeypatch.setattr(CorrecaoPipeline, 'ler', ler)
+    return chamadas
+
+
+def test_reenvio_da_mesma_foto_reaproveita_leitura(client, token, leituras):
+    payload = _payload(marcas_duplas={3: 'E'})
+    r1 = client.post('/api/v2/correcoes', json=payload, headers=_auth(token))
+    assert r1.status_code == 200
+    assert len(leituras) == 1
+
+    # Mesmo cartão com outro gabarito: só a pontuação é refeita
+    payload['gabarito_oficial'] = {k: 'A' for k in payload['gabarito_oficial']}
+    r2 = client.post('/api/v2/correcoes', json=payload, headers=_auth(token))
+    assert r2.status_code == 200
+    assert len(leituras) == 1
+    q1 = r2.get_json()['resultado']['questoes'][0]
+    assert q1['resposta_correta'] == 'A' and q1['acertou'] is True
+    assert r2.get_json()['resultado']['resumo']['acertos'] == 4
+
+
+def test_leitura_da_ia_em_cache_depende_do_gabarito(client, token, monkeypatch):
+    import src.ai_omr as ai_omr
+    _ia_simulada(monkeypatch)
+    gabaritos = []
+    chamar = ai_omr._chamar_openai
+
+    def contar(image, gabarito, layout):
+        gabaritos.append(dict(gabarito))
+        return chamar(image, gabarito, layout)
+    monkeypatch.setattr(ai_omr, '_chamar_openai', contar)
+
+    payload = _payload()
+    for _ in range(2):
+        assert client.post('/api/v2/correcoes', json=payload,
+                           headers=_auth(token)).status_code == 200
+    assert len(gabaritos) == 1
+    # A IA recebe o gabarito: com outro, a leitura guardada não vale
+    payload['gabarito_oficial'] = {k: 'A' for k in payload['gabarito_oficial']}
+    assert client.post('/api/v2/correcoes', json=payload,
+                       headers=_auth(token)).status_code == 200
+    assert len(gabaritos) == 2 and set(gabaritos[1].values()) == {'A'}
+
+
+def test_cache_de_leituras_varre_o_diretorio_a_cada_n_gravacoes(tmp_path, monkeypatch):
+    from src import cache_leituras
+
+    monkeypatch.setattr(cache_leituras, 'EXPULSAR_A_CADA', 4)
+    cache = cache_leituras.CacheLeituras(str(tmp_path / 'leituras'), max_entradas=3)
+    varreduras = []
+    expulsar = cache._expulsar
+    monkeypatch.setattr(cache, '_expulsar', lambda: (varreduras.append(1), expulsar()))
+    for i in range(10):
+        cache.guardar(f'{i:02d}', {'i': i})
+        assert len(list((tmp_path / 'leituras').glob('*.json'))) <= 3 + 4 - 1
+    assert len(varreduras) == 3   # gravações 1, 5 e 9
+    assert cache.obter('09') == {'i': 9}
+
+
+def test_reprocessar_sem_mudanca_de_versao_mantem_leitura_e_revisoes(client, token, leituras,
+                                                                     monkeypatch):
+    import src.routes.correcao as rc
+    r = client.post('/api/v2/correcoes', json=_payload(marcas_duplas={3: 'E'}),
+                    headers=_auth(token))
+    cid = r.get_json()['id']
+    client.patch(f'/api/v2/correcoes/{cid}/questoes/3', json={'alternativa': 'C'},
+                 headers=_auth(token))
+
+    # Projeção inválida é recusada antes de reler e regravar a correção
+    with monkeypatch.context() as m:
+        m.setattr(rc, '_ler_cartao', lambda *a: pytest.fail('releu com ?campos= inválido'))
+        r = client.post(f'/api/v2/correcoes/{cid}/reprocessar?campos=xyz',
+                        headers=_auth(token))
+    assert r.status_code == 400 and r.get_json()['codigo'] == 'CAMPO_INVALIDO'
+
+    r = client.post(f'/api/v2/correcoes/{cid}/reprocessar', headers=_auth(token))
+    assert r.status_code == 200
+    assert len(leituras) == 1
+    corpo = r.get_json()
+    assert corpo['revisoes']['3']['alternativa'] == 'C'
+    assert corpo['resultado']['resumo']['pendentes_revisao'] == 0
+
+
+def test_reprocessar_com_nova_versao_parte_da_folha_em_cache(client, token, leituras,
+                                                              monkeypatch, tmp_path):
+    import src.routes.correcao as rc
+    monkeypatch.setenv('CACHE_FOLHAS', '1')
+    monkeypatch.setenv('CACHE_FOLHAS_DIR', str(tmp_path / 'folhas'))
+    r = client.post('/api/v2/correcoes', json=_payload(marcas_duplas={3: 'E'}),
+                    headers=_auth(token))
+    cid = r.get_json()['id']
+    antes = r.get_json()['resultado']
+    assert len(leituras) == 1
+
+    # Nova versão do algoritmo: o cache de leituras não serve mais, mas a folha
+    # pré-processada sim (sem decodificar a foto de novo)
+    monkeypatch.setattr(rc, 'VERSAO_ALGORITMO', 'teste-folhas')
+    decodificacoes = []
+    monkeypatch.setattr(rc, '_decodificar_imagem',
+                        lambda dados: decodificacoes.append(1))
+    r = client.post(f'/api/v2/correcoes/{cid}/reprocessar', headers=_auth(token))
+    assert r.status_code == 200, r.get_json()
+    assert len(leituras) == 1 and decodificacoes == []
+    depois = r.get_json()['resultado']
+    assert depois['geometria'] == antes['geometria']
+    assert [(q['numero'], q['alternativa_detectada'], q['status']) for q in depois['questoes']] \
+        == [(q['numero'], q['alternativa_detectada'], q['status']) for q in antes['questoes']]
+
+
+# ---------- gabarito corrigido ----------
+
+def test_rescore_da_turma_so_repontua_a_prova_e_mantem_revisoes(client, token, leituras):
+    p1 = _cadastrar_gabarito(client, token)
+    # Outra prova da turma, com o mesmo número de questões
+    p2 = _cadastrar_gabarito(client, token, prova='P2',
+                             gabarito_oficial={str(i): 'A' for i in range(1, 21)})
+
+    def corrigir(gabarito_id=None, **kwargs):
+        payload = _payload(**kwargs)
+        if gabarito_id is not None:
+            del payload['gabarito_oficial'], payload['layout']
+            payload['gabarito_id'] = gabarito_id
+        return client.post('/api/v2/correcoes', json=payload,
+                           headers=_auth(token)).get_json()
+
+    cid = corrigir(p1['id'], marcas_duplas={3: 'E'})['id']
+    client.patch(f'/api/v2/correcoes/{cid}/questoes/3', json={'alternativa': 'C'},
+                 headers=_auth(token))
+    outra_prova = corrigir(p2['id'], marcas_duplas={3: 'E'})
+    avulsa = corrigir(marcas_duplas={3: 'E'})
+    confirmada = corrigir(p1['id'], ruido=0.001)
+    assert confirmada['status'] == 'CONFIRMADA'
+    assert len(leituras) == 2
+
+    # Professor percebe que a questão 1 do gabarito da P1 era 'B', não 'A'
+    gabarito = _gabarito(20)
+    gabarito['1'] = 'B'
+    r = client.post('/api/v2/gabaritos/1N/rescore', headers=_auth(token),
+                    json={'prova': 'P1', 'gabarito_oficial': gabarito})
+    assert r.status_code == 200, r.get_json()
+    corpo = r.get_json()
+    assert [c['id'] for c in corpo['atualizadas']] == [cid]
+    assert corpo['atualizadas'][0]['nota_provisoria'] == 9.5
+    assert {c['id'] for c in corpo['ignoradas']} == {outra_prova['id'], avulsa['id']}
+    assert len(leituras) == 2
+    # O gabarito corrigido é a versão 2 da P1, e a correção passa a apontar para ela
+    nova = corpo['gabarito']
+    assert (nova['prova'], nova['versao']) == ('P1', 2) and nova['layout'] == p1['layout']
+
+    corpo = client.get(f'/api/v2/correcoes/{cid}', headers=_auth(token)).get_json()
+    assert corpo['gabarito_id'] == nova['id']
+    assert corpo['gabarito']['1'] == 'B'
+    assert corpo['revisoes']['3']['alternativa'] == 'C'
+    assert corpo['resultado']['resumo']['pendentes_revisao'] == 0
+    q1 = corpo['resultado']['questoes'][0]
+    assert q1['resposta_correta'] == 'B' and q1['acertou'] is False
+    for intocada in (outra_prova, avulsa):
+        corpo = client.get(f"/api/v2/correcoes/{intocada['id']}", headers=_auth(token)).get_json()
+        assert corpo['gabarito_id'] == intocada['gabarito_id']
+        assert corpo['nota_provisoria'] == intocada['nota_provisoria']
+
+
+def test_rescore_rejeita_gabarito_invalido(client, token):
+    _cadastrar_gabarito(client, token)
+    r = client.post('/api/v2/gabaritos/1N/rescore',
+                    json={'prova': 'P1', 'gabarito_oficial': {'1': 'Z'}}, headers=_auth(token))
+    assert r.status_code == 400
+    assert r.get_json()['codigo'] == 'GABARITO_INVALIDO'
+    # Sem a prova não há como saber quais correções o gabarito corrige
+    r = client.post('/api/v2/gabaritos/1N/rescore', json={'gabarito_oficial': _gabarito(20)},
+                    headers=_auth(token))
+    assert r.status_code == 400 and r.get_json()['codigo'] == 'PAYLOAD_INVALIDO'
+    r = client.post('/api/v2/gabaritos/1N/rescore', headers=_auth(token),
+                    json={'prova': 'P9', 'gabarito_oficial': _gabarito(20)})
+    assert r.status_code == 404 and r.get_json()['codigo'] == 'GABARITO_INEXISTENTE'
+
+
+def _cadastrar_gabarito(client, token, n=20, **kwargs):
+    corpo = {'turma': '1N', 'prova': 'P1', 'gabarito_oficial': _gabarito(n),
+             'layout': {'num_questoes': n, 'num_alternativas': 5, 'num_colunas': 2}}
+    corpo.update(kwargs)
+    r = client.post('/api/v2/gabaritos', json=corpo, headers=_auth(token))
+    assert r.status_code == 201, r.get_json()
+    return r.get_json()
+
+
+def test_correcao_por_gabarito_id_nao_copia_gabarito(client, token, app):
+    gab = _cadastrar_gabarito(client, token)
+    assert gab['versao'] == 1
+    payload = _payload()
+    del payload['gabarito_oficial'], payload['layout'], payload['turma']
+    payload['gabarito_id'] = gab['id']
+    r = client.post('/api/v2/correcoes', json=payload, headers=_auth(token))
+    assert r.status_code == 200, r.get_json()
+    corpo = r.get_json()
+    assert corpo['gabarito_id'] == gab['id'] and corpo['turma'] == '1N'
+    assert corpo['nota_final'] == 10.0
+
+    from src.models.correcao import Correcao
+    from src.models.user import db
+    with app.app_context():
+        correcao = db.session.get(Correcao, corpo['id'])
+        assert correcao.gabarito_json == ''
+        assert correcao.gabarito == _gabarito(20)
+
+    for invalido in (999, True, '1'):
+        payload['gabarito_id'] = invalido
+        r = client.post('/api/v2/correcoes', json=payload, headers=_auth(token))
+        assert r.status_code == 400
+        assert r.get_json()['codigo'] == 'GABARITO_INEXISTENTE'
+
+
+def test_modelo_imprimivel_do_gabarito_lido_pelos_marcadores(client, token):
+    import numpy as np
+    from src.omr import LayoutProva
+    from src.omr.modelo import posicoes_bolhas
+
+    gab = _cadastrar_gabarito(client, token, layout={'num_questoes': 20, 'marcadores': True})
+    assert gab['layout']['marcadores'] is True
+    r = client.get(f"/api/v2/gabaritos/{gab['id']}/modelo.png?largura=1240",
+                   headers=_auth(token))
+    assert r.status_code == 200 and r.mimetype == 'image/png'
+    modelo = cv2.imdecode(np.frombuffer(r.data, np.uint8), cv2.IMREAD_GRAYSCALE)
+    assert modelo.shape == (1754, 1240)
+
+    # O aluno pinta o cartão impresso; a foto pega a folha sobre mesa clara
+    for (numero, alternativa), (cx, cy, raio) in posicoes_bolhas(LayoutProva(num_questoes=20),
+                                                                 1240).items():
+        if _gabarito(20)[str(numero)] == alternativa:
+            cv2.circle(modelo, (cx, cy), raio - 2, 20, -1)
+    foto = np.full((2000, 1500), 175, np.uint8)
+    foto[120:120 + 1754, 130:130 + 1240] = (modelo * 0.75 + 20).astype(np.uint8)
+    ok, buf = cv2.imencode('.jpg', foto)
+    payload = {'aluno': 'Aluno Teste', 'gabarito_id': gab['id'],
+               'imagem': 'data:image/jpeg;base64,' + base64.b64encode(buf).decode()}
+    r = client.post('/api/v2/correcoes', json=payload, headers=_auth(token))
+    assert r.status_code == 200, r.get_json()
+    corpo = r.get_json()
+    assert corpo['resultado']['folha']['metodo'] == 'marcadores'
+    assert corpo['nota_final'] == 10.0
+
+    r = client.get(f"/api/v2/gabaritos/{gab['id']}/modelo.png?largura=10", headers=_auth(token))
+    assert r.status_code == 400
+    assert client.get('/api/v2/gabaritos/999/modelo.png', headers=_auth(token)).status_code == 404
+
+
+def test_nova_versao_do_gabarito_repontua_correcoes_da_versao_anterior(client, token):
+    errado = _gabarito(20)
+    errado['5'] = 'A'
+    gab = _cadastrar_gabarito(client, token, gabarito_oficial=errado)
+    payload = _payload(marcas_duplas={3: 'E'})
+    del payload['gabarito_oficial'], payload['layout']
+    payload['gabarito_id'] = gab['id']
+    r = client.post('/api/v2/correcoes', json=payload, headers=_auth(token))
+    correcao = r.get_json()
+    assert correcao['nota_provisoria'] == 9.0
+
+    r = client.post(f"/api/v2/gabaritos/{gab['id']}/versoes", headers=_auth(token),
+                    json={'gabarito_oficial': _gabarito(20), 'repontuar': True})
+    assert r.status_code == 201, r.get_json()
+    corpo = r.get_json()
+    assert corpo['gabarito']['versao'] == 2
+    assert [a['id'] for a in corpo['atualizadas']] == [correcao['id']]
+    assert corpo['atualizadas'][0]['nota_provisoria'] == 9.5
+
+    r = client.get(f"/api/v2/correcoes/{correcao['id']}", headers=_auth(token))
+    assert r.get_json()['gabarito_id'] == corpo['gabarito']['id']
+    r = client.get('/api/v2/gabaritos?turma=1N', headers=_auth(token))
+    assert [g['versao'] for g in r.get_json()['gabaritos']] == [1, 2]
+
+
+def test_versao_disputada_tenta_o_numero_seguinte_ou_devolve_409(client, token, monkeypatch):
+    import src.routes.gabaritos as rg
+
+    gab = _cadastrar_gabarito(client, token)
+    # Leitura atrasada do máximo, como se outra requisição tivesse gravado a
+    # versão 1 entre a consulta e o INSERT
+    ultima = rg._ultima_versao
+    consultas = []
+
+    def atrasada(turma, prova):
+        consultas.append(1)
+        return 0 if len(consultas) == 1 else ultima(turma, prova)
+    monkeypatch.setattr(rg, '_ultima_versao', atrasada)
+    r = client.post(f"/api/v2/gabaritos/{gab['id']}/versoes", headers=_auth(token),
+                    json={'gabarito_oficial': _gabarito(20)})
+    assert r.status_code == 201, r.get_json()
+    assert r.get_json()['gabarito']['versao'] == 2 and len(consultas) == 2
+
+    monkeypatch.setattr(rg, '_ultima_versao', lambda turma, prova: 0)
+    r = client.post('/api/v2/gabaritos', headers=_auth(token), json={
+        'turma': '1N', 'prova': 'P1', 'gabarito_oficial': _gabarito(20),
+        'layout': {'num_questoes': 20}})
+    assert r.status_code == 409 and r.get_json()['codigo'] == 'VERSAO_CONCORRENTE'
+    r = client.get('/api/v2/gabaritos?turma=1N', headers=_auth(token))
+    assert [g['versao'] for g in r.get_json()['gabaritos']] == [1, 2]
+
+
+# ---------- inicialização ----------
+
+def test_app_sobe_sem_carregar_opencv(tmp_path):
+    """cv2 e o processador legado só são importados na primeira leitura."""
+    import os
+    import subprocess
+    import sys
+    raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    codigo = ('import sys, src.main; '
+              'assert "cv2" not in sys.modules, "cv2 importado no boot"; '
+              'assert "src.vision_processor" not in sys.modules')
+    env = {**os.environ, 'DATABASE_URL': f"sqlite:///{tmp_path / 'boot.db'}"}
+    subprocess.run([sys.executable, '-c', codigo], cwd=raiz, env=env, check=True)
+
+    # Configuração inválida derruba o boot com a causa, não cada leitura
+    for variavel, valor in (('MOTOR_LEITURA', 'opencv'), ('OMR_ILUMINACAO', 'xyz'),
+                            ('LIMIARES_ARQUIVO', str(tmp_path / 'nao-existe.json'))):
+        r = subprocess.run([sys.executable, '-c', 'import src.main'], cwd=raiz,
+                           env={**env, variavel: valor}, capture_output=True, text=True)
+        assert r.returncode != 0 and variavel in r.stderr
+
+
+# ---------- v1 (legado) ----------
+
+@pytest.mark.parametrize('motor', ['legado', 'pipeline'])
+def test_v1_processa_em_memoria(client, monkeypatch, motor):
+    import tempfile
+    monkeypatch.setenv('GABARITO_V1_MOTOR', motor)
+
+    def sem_disco(*args, **kwargs):
+        raise AssertionError('a v1 não deve gravar arquivos temporários')
+    monkeypatch.setattr(tempfile, 'NamedTemporaryFile', sem_disco)
+
+    corpo = {'imagem': _imagem_b64(44), 'gabarito_oficial': _gabarito(44)}
+    r = client.post('/api/gabarito/processar', json=corpo)
+    assert r.status_code == 200, r.get_json()
+    resultado = r.get_json()
+    assert {'respostas_detectadas', 'total_questoes', 'eficiencia', 'nota'} <= set(resultado)
+    assert resultado['total_questoes'] == 44
+    if motor == 'pipeline':
+        assert resultado['metodo'] == 'pipeline_omr_v2'
+        assert resultado['nota'] == 10.0
+
+    corpo['configuracoes'] = {'metade': {'q': list(range(1, 23))},
+                              'todas': {'q': list(range(1, 45))}}
+    r = client.post('/api/gabarito/configurar', json=corpo)
+    assert r.status_code == 200
+    assert r.get_json()['resultados']['metade']['total_questoes'] == 22
+
+
+def test_v1_leitura_vetorizada_igual_a_leitura_por_celula():
+    import numpy as np
+    from src.vision_processor import VisionProcessorSimplesFuncional
+    processor = VisionProcessorSimplesFuncional()
+    rng = np.random.default_rng(3)
+    for _ in range(5):
+        thresh = (rng.random((rng.integers(600, 2000), rng.integers(500, 1500)))
+                  > rng.random()).astype(np.uint8) * 255
+        meio = thresh.shape[1] // 2
+        esperado = processor.processar_coluna(thresh[:, :meio], list(range(1, 23)), ALTS)
+        esperado.update(processor.processar_coluna(thresh[:, meio:], list(range(23, 45)), ALTS))
+        assert processor.processar_grid_44_questoes(thresh) == esperado
+    assert len(processor.processar_grid(thresh, num_questoes=60, num_colunas=3)) <= 60
+
+
+# ---------- depuração ----------
+
+def test_debug_png_desenha_da_geometria_com_cache_e_etag(client, token, leituras):
+    r = client.post('/api/v2/correcoes', json=_payload(marcas_duplas={3: 'E'}),
+                    headers=_auth(token))
+    corpo = r.get_json()
+    geometria = corpo['resultado']['geometria']
+    assert len(geometria['bolhas']) == 100 and geometria['quadrilatero'] is not None
+
+    url = f"/api/v2/correcoes/{corpo['id']}/debug.png"
+    r = client.get(url, headers=_auth(token))
+    assert r.status_code == 200 and r.mimetype == 'image/png'
+    img = cv2.imdecode(__import__('numpy').frombuffer(r.data, 'uint8'), cv2.IMREAD_COLOR)
+    assert list(img.shape[1::-1]) == geometria['tamanho']
+    assert len(leituras) == 1  # nenhuma detecção nova
+    etag = r.headers['ETag']
+
+    r = client.get(url, headers={**_auth(token), 'If-None-Match': etag})
+    assert r.status_code == 304
+
+    # Revisão muda o desenho → ETag novo
+    client.patch(f"/api/v2/correcoes/{corpo['id']}/questoes/3", json={'alternativa': 'C'},
+                 headers=_auth(token))
+    r = client.get(url, headers={**_auth(token), 'If-None-Match': etag})
+    assert r.status_code == 200 and r.headers['ETag'] != etag
+
+
+def test_reprocessamento_em_lote_admin_com_relatorio_de_status(client, token, app,
+                                                               monkeypatch):
+    import os
+
+    import src.routes.admin as admin
+    from src.models.correcao import Correcao
+    from src.models.user import db
+
+    ids = [client.post('/api/v2/correcoes', json=_payload(**kw), headers=_auth(token))
+           .get_json()['id'] for kw in ({}, {'marcas_duplas': {3: 'E'}}, {})]
+    with app.app_context():
+        db.session.execute(db.update(Correcao).values(versao_algoritmo='3.0'))
+        # A leitura antiga da primeira pedia revisão; a atual aprova sozinha.
+        # A terceira foi confirmada e fica de fora.
+        db.session.get(Correcao, ids[0]).status = 'PRECISA_REVISAO'
+        db.session.commit()
+
+    r = client.post('/api/v2/admin/reprocessamento', json={}, headers=_auth(token))
+    assert r.status_code == 403
+    monkeypatch.setenv('ADMIN_EMAILS', 'outro@escola.com, PROF@escola.com')
+    r = client.get('/api/v2/admin/reprocessamento', headers=_auth(token))
+    assert r.get_json()['pendentes'] == 2
+
+    # Nada começa com parâmetros inválidos ("false" não é false; pool sem teto)
+    limite = os.cpu_count() or 1
+    for invalido in ({'recomecar': 'false'}, {'repetir_falhas': 1},
+                     {'trabalhadores': limite + 1}, {'trabalhadores': -1},
+                     {'trabalhadores': '2'}, {'lote': 0}, {'motor': 'opencv'}):
+        r = client.post('/api/v2/admin/reprocessamento', json=invalido, headers=_auth(token))
+        assert r.status_code == 400 and r.get_json()['codigo'] == 'DADOS_INVALIDOS', invalido
+    assert admin._execucao is None
+
+    # Com a API configurada para a IA, o lote ainda relê pelo pipeline local
+    import src.ai_omr as ai_omr
+    monkeypatch.setenv('MOTOR_LEITURA', 'ia')
+    monkeypatch.setattr(ai_omr, '_chamar_openai',
+                        lambda *a: pytest.fail('o reprocessamento em lote chamou a OpenAI'))
+    r = client.post('/api/v2/admin/reprocessamento',
+                    json={'trabalhadores': 0, 'lote': 1, 'recomecar': False},
+                    headers=_auth(token))
+    assert r.status_code == 202, r.get_json()
+    assert r.get_json()['motor'] == 'local'
+    admin._execucao.join(timeout=60)
+
+    corpo = client.get('/api/v2/admin/reprocessamento', headers=_auth(token)).get_json()
+    assert corpo['pendentes'] == 0 and corpo['em_andamento'] is False
+    checkpoint = corpo['checkpoint']
+    assert checkpoint['estado'] == 'concluido' and checkpoint['processadas'] == 2
+    assert checkpoint['motor'] == 'local' and checkpoint['falhas'] == {}
+    assert checkpoint['relatorio']['novas_aprovacoes'] == [ids[0]]
+    assert checkpoint['relatorio']['transicoes'] == {
+        'PRECISA_REVISAO -> APROVADA_AUTOMATICA': 1, 'PRECISA_REVISAO -> PRECISA_REVISAO': 1}
+    with app.app_context():
+        confirmada = db.session.get(Correcao, ids[2])
+        assert confirmada.versao_algoritmo == '3.0' and confirmada.status == 'CONFIRMADA'
+
+
+def _ler_sse(resposta):
+    eventos = []
+    for bloco in b''.join(resposta.response).decode('utf-8').split('\n\n'):
+        campos = dict(linha.split(': ', 1) for linha in bloco.splitlines()
+                      if linha and not linha.startswith(':'))
+        if campos:
+            eventos.append((int(campos['id']), campos['event'], json.loads(campos['data'])))
+    return eventos
+
+
+def test_lote_transmite_um_evento_por_cartao_e_retoma_pelo_last_event_id(client, token):
+    payload = _payload()
+    cartoes = [{'aluno': 'Ana', 'imagem': payload['imagem']},
+               {'aluno': 'Bruno', 'imagem': _imagem_b64(marcas_duplas={3: 'E'})},
+               {'aluno': 'Caio', 'imagem': 'data:image/jpeg;base64,QUJDRA=='}]
+    r = client.post('/api/v2/lotes', headers=_auth(token), json={
+        'turma': '1N', 'gabarito_oficial': payload['gabarito_oficial'],
+        'layout': payload['layout'], 'cartoes': cartoes})
+    assert r.status_code == 202, r.get_json()
+    lote_id = r.get_json()['id']
+
+    r = client.get(f'/api/v2/lotes/{lote_id}/eventos', headers=_auth(token))
+    assert r.mimetype == 'text/event-stream'
+    eventos = _ler_sse(r)
+    assert [e[0] for e in eventos] == [1, 2, 3, 3]
+    assert [e[1] for e in eventos][-1] == 'fim'
+    por_aluno = {e[2]['aluno']: e for e in eventos[:-1]}
+    assert por_aluno['Ana'][1] == 'correcao' and por_aluno['Ana'][2]['status'] == 'CONFIRMADA'
+    assert por_aluno['Bruno'][2]['status'] == 'PRECISA_REVISAO'
+    assert por_aluno['Bruno'][2]['pendentes'] == 1
+    assert por_aluno['Caio'][1] == 'falha'
+    assert por_aluno['Caio'][2]['codigo'] == 'IMAGEM_INVALIDA'
+
+    # Reconexão: só o que veio depois do último evento recebido
+    r = client.get(f'/api/v2/lotes/{lote_id}/eventos',
+                   headers={**_auth(token), 'Last-Event-ID': '2'})
+    assert [(e[0], e[1]) for e in _ler_sse(r)] == [(3, eventos[2][1]), (3, 'fim')]
+    lote = client.get(f'/api/v2/lotes/{lote_id}', headers=_auth(token)).get_json()
+    assert lote['status'] == 'CONCLUIDO' and lote['processados'] == 3
+
+
+def test_lote_termina_mesmo_com_falha_ao_gravar_o_cartao(client, token, monkeypatch):
+    from sqlalchemy.exc import OperationalError
+
+    from src import lotes
+
+    registrar = lotes._registrar
+    chamadas = {'Ana': 0}
+
+    def registrar_instavel(lote_id, posicao, aluno, correcao, falha, contexto):
+        if correcao is not None and aluno == 'Ana':
+            chamadas['Ana'] += 1
+            if chamadas['Ana'] == 1:   # uma vez: a repetição grava
+                raise OperationalError('UPDATE', {}, Exception('database is locked'))
+        if correcao is not None and aluno == 'Bruno':   # sempre: vira falha
+            raise OperationalError('UPDATE', {}, Exception('database is locked'))
+        registrar(lote_id, posicao, aluno, correcao, falha, contexto)
+
+    monkeypatch.setattr(lotes, '_registrar', registrar_instavel)
+    monkeypatch.setattr(lotes, 'ESPERA_GRAVACAO_SEGUNDOS', 0.0)
+    payload = _payload()
+    r = client.post('/api/v2/lotes', headers=_auth(token), json={
+        'turma': '1N', 'gabarito_oficial': payload['gabarito_oficial'],
+        'layout': payload['layout'],
+        'cartoes': [{'aluno': 'Ana', 'imagem': payload['imagem']},
+                    {'aluno': 'Bruno', 'imagem': payload['imagem']}]})
+    lote_id = r.get_json()['id']
+
+    eventos = _ler_sse(client.get(f'/api/v2/lotes/{lote_id}/eventos', headers=_auth(token)))
+    por_aluno = {e[2]['aluno']: e for e in eventos[:-1]}
+    assert por_aluno['Ana'][1] == 'correcao' and chamadas['Ana'] == 2
+    assert por_aluno['Bruno'][1] == 'falha'
+    assert por_aluno['Bruno'][2]['codigo'] == 'ERRO_GRAVACAO'
+    assert eventos[-1][1] == 'fim' and eventos[-1][2]['status'] == 'CONCLUIDO'
+    assert eventos[-1][2]['processados'] == 2
+
+
+def test_lote_parado_e_interrompido_e_o_fluxo_termina(client, token, app, monkeypatch):
+    from src import lotes
+    from src.models.lote import Lote
+    from src.models.user import db
+
+    # Lote cujo worker morreu: nenhum cartão vai ser gravado
+    with app.app_context():
+        lote = Lote(professor_id=1, turma='1N', total=3)
+        db.session.add(lote)
+        db.session.commit()
+        lote_id = lote.id
+
+    r = client.get(f'/api/v2/lotes/{lote_id}', headers=_auth(token))
+    assert r.get_json()['status'] == 'PROCESSANDO'
+
+    monkeypatch.setattr(lotes, 'LOTE_PARADO_SEGUNDOS', 0.0)
+    eventos = _ler_sse(client.get(f'/api/v2/lotes/{lote_id}/eventos', headers=_auth(token)))
+    assert [(e[0], e[1]) for e in eventos] == [(0, 'fim')]
+    assert eventos[0][2]['status'] == 'INTERROMPIDO'
+    assert eventos[0][2]['concluido_em'] is not None
+
+
+def test_fila_da_turma_por_impacto_com_recortes_pre_gerados(client, token, app):
+    import os
+
+    import src.routes.correcao as rc
+    import src.routes.revisao as revisao
+    from src.models.correcao import Correcao
+    from src.models.user import db
+
+    um = client.post('/api/v2/correcoes', json=_payload(marcas_duplas={3: 'E'}),
+                     headers=_auth(token)).get_json()['id']
+    dois = client.post('/api/v2/correcoes', json=_payload(marcas_duplas={3: 'E', 7: 'A'}),
+                       headers=_auth(token)).get_json()['id']
+    client.post('/api/v2/correcoes', json={**_payload(marcas_duplas={3: 'E'}), 'turma': '2N'},
+                headers=_auth(token))
+
+    r = client.get('/api/v2/revisao/fila?turma=1N&limite=2', headers=_auth(token))
+    corpo = r.get_json()
+    assert r.status_code == 200 and corpo['total_pendentes'] == 3
+    # A folha com duas questões em aberto pode mudar mais a nota: vem primeiro
+    assert [(i['correcao_id'], i['numero']) for i in corpo['itens']] == [(dois, 3), (dois, 7)]
+    assert corpo['proxima'] == {'pular': 2, 'limite': 2}
+    item = corpo['itens'][0]
+    assert item['status'] == 'MULTIPLA' and set(item['preenchimentos']) == set(ALTS)
+
+    # O recorte da página seguinte já foi gravado em segundo plano
+    revisao._pre_renderizacao.submit(lambda: None).result(timeout=30)
+    with app.app_context():
+        etag = revisao._etag_recorte(db.session.get(Correcao, um).resultado)
+    assert os.path.exists(revisao._caminho_recorte(um, 3, etag))
+
+    r = client.get(item['recorte_url'], headers=_auth(token))
+    assert r.status_code == 200 and r.mimetype == 'image/png'
+    assert cv2.imdecode(__import__('numpy').frombuffer(r.data, 'uint8'),
+                        cv2.IMREAD_GRAYSCALE) is not None
+    r = client.get(item['recorte_url'], headers={**_auth(token),
+                                                 'If-None-Match': r.headers['ETag']})
+    assert r.status_code == 304
+
+    # Sem o recorte guardado na leitura, sai da foto original pela geometria
+    with app.app_context():
+        correcao = db.session.get(Correcao, um)
+        resultado = correcao.resultado
+        for q in resultado['questoes']:
+            q.pop('recorte', None)
+        correcao.resultado_json = json.dumps(resultado)
+        db.session.commit()
+        etag = revisao._etag_recorte(resultado)
+    r = client.get(f'/api/v2/correcoes/{um}/questoes/3/recorte.png', headers=_auth(token))
+    assert r.status_code == 200 and r.mimetype == 'image/png'
+    # O recorte da leitura anterior desta questão foi substituído
+    assert [n for n in os.listdir(os.path.join(rc.STORAGE_DIR, 'recortes'))
+            if n.startswith(f'{um}-3-')] == [f'{um}-3-{etag}.png']
+
+    # Revisar tira a questão da fila; o recorte já gerado das outras questões
+    # da mesma folha continua valendo (a revisão não muda a leitura)
+    url_q7 = [i['recorte_url'] for i in client.get('/api/v2/revisao/fila?turma=1N',
+                                                   headers=_auth(token)).get_json()['itens']
+              if (i['correcao_id'], i['numero']) == (dois, 7)]
+    client.patch(f'/api/v2/correcoes/{dois}/questoes/3', json={'alternativa': 'C'},
+                 headers=_auth(token))
+    corpo = client.get('/api/v2/revisao/fila?turma=1N', headers=_auth(token)).get_json()
+    assert [i['recorte_url'] for i in corpo['itens']
+            if (i['correcao_id'], i['numero']) == (dois, 7)] == url_q7
+    assert sorted((i['correcao_id'], i['numero']) for i in corpo['itens']) == [(um, 3), (dois, 7)]
+    assert corpo['proxima'] is None
+
+
+def test_grupos_de_marcas_parecidas_decididos_de_uma_vez(client, token, app):
+    ids = [client.post('/api/v2/correcoes', json=_payload(marcas_duplas={3: 'E'}),
+                       headers=_auth(token)).get_json()['id'] for _ in range(3)]
+
+    corpo = client.get('/api/v2/revisao/grupos?turma=1N', headers=_auth(token)).get_json()
+    assert corpo['total_pendentes'] == 3
+    # A mesma dupla marcação (C e E) nas três folhas forma um grupo só
+    assert len(corpo['grupos']) == 1
+    grupo = corpo['grupos'][0]
+    assert grupo['tamanho'] == 3 and grupo['sugestao'] in ('C', 'E')
+    assert sorted(i['correcao_id'] for i in grupo['itens']) == ids
+
+    r = client.post('/api/v2/revisao/grupos/decisao', headers=_auth(token), json={
+        'itens': [{'correcao_id': ids[0], 'numero': 3}, {'correcao_id': ids[1], 'numero': 99}],
+        'alternativa': 'C'})
+    assert r.status_code == 400 and r.get_json()['codigo'] == 'REVISOES_INVALIDAS'
+
+    itens = [{'correcao_id': i['correcao_id'], 'numero': i['numero']} for i in grupo['itens']]
+    r = client.post('/api/v2/revisao/grupos/decisao', headers=_auth(token),
+                    json={'itens': itens, 'alternativa': 'C'})
+    assert r.status_code == 200 and r.get_json()['aplicadas'] == 3
+    assert all(c['pendentes_revisao'] == 0 for c in r.get_json()['correcoes'])
+
+    corpo = client.get(f'/api/v2/correcoes/{ids[0]}', headers=_auth(token)).get_json()
+    revisao = corpo['revisoes']['3']
+    assert revisao['alternativa'] == 'C' and revisao['origem'] == 'grupo'
+    assert revisao['revisado_por'] == 'prof@escola.com'
+    assert client.get('/api/v2/revisao/grupos?turma=1N',
+                      headers=_auth(token)).get_json()['grupos'] == []
+
+
+def test_lote_calibra_limiares_e_libera_questoes_em_branco(client, token):
+    payload = _payload()
+    respostas = {i: (None if i % 5 == 4 else ALTS[(i - 1) % 5]) for i in range(1, 21)}
+    cartoes = [{'aluno': f'Aluno {i}', 'imagem': _imagem_b64(respostas=respostas)}
+               for i in range(3)]
+    r = client.post('/api/v2/lotes', headers=_auth(token), json={
+        'turma': '1N', 'gabarito_oficial': payload['gabarito_oficial'],
+        'layout': payload['layout'], 'cartoes': cartoes})
+    lote_id = r.get_json()['id']
+
+    eventos = _ler_sse(client.get(f'/api/v2/lotes/{lote_id}/eventos', headers=_auth(token)))
+    fim = eventos[-1][2]
+    calibracao = fim['calibracao']
+    assert calibracao['limiares']['origem'] == 'calibrada'
+    assert calibracao['limiares']['branco'] > 0.22 and calibracao['bolhas'] == 300
+    assert calibracao['reclassificadas'] == calibracao['aprovadas'] == 3
+    # Com os limiares do lote, as 4 questões em branco não precisam de revisão
+    # (os eventos de cada cartão saíram antes da calibração, com o status de então)
+    for e in eventos[:-1]:
+        corpo = client.get(f"/api/v2/correcoes/{e[2]['correcao_id']}",
+                           headers=_auth(token)).get_json()
+        assert corpo['status'] == 'CONFIRMADA'
+        assert corpo['resultado']['resumo']['em_branco'] == 4
+        assert corpo['resultado']['limiares']['origem'] == 'calibrada'
+        assert corpo['nota_final'] == 8.0
+
+
+def _ia_simulada(monkeypatch, ambigua=3):
+    """MOTOR_LEITURA=ia com a resposta da OpenAI simulada: tudo certo com
+    confiança alta, menos a questão `ambigua` ('B' com 0,45)."""
+    import src.ai_omr as ai_omr
+    monkeypatch.setenv('MOTOR_LEITURA', 'ia')
+
+    def chamar(image, gabarito, layout):
+        return {'questions': [
+            {'number': n, 'status': 'ambiguous', 'answer': 'B', 'confidence': 0.45}
+            if n == ambigua else
+            {'number': n, 'status': 'ok', 'answer': ALTS[(n - 1) % 5], 'confidence': 0.97}
+            for n in range(1, layout.num_questoes + 1)]}
+    monkeypatch.setattr(ai_omr, '_chamar_openai', chamar)
+
+
+def test_lote_lido_pela_ia_nao_calibra_nem_reclassifica(client, token, monkeypatch):
+    _ia_simulada(monkeypatch)
+    payload = _payload()
+    # Todas as fotos diferem (ruído), para não reaproveitar o cache de leituras
+    cartoes = [{'aluno': f'Aluno {i}', 'imagem': _imagem_b64(ruido=0.01 * (i + 1))}
+               for i in range(12)]
+    r = client.post('/api/v2/lotes', headers=_auth(token), json={
+        'turma': '1N', 'gabarito_oficial': payload['gabarito_oficial'],
+        'layout': payload['layout'], 'cartoes': cartoes})
+    lote_id = r.get_json()['id']
+
+    eventos = _ler_sse(client.get(f'/api/v2/lotes/{lote_id}/eventos', headers=_auth(token)))
+    calibracao = eventos[-1][2]['calibracao']
+    assert calibracao['bolhas'] == 0 and calibracao['limiares']['origem'] == 'padrao'
+    assert calibracao['reclassificadas'] == 0
+    for e in eventos[:-1]:
+        corpo = client.get(f"/api/v2/correcoes/{e[2]['correcao_id']}",
+                           headers=_auth(token)).get_json()
+        assert corpo['status'] == 'PRECISA_REVISAO'
+        q3 = corpo['resultado']['questoes'][2]
+        assert q3['precisa_revisao'] and q3['alternativa_detectada'] is None
+
+
+def test_ajuste_de_limiares_com_revisoes_gera_arquivo_versionado(client, token, app,
+                                                                 monkeypatch, tmp_path):
+    from src import ajuste_limiares
+
+    respostas = {i: (None if i % 5 == 4 else ALTS[(i - 1) % 5]) for i in range(1, 21)}
+    payload = _payload(respostas=respostas)
+    # Bolha vazia lê ~0,28 neste papel: cada questão em branco vai para revisão
+    for _ in range(3):
+        corpo = client.post('/api/v2/correcoes', json=payload, headers=_auth(token)).get_json()
+        pendentes = [q['numero'] for q in corpo['resultado']['questoes'] if q['precisa_revisao']]
+        assert pendentes == [4, 9, 14, 19]
+        r = client.patch(f"/api/v2/correcoes/{corpo['id']}/questoes", headers=_auth(token),
+                         json={'questoes': {str(n): None for n in pendentes}, 'confirmar': True})
+        assert r.get_json()['status'] == 'CONFIRMADA'
+    # Uma marca fraca de verdade que o professor leu como A
+    corpo = client.post('/api/v2/correcoes', json=_payload(marcas_fracas={6: 'A'}),
+                        headers=_auth(token)).get_json()
+    client.patch(f"/api/v2/correcoes/{corpo['id']}/questoes/6", json={'alternativa': 'A'},
+                 headers=_auth(token))
+
+    with app.app_context():
+        dataset = ajuste_limiares.montar_dataset()
+        relatorio = ajuste_limiares.ajustar(dataset, minimo_revisoes=10)
+        assert ajuste_limiares.ajustar(dataset)['limiares'] is None  # poucas revisões
+    assert relatorio['revisoes'] == 13 and relatorio['exemplos'] == 13 + 3 * 16
+    assert relatorio['metricas']['falsos_positivos'] == 0
+    assert relatorio['metricas']['aprovadas'] == relatorio['atuais']['aprovadas'] + 12
+    # Acima das vazias, abaixo da marca fraca
+    assert 0.28 < relatorio['limiares']['branco'] < 0.39
+
+    caminho = ajuste_limiares.gravar_parametros(relatorio, str(tmp_path / 'limiares'))
+    assert caminho.endswith('limiares-v1.json')
+    assert ajuste_limiares.gravar_parametros(relatorio, str(tmp_path / 'limiares')) \
+        .endswith('limiares-v2.json')
+
+    # Com o arquivo carregado, a mesma foto é lida de novo (outra chave de cache)
+    # e as questões em branco saem sem revisão
+    monkeypatch.setenv('LIMIARES_ARQUIVO', caminho)
+    corpo = client.post('/api/v2/correcoes', json=payload, headers=_auth(token)).get_json()
+    assert corpo['status'] == 'CONFIRMADA'
+    assert corpo['resultado']['limiares']['origem'] == 'arquivo:v1'
+    assert corpo['resultado']['resumo']['em_branco'] == 4
+
+
+def test_ajuste_de_limiares_ignora_leituras_da_ia(client, token, app, monkeypatch, tmp_path):
+    from src import ajuste_limiares
+
+    _ia_simulada(monkeypatch)
+    corpo = client.post('/api/v2/correcoes', json=_payload(), headers=_auth(token)).get_json()
+    assert corpo['resultado']['deteccao']['metodo'] == 'ia_visual'
+    r = client.patch(f"/api/v2/correcoes/{corpo['id']}/questoes", headers=_auth(token),
+                     json={'questoes': {'3': 'C'}, 'confirmar': True})
+    assert r.get_json()['status'] == 'CONFIRMADA'
+    with app.app_context():
+        dataset = ajuste_limiares.montar_dataset()
+    # Nem a revisão nem as respostas confirmadas da IA viram exemplos de preenchimento
+    assert len(dataset['rotulos']) == 0 and not dataset['revisados'].any()
+
+    # Arquivo de limiares ilegível: erro claro em vez de um 500 genérico
+    monkeypatch.setenv('MOTOR_LEITURA', 'local')
+    quebrado = tmp_path / 'limiares-v9.json'
+    quebrado.write_text('{"versao": 9')
+    monkeypatch.setenv('LIMIARES_ARQUIVO', str(quebrado))
+    r = client.post('/api/v2/correcoes', json=_payload(), headers=_auth(token))
+    assert r.status_code == 500 and r.get_json()['codigo'] == 'CONFIGURACAO_INVALIDA'
+    assert 'LIMIARES_ARQUIVO' in r.get_json()['erro']
@@ -4,7 +4,7 @@ import pytest
 
 from src.omr.classifier import (
     STATUS_AMBIGUA, STATUS_EM_BRANCO, STATUS_FRACA, STATUS_MULTIPLA,
-    STATUS_NAO_LIDA, STATUS_OK, classificar_questao,
+    STATUS_NAO_LIDA, STATUS_OK, Limiares, classificar_questao,
 )
 
 
@@ -63,3 +63,15 @@ def test_nunca_escolhe_alternativa_em_caso_de_duvida():
         q = classificar_questao(i, caso)
         if q.precisa_revisao:
             assert q.alternativa is None, f'caso {caso} escolheu {q.alternativa}'
+
+
+def test_limiares_calibrados_mudam_so_o_que_foi_calibrado():
+    # Papel em que a bolha vazia já lê ~0,28: em branco só com o limiar calibrado
+    vazia = {'A': 0.29, 'B': 0.28, 'C': 0.27, 'D': 0.28, 'E': 0.29}
+    assert classificar_questao(1, vazia).status == STATUS_FRACA
+    limiares = Limiares(branco=0.32, origem='calibrada')
+    assert classificar_questao(1, vazia, limiares).status == STATUS_EM_BRANCO
+    # A exigência de separação continua a mesma
+    q = classificar_questao(2, {'A': 0.50, 'B': 0.40, 'C': 0.28, 'D': 0.28, 'E': 0.28},
+                            limiares)
+    assert q.precisa_revisao and q.alternativa is None
@@ -4,11 +4,14 @@ Inclui a métrica crítica: TAXA DE FALSO POSITIVO (questão corrigida
 automaticamente com alternativa errada) deve ser ZERO.
 """
 
+import cv2
 import numpy as np
 import pytest
 
 from src.omr import CorrecaoPipeline, LayoutProva
-from src.omr.pipeline import STATUS_APROVADA, STATUS_REJEITADA, STATUS_REVISAO
+from src.omr.pipeline import (
+    STATUS_APROVADA, STATUS_REJEITADA, STATUS_REVISAO, aplicar_gabarito,
+)
 from tests.synthetic import CartaoSintetico
 
 ALTS = ['A', 'B', 'C', 'D', 'E']
@@ -127,6 +130,42 @@ def test_imagem_minuscula_rejeitada():
     assert r['status'] == STATUS_REJEITADA
 
 
+def test_metricas_de_qualidade_fieis_as_da_imagem_inteira():
+    """Miniatura e Laplaciano CV_16S medem o mesmo que as métricas calculadas
+    na imagem inteira em float64, e reprovam pelos mesmos motivos."""
+    from src.omr.quality import validar_imagem
+
+    def referencia(img):
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        h, w = gray.shape
+        blocos = [gray[i * h // 4:(i + 1) * h // 4, j * w // 4:(j + 1) * w // 4].mean()
+                  for i in range(4) for j in range(4)]
+        return (cv2.Laplacian(gray, cv2.CV_64F).var(), gray.mean(), gray.std(),
+                max(blocos) - min(blocos))
+
+    n = 20
+    limpo = CartaoSintetico(num_questoes=n).gerar(_respostas_corretas(_gabarito(n)))
+    casos = {
+        'limpo': (limpo, None),
+        'ampliado': (cv2.resize(limpo, None, fx=2.5, fy=2.5, interpolation=cv2.INTER_CUBIC),
+                     'desfocada'),
+        'sombra': (CartaoSintetico(num_questoes=n).gerar(_respostas_corretas(_gabarito(n)),
+                                                         sombra=True), None),
+        'borrado': (cv2.GaussianBlur(limpo, (51, 51), 0), 'desfocada'),
+        'escuro': (limpo // 6, 'escura'),
+    }
+    for nome, (img, motivo) in casos.items():
+        r = validar_imagem(img)
+        nitidez, brilho, contraste, desvio = referencia(img)
+        assert r.nitidez == pytest.approx(nitidez, rel=1e-9), nome
+        assert r.brilho == pytest.approx(brilho, abs=1.0), nome
+        assert r.contraste == pytest.approx(contraste, abs=1.0), nome
+        assert r.desvio_iluminacao == pytest.approx(desvio, abs=3.0), nome
+        assert r.aprovada == (motivo is None), (nome, r.problemas)
+        if motivo is not None:
+            assert any(motivo in p for p in r.problemas), (nome, r.problemas)
+
+
 def test_zero_falsos_positivos_em_condicoes_adversas():
     """Métrica crítica: em sombra/ruído/rotação, ou a leitura está certa,
     ou a questão vai para revisão. Nunca uma resposta automática errada."""
@@ -148,6 +187,40 @@ def test_zero_falsos_positivos_em_condicoes_adversas():
         assert fp == [], f'falsos positivos {fp} no cenário {cenario}'
 
 
+def test_calibracao_por_lote_mantem_zero_falsos_positivos():
+    """Limiares calibrados num lote adverso (sombra, ruído, rotação, marcas
+    fracas, questões em branco): menos revisões, nenhum falso positivo."""
+    from src.omr import calibracao
+
+    n = 20
+    gab = _gabarito(n)
+    respostas = {i: (None if i % 5 == 4 else ALTS[(i - 1) % 5]) for i in range(1, n + 1)}
+    cenarios = [
+        dict(),
+        dict(sombra=True),
+        dict(ruido=0.04),
+        dict(rotacao_graus=2.0),
+        dict(sombra=True, ruido=0.03, rotacao_graus=1.5),
+        dict(marcas_fracas={6: 'A', 12: 'B'}),
+    ]
+    leituras = [CorrecaoPipeline().ler(CartaoSintetico(num_questoes=n).gerar(respostas, **c),
+                                       _layout(n)) for c in cenarios]
+    limiares, mistura = calibracao.calibrar(calibracao.valores_das_leituras(leituras))
+    assert limiares.origem == 'calibrada' and mistura.nitida
+    assert limiares.branco <= calibracao.BRANCO_MAXIMO
+    assert limiares.separacao == 0.25 and limiares.marcada >= calibracao.MARCADA_MINIMA
+
+    antes = depois = 0
+    for cenario, leitura in zip(cenarios, leituras):
+        reais = {**respostas, **cenario.get('marcas_fracas', {})}
+        r = aplicar_gabarito(calibracao.reclassificar(leitura, limiares), gab, n)
+        assert _falsos_positivos(r, reais) == [], f'falsos positivos no cenário {cenario}'
+        antes += sum(q['precisa_revisao'] for q in leitura['questoes'])
+        depois += r['resumo']['pendentes_revisao']
+    # As questões em branco deixam de ir para revisão; as marcas fracas continuam
+    assert depois == 2 and antes > depois
+
+
 def test_acuracia_minima_em_cartao_limpo():
     """Mede acurácia por questão num cartão limpo: >= 95% lidas corretamente."""
     n = 44
@@ -162,3 +235,167 @@ def test_acuracia_minima_em_cartao_limpo():
     )
     assert corretas / n >= 0.95, f'acurácia {corretas}/{n}'
     assert _falsos_positivos(r, respostas) == []
+
+
+def test_bolhas_compactas_indexadas_por_questao():
+    """A estrutura de arrays fatia cada questão e mede igual à lista de Bolha."""
+    from src.omr import detector, preprocess
+
+    n = 20
+    gab = _gabarito(n)
+    img = CartaoSintetico(num_questoes=n).gerar(_respostas_corretas(gab))
+    binaria = preprocess.preprocessar(img).imagem_binaria
+    det = detector.detectar_por_contornos(binaria, n, 5, 2, ALTS)
+    assert det is not None
+
+    bolhas = det.compactas
+    s = bolhas.fatia(7)
+    assert (bolhas.questao[s] == 7).all()
+    assert [ALTS[a] for a in bolhas.alt[s]] == ALTS
+    assert bolhas.fatia(n + 5) == slice(0, 0)
+
+    def fracao_referencia(cx, cy, raio):
+        # Uma bolha por vez, com máscara do tamanho da imagem (cortada na borda)
+        r = max(3, int(raio * 0.85))
+        mascara = np.zeros_like(binaria)
+        cv2.circle(mascara, (int(cx), int(cy)), r, 255, -1)
+        return cv2.countNonZero(cv2.bitwise_and(binaria, mascara)) / cv2.countNonZero(mascara)
+
+    esperado = {}
+    for b in det.bolhas:
+        esperado.setdefault(b.questao, {})[b.alternativa] = fracao_referencia(b.cx, b.cy, b.raio)
+    medido = detector.medir_preenchimentos(binaria, bolhas)
+    assert medido.keys() == esperado.keys()
+    for q in esperado:
+        assert medido[q] == pytest.approx(esperado[q], abs=1e-12)
+
+    # Bolhas que saem da imagem contam só os pixels de dentro
+    h, w = binaria.shape
+    borda = detector.BolhasCompactas(ALTS, [(1, 0, 2, 2, 14), (1, 1, w - 1, h // 2, 14),
+                                            (1, 2, w // 2, h - 3, 9)])
+    fracoes = detector.medir_fracoes(binaria, borda)
+    assert fracoes.tolist() == pytest.approx(
+        [fracao_referencia(cx, cy, r) for cx, cy, r in zip(borda.cx, borda.cy, borda.raio)],
+        abs=1e-12)
+
+
+def test_contexto_libera_intermediarios_apos_ultimo_consumo():
+    from src.omr import preprocess
+    from src.omr.contexto import ContextoPipeline
+
+    img = CartaoSintetico(num_questoes=20).gerar(_respostas_corretas(_gabarito(20)))
+    contexto = ContextoPipeline(img)
+    contexto.guardar('cinza', np.ascontiguousarray(img[..., 0]))
+
+    assert preprocess.preprocessar_contexto(contexto) == (True, 'quadrilatero')
+    assert 'cinza' not in contexto and 'cinza_reduzida' not in contexto
+    assert 'normalizada' not in contexto
+    assert contexto.ler('corrigida').shape[1] == preprocess.LARGURA_PADRAO
+
+    contexto.consumir('binaria')
+    assert 'binaria' not in contexto
+    contexto.descartar_tudo()
+    assert contexto.bytes_mantidos == 0 and contexto.pico_bytes > 0
+
+
+def test_iluminacao_reduzida_fiel_a_morfologica_com_sombra():
+    """O fundo estimado em resolução reduzida mede o mesmo preenchimento e
+    mantém zero falso positivo no cartão com sombra."""
+    from src.omr import detector, preprocess
+
+    n = 20
+    gab = _gabarito(n)
+    respostas = _respostas_corretas(gab)
+    img = CartaoSintetico(num_questoes=n).gerar(respostas, sombra=True,
+                                                marcas_duplas={5: 'A'})
+    cinza = cv2.cvtColor(preprocess.preprocessar(img).imagem_corrigida, cv2.COLOR_BGR2GRAY)
+    fracoes = {}
+    for metodo in preprocess.METODOS_ILUMINACAO:
+        binaria = preprocess.binarizar(preprocess.normalizar_iluminacao(cinza, metodo))
+        det = detector.detectar_por_contornos(binaria, n, 5, 2, ALTS)
+        assert det is not None
+        fracoes[metodo] = detector.medir_fracoes(binaria, det.compactas)
+    assert np.abs(fracoes['morfologica'] - fracoes['reduzida']).max() < 0.03
+
+    r = CorrecaoPipeline().corrigir(img, gab, LayoutProva(num_questoes=n, iluminacao='reduzida'))
+    assert r['status'] == STATUS_REVISAO
+    assert _falsos_positivos(r, respostas) == []
+
+
+def test_tempos_por_etapa_registrados():
+    n = 20
+    gab = _gabarito(n)
+    img = CartaoSintetico(num_questoes=n).gerar(_respostas_corretas(gab))
+    pipeline = CorrecaoPipeline()
+    pipeline.corrigir(img, gab, _layout(n))
+    assert list(pipeline.tempos) == ['qualidade', 'preprocessamento', 'deteccao',
+                                     'classificacao', 'recortes', 'pontuacao']
+    assert all(ms >= 0 for ms in pipeline.tempos.values())
+
+
+def test_marcadores_registram_folha_sobre_mesa_clara():
+    n = 20
+    gab = _gabarito(n)
+    respostas = _respostas_corretas(gab)
+    # Mesa clara e folha girada: a borda achada não é a do papel e cai na grade
+    img = CartaoSintetico(num_questoes=n).gerar(respostas, rotacao_graus=3, cor_fundo=200,
+                                                com_marcadores=True)
+    sem = CorrecaoPipeline().corrigir(img, gab, _layout(n))
+    com = CorrecaoPipeline().corrigir(img, gab, LayoutProva(num_questoes=n, marcadores=True))
+
+    assert com['folha'] == {'detectada': True, 'metodo': 'marcadores'}
+    assert com['deteccao'] == {'metodo': 'contornos', 'bolhas_localizadas': 5 * n}
+    assert com['status'] == STATUS_APROVADA
+    assert sum(q['precisa_revisao'] for q in com['questoes']) < \
+        sum(q['precisa_revisao'] for q in sem['questoes'])
+    assert _falsos_positivos(com, respostas) == []
+
+    # Cartão sem marcadores com a opção ligada: segue pela borda
+    img = CartaoSintetico(num_questoes=n).gerar(respostas)
+    r = CorrecaoPipeline().corrigir(img, gab, LayoutProva(num_questoes=n, marcadores=True))
+    assert r['folha']['metodo'] == 'quadrilatero' and r['status'] == STATUS_APROVADA
+
+
+def test_marcadores_localizados_sob_perspectiva():
+    from src.omr import marcadores
+    from src.omr.modelo import gerar_modelo
+
+    modelo = gerar_modelo(_layout(20), largura=1240)
+    h, w = modelo.shape
+    destino = np.float32([[180, 140], [1330, 210], [1400, 1900], [120, 1820]])
+    m = cv2.getPerspectiveTransform(np.float32([[0, 0], [w, 0], [w, h], [0, h]]), destino)
+    foto = cv2.warpPerspective(modelo, m, (1560, 2080), borderValue=210)
+
+    centros = marcadores.localizar_marcadores(foto)
+    assert centros is not None
+    esperados = cv2.perspectiveTransform(marcadores.centros_modelo(w).reshape(-1, 1, 2), m)
+    assert np.abs(centros - esperados.reshape(4, 2)).max() < 3
+    quad = marcadores.quadrilatero_por_marcadores(centros)
+    assert np.abs(quad - destino).max() < 6
+    # Sem os quatro marcadores não há registro
+    foto[:400, :400] = 210
+    assert marcadores.localizar_marcadores(foto) is None
+
+
+def test_modelo_impresso_lido_pelo_pipeline():
+    from src.omr.modelo import gerar_modelo, posicoes_bolhas
+
+    n = 30
+    gab = _gabarito(n)
+    respostas = _respostas_corretas(gab)
+    layout = LayoutProva(num_questoes=n, marcadores=True)
+    modelo = gerar_modelo(layout, titulo='Prova bimestral de matemática')
+    for (numero, alternativa), (cx, cy, raio) in posicoes_bolhas(layout).items():
+        if respostas[numero] == alternativa:
+            cv2.circle(modelo, (cx, cy), raio - 4, 20, -1)
+    # Papel sob luz ambiente (não 255) numa mesa quase tão clara quanto ele
+    foto = np.full((3900, 2900, 3), 170, np.uint8)
+    foto[200:200 + modelo.shape[0], 210:210 + modelo.shape[1]] = \
+        (modelo * 0.75 + 20).astype(np.uint8)[..., None]
+
+    r = CorrecaoPipeline().corrigir(foto, gab, layout)
+    assert r['folha']['metodo'] == 'marcadores'
+    assert r['deteccao'] == {'metodo': 'contornos', 'bolhas_localizadas': 5 * n}
+    assert r['status'] == STATUS_APROVADA
+    assert r['resumo']['acertos'] == n
+    assert _falsos_positivos(r, respostas) == []